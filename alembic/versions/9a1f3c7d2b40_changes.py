@@ -0,0 +1,65 @@
+"""changes
+
+Revision ID: 9a1f3c7d2b40
+Revises: 5c23adfde6cf
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = '9a1f3c7d2b40'
+down_revision: Union[str, Sequence[str], None] = '5c23adfde6cf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'changes',
+        sa.Column('seq', sa.BigInteger(), sa.Identity(always=True), nullable=False),
+        sa.Column('entity', sa.String(), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('op', sa.String(), nullable=False),
+        sa.Column('data', postgresql.JSONB(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('seq')
+    )
+
+    # Текущее содержимое справочника попадает в журнал как upsert,
+    # чтобы новый клиент мог начать синхронизацию с since=0
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        INSERT INTO changes (entity, entity_id, op, data)
+        SELECT 'activity', a.id, 'upsert',
+               jsonb_build_object('id', a.id, 'name', a.name, 'parent_id', a.parent_id, 'level', a.level)
+        FROM activities a ORDER BY a.level, a.id
+    """))
+    conn.execute(sa.text("""
+        INSERT INTO changes (entity, entity_id, op, data)
+        SELECT 'building', b.id, 'upsert',
+               jsonb_build_object('id', b.id, 'address', b.address, 'latitude', b.latitude, 'longitude', b.longitude)
+        FROM buildings b ORDER BY b.id
+    """))
+    conn.execute(sa.text("""
+        INSERT INTO changes (entity, entity_id, op, data)
+        SELECT 'organization', o.id, 'upsert',
+               jsonb_build_object(
+                   'id', o.id, 'name', o.name, 'phones', to_jsonb(o.phones), 'building_id', o.building_id,
+                   'activities', COALESCE((
+                       SELECT jsonb_agg(jsonb_build_object('id', a.id, 'name', a.name) ORDER BY a.id)
+                       FROM organization_activities oa JOIN activities a ON a.id = oa.activity_id
+                       WHERE oa.organization_id = o.id
+                   ), '[]'::jsonb)
+               )
+        FROM organizations o ORDER BY o.id
+    """))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('changes')
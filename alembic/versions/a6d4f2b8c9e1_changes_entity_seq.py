@@ -0,0 +1,25 @@
+"""changes entity seq index
+
+Revision ID: a6d4f2b8c9e1
+Revises: f5b2c8e4a1d6
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = 'a6d4f2b8c9e1'
+down_revision: Union[str, Sequence[str], None] = 'f5b2c8e4a1d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_changes_entity_seq', 'changes', ['entity', 'seq'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_changes_entity_seq', table_name='changes')
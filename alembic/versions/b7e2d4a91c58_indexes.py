@@ -0,0 +1,36 @@
+"""indexes
+
+Revision ID: b7e2d4a91c58
+Revises: 9a1f3c7d2b40
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = 'b7e2d4a91c58'
+down_revision: Union[str, Sequence[str], None] = '9a1f3c7d2b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_organizations_building_id'), 'organizations', ['building_id'], unique=False)
+    op.create_index(op.f('ix_activities_parent_id'), 'activities', ['parent_id'], unique=False)
+    op.create_index(op.f('ix_activities_level'), 'activities', ['level'], unique=False)
+    op.create_index(
+        'ix_organization_activities_activity_id', 'organization_activities', ['activity_id', 'organization_id'],
+        unique=False,
+    )
+    op.create_index('ix_buildings_latitude_longitude', 'buildings', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_buildings_latitude_longitude', table_name='buildings')
+    op.drop_index('ix_organization_activities_activity_id', table_name='organization_activities')
+    op.drop_index(op.f('ix_activities_level'), table_name='activities')
+    op.drop_index(op.f('ix_activities_parent_id'), table_name='activities')
+    op.drop_index(op.f('ix_organizations_building_id'), table_name='organizations')
@@ -0,0 +1,62 @@
+"""organization phones normalized
+
+Revision ID: c4a8e1f07d93
+Revises: b7e2d4a91c58
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = 'c4a8e1f07d93'
+down_revision: Union[str, Sequence[str], None] = 'b7e2d4a91c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('organizations', sa.Column(
+        'phones_normalized', postgresql.ARRAY(sa.String()), server_default='{}', nullable=False
+    ))
+    op.add_column('organizations', sa.Column(
+        'phone_suffixes', postgresql.ARRAY(sa.String()), server_default='{}', nullable=False
+    ))
+
+    # Та же нормализация, что в app.core.utils.normalize_phone / phone_suffixes
+    conn = op.get_bind()
+    conn.execute(sa.text(r"""
+        UPDATE organizations o SET phones_normalized = ARRAY(
+            SELECT CASE
+                       WHEN length(d) = 11 AND left(d, 1) = '8' THEN '7' || substr(d, 2)
+                       WHEN length(d) = 10 THEN '7' || d
+                       ELSE d
+                   END
+            FROM unnest(o.phones) WITH ORDINALITY AS p(phone, n),
+                 LATERAL regexp_replace(p.phone, '\D', '', 'g') AS d
+            ORDER BY p.n
+        )
+    """))
+    conn.execute(sa.text("""
+        UPDATE organizations o SET phone_suffixes = ARRAY(
+            SELECT DISTINCT right(n, k)
+            FROM unnest(o.phones_normalized) AS n, generate_series(5, length(n)) AS k
+            ORDER BY 1
+        )
+    """))
+
+    op.create_index('ix_organizations_phones_normalized', 'organizations', ['phones_normalized'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_organizations_phone_suffixes', 'organizations', ['phone_suffixes'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_organizations_phone_suffixes', table_name='organizations', postgresql_using='gin')
+    op.drop_index('ix_organizations_phones_normalized', table_name='organizations', postgresql_using='gin')
+    op.drop_column('organizations', 'phone_suffixes')
+    op.drop_column('organizations', 'phones_normalized')
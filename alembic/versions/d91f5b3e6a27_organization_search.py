@@ -0,0 +1,96 @@
+"""organization search
+
+Revision ID: d91f5b3e6a27
+Revises: c4a8e1f07d93
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = 'd91f5b3e6a27'
+down_revision: Union[str, Sequence[str], None] = 'c4a8e1f07d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'organization_search',
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('phones_normalized', postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column('phone_suffixes', postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column('building_id', sa.Integer(), nullable=True),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('activity_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('organization_id')
+    )
+
+    # Тот же запрос, что в app.crud.search, с условием true
+    conn = op.get_bind()
+    conn.execute(sa.text("""
+        WITH RECURSIVE ancestors AS (
+            SELECT oa.organization_id, a.id, a.parent_id
+            FROM organization_activities oa JOIN activities a ON a.id = oa.activity_id
+            UNION
+            SELECT an.organization_id, a.id, a.parent_id
+            FROM ancestors an JOIN activities a ON a.id = an.parent_id
+        ), activity_sets AS (
+            SELECT organization_id, array_agg(DISTINCT id ORDER BY id) AS ids FROM ancestors GROUP BY organization_id
+        )
+        INSERT INTO organization_search (
+            organization_id, name, phones_normalized, phone_suffixes, building_id, address, latitude, longitude,
+            activity_ids
+        )
+        SELECT o.id, o.name, o.phones_normalized, o.phone_suffixes, o.building_id, b.address, b.latitude,
+               b.longitude, COALESCE(s.ids, '{}')
+        FROM organizations o
+        LEFT JOIN buildings b ON b.id = o.building_id
+        LEFT JOIN activity_sets s ON s.organization_id = o.id
+    """))
+
+    op.create_index(op.f('ix_organization_search_building_id'), 'organization_search', ['building_id'], unique=False)
+    op.create_index('ix_organization_search_latitude_longitude', 'organization_search', ['latitude', 'longitude'],
+                    unique=False)
+    op.create_index('ix_organization_search_activity_ids', 'organization_search', ['activity_ids'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_organization_search_phones_normalized', 'organization_search', ['phones_normalized'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_organization_search_phone_suffixes', 'organization_search', ['phone_suffixes'],
+                    unique=False, postgresql_using='gin')
+    # поиск по телефону теперь идёт по organization_search — индексы на organizations только замедляют запись
+    op.drop_index('ix_organizations_phone_suffixes', table_name='organizations', postgresql_using='gin')
+    op.drop_index('ix_organizations_phones_normalized', table_name='organizations', postgresql_using='gin')
+
+    # Индекс для ilike '%...%' по названию; без pg_trgm поиск по названию остаётся последовательным
+    trgm_available = conn.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')"
+    )).scalar()
+    if trgm_available:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index('ix_organization_search_name_trgm', 'organization_search', ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_organizations_phones_normalized', 'organizations', ['phones_normalized'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_organizations_phone_suffixes', 'organizations', ['phone_suffixes'], unique=False,
+                    postgresql_using='gin')
+    op.execute("DROP INDEX IF EXISTS ix_organization_search_name_trgm")
+    op.drop_index('ix_organization_search_phone_suffixes', table_name='organization_search', postgresql_using='gin')
+    op.drop_index('ix_organization_search_phones_normalized', table_name='organization_search',
+                  postgresql_using='gin')
+    op.drop_index('ix_organization_search_activity_ids', table_name='organization_search', postgresql_using='gin')
+    op.drop_index('ix_organization_search_latitude_longitude', table_name='organization_search')
+    op.drop_index(op.f('ix_organization_search_building_id'), table_name='organization_search')
+    op.drop_table('organization_search')
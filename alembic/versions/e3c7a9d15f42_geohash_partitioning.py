@@ -0,0 +1,150 @@
+"""geohash partitioning
+
+Revision ID: e3c7a9d15f42
+Revises: d91f5b3e6a27
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = 'e3c7a9d15f42'
+down_revision: Union[str, Sequence[str], None] = 'd91f5b3e6a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+BATCH_SIZE = 10_000
+
+
+def _geohash(lat: float, lon: float) -> str:
+    # Копия app.core.utils.geohash_encode: миграция не должна зависеть от кода приложения
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, is_lon = [], 0, 0, True
+    while len(chars) < GEOHASH_PRECISION:
+        bounds, value = (lon_range, lon) if is_lon else (lat_range, lat)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        is_lon = not is_lon
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def _columns(partitioned: bool) -> list:
+    columns = [
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('phones_normalized', postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column('phone_suffixes', postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column('building_id', sa.Integer(), nullable=True),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('activity_ids', postgresql.ARRAY(sa.Integer()), nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organizations.id'], ondelete='CASCADE'),
+    ]
+    if partitioned:
+        columns += [
+            sa.Column('geohash', sa.String(collation='C'), server_default='', nullable=False),
+            sa.PrimaryKeyConstraint('organization_id', 'geohash'),
+        ]
+    else:
+        columns.append(sa.PrimaryKeyConstraint('organization_id'))
+    return columns
+
+
+def _fill_search(geohash: bool):
+    op.execute(f"""
+        WITH RECURSIVE ancestors AS (
+            SELECT oa.organization_id, a.id, a.parent_id
+            FROM organization_activities oa JOIN activities a ON a.id = oa.activity_id
+            UNION
+            SELECT an.organization_id, a.id, a.parent_id
+            FROM ancestors an JOIN activities a ON a.id = an.parent_id
+        ), activity_sets AS (
+            SELECT organization_id, array_agg(DISTINCT id ORDER BY id) AS ids FROM ancestors GROUP BY organization_id
+        )
+        INSERT INTO organization_search (
+            organization_id, {'geohash, ' if geohash else ''}name, phones_normalized, phone_suffixes, building_id,
+            address, latitude, longitude, activity_ids
+        )
+        SELECT o.id, {"COALESCE(b.geohash, ''), " if geohash else ''}o.name, o.phones_normalized, o.phone_suffixes,
+               o.building_id, b.address, b.latitude, b.longitude, COALESCE(s.ids, '{{}}')
+        FROM organizations o
+        LEFT JOIN buildings b ON b.id = o.building_id
+        LEFT JOIN activity_sets s ON s.organization_id = o.id
+    """)
+
+
+def _create_search_indexes():
+    op.create_index(op.f('ix_organization_search_building_id'), 'organization_search', ['building_id'], unique=False)
+    op.create_index('ix_organization_search_latitude_longitude', 'organization_search', ['latitude', 'longitude'],
+                    unique=False)
+    op.create_index('ix_organization_search_activity_ids', 'organization_search', ['activity_ids'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_organization_search_phones_normalized', 'organization_search', ['phones_normalized'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_organization_search_phone_suffixes', 'organization_search', ['phone_suffixes'],
+                    unique=False, postgresql_using='gin')
+    trgm_installed = op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+    )).scalar()
+    if trgm_installed:
+        op.create_index('ix_organization_search_name_trgm', 'organization_search', ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('buildings', sa.Column('geohash', sa.String(collation='C'), nullable=True))
+    # здания читаются пачками по ключу: в памяти не больше BATCH_SIZE строк, каждая пачка — один executemany
+    conn = op.get_bind()
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.text("SELECT id, latitude, longitude FROM buildings WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BATCH_SIZE},
+        ).all()
+        if not rows:
+            break
+        conn.execute(
+            sa.text("UPDATE buildings SET geohash = :geohash WHERE id = :id"),
+            [{"id": r.id, "geohash": _geohash(r.latitude, r.longitude)} for r in rows],
+        )
+        last_id = rows[-1].id
+    op.create_index(op.f('ix_buildings_geohash'), 'buildings', ['geohash'], unique=False)
+
+    # organization_search пересоздаётся секционированной: секция на первый символ geohash,
+    # пустой geohash (организация без здания) попадает в первую секцию.
+    # Регион с большой плотностью потом делится на секции по двум символам через DETACH/ATTACH.
+    op.drop_table('organization_search')
+    op.create_table('organization_search', *_columns(partitioned=True), postgresql_partition_by='RANGE (geohash)')
+    bounds = ["MINVALUE", *(f"'{c}'" for c in GEOHASH_ALPHABET[1:]), "MAXVALUE"]
+    for i, c in enumerate(GEOHASH_ALPHABET):
+        op.execute(f"CREATE TABLE organization_search_{c} PARTITION OF organization_search "
+                   f"FOR VALUES FROM ({bounds[i]}) TO ({bounds[i + 1]})")
+    _fill_search(geohash=True)
+    _create_search_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('organization_search')
+    op.create_table('organization_search', *_columns(partitioned=False))
+    _fill_search(geohash=False)
+    _create_search_indexes()
+
+    op.drop_index(op.f('ix_buildings_geohash'), table_name='buildings')
+    op.drop_column('buildings', 'geohash')
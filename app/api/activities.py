@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, Path
+from fastapi import APIRouter, Depends, Path, Query, Request
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
+from app.core.admission import Priority, db_slot
+from app.core.config import settings
+from app.core.dependencies import expensive_quota
 from app.core.exceptions import ActivityNotFound
-from app.db.session import get_db_session
+from app.core.formats import ARROW, FORMATS_CONTENT, FORMATS_DESCRIPTION, accepted, columns_response, rows_response
+from app.core.response_cache import CACHE_DESCRIPTION, response_cache
+from app.core.utils import parse_fields
+from app.db.session import get_db_session, get_read_session, statement_timeout
 from app.schemas.activities import ActivityCreate, ActivityRead, ActivityUpdate, ActivityWithChildren
-from app.crud.activities import ActivityCRUD
+from app.crud.activities import ActivityCRUD, FIELDS
 
 router = APIRouter(
     prefix="/activities",
@@ -15,6 +22,10 @@ router = APIRouter(
 
 @router.post(
     "/",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     response_model=ActivityRead,
     summary="Создать деятельность",
     description="""
@@ -45,15 +56,24 @@ async def create_activity(activity_in: ActivityCreate, db: AsyncSession = Depend
 
 @router.get(
     "/",
+    dependencies=[
+        Depends(expensive_quota),
+        Depends(db_slot(Priority.LOW)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_LIST_MS)),
+    ],
     response_model=List[ActivityRead],
     summary="Получить список деятельностей",
     description="""
 Возвращает список всех деятельностей (плоский список).
-""",
+
+Параметр `fields` (необязательный) — список полей через запятую (`id`, `name`, `parent_id`, `level`).
+Если указан, выбираются только эти колонки и ответ содержит только их (`id` возвращается всегда).
+""" + FORMATS_DESCRIPTION + CACHE_DESCRIPTION,
     responses={
         200: {
             "description": "Список деятельностей",
             "content": {
+                **FORMATS_CONTENT,
                 "application/json": {
                     "example": [
                         {
@@ -72,17 +92,34 @@ async def create_activity(activity_in: ActivityCreate, db: AsyncSession = Depend
         }
     },
 )
-async def list_activities(db: AsyncSession = Depends(get_db_session)):
-    return await ActivityCRUD.get_all(db)
+async def list_activities(
+        request: Request,
+        fields: str | None = Query(None, description="Поля ответа через запятую"),
+        db: AsyncSession = Depends(get_read_session),
+):
+    selected = parse_fields(fields, FIELDS) or FIELDS
+    media_type = accepted(request)
+
+    async def build():
+        if media_type == ARROW:
+            return columns_response(await ActivityCRUD.get_all_columns(db, fields=selected))
+        return rows_response(media_type, await ActivityCRUD.get_all(db, fields=selected))
+
+    return await response_cache.respond(request, db, "activity", build)
 
 
 @router.get(
     "/tree",
+    dependencies=[
+        Depends(expensive_quota),
+        Depends(db_slot(Priority.LOW)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_LIST_MS)),
+    ],
     response_model=List[ActivityWithChildren],
     summary="Получить дерево деятельностей",
     description="""
 Возвращает иерархическое дерево деятельностей с вложенными дочерними элементами.
-""",
+""" + CACHE_DESCRIPTION,
     responses={
         200: {
             "description": "Дерево деятельностей",
@@ -108,16 +145,26 @@ async def list_activities(db: AsyncSession = Depends(get_db_session)):
         }
     },
 )
-async def get_activity_tree(db: AsyncSession = Depends(get_db_session)):
-    return await ActivityCRUD.get_hierarchical(db)
+async def get_activity_tree(request: Request, db: AsyncSession = Depends(get_read_session)):
+    async def build():
+        return ORJSONResponse(await ActivityCRUD.get_hierarchical(db))
+
+    return await response_cache.respond(request, db, "activity", build)
 
 
 @router.get(
     "/{activity_id}",
+    dependencies=[
+        Depends(db_slot(Priority.HIGH)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_READ_MS)),
+    ],
     response_model=ActivityRead,
     summary="Получить деятельность по ID",
     description="""
 Возвращает деятельность по уникальному ID.
+
+Параметр `fields` (необязательный) — список полей через запятую (`id`, `name`, `parent_id`, `level`).
+Если указан, выбираются только эти колонки и ответ содержит только их (`id` возвращается всегда).
 """,
     responses={
         200: {
@@ -144,8 +191,15 @@ async def get_activity_tree(db: AsyncSession = Depends(get_db_session)):
 )
 async def get_activity(
         activity_id: int = Path(..., description="ID деятельности"),
-        db: AsyncSession = Depends(get_db_session)
+        fields: str | None = Query(None, description="Поля ответа через запятую"),
+        db: AsyncSession = Depends(get_read_session)
 ):
+    selected = parse_fields(fields, FIELDS)
+    if selected:
+        activity = await ActivityCRUD.get_fields(db, activity_id, selected)
+        if not activity:
+            raise ActivityNotFound
+        return ORJSONResponse(activity)
     activity = await ActivityCRUD.get(db, activity_id)
     if not activity:
         raise ActivityNotFound
@@ -154,6 +208,10 @@ async def get_activity(
 
 @router.put(
     "/{activity_id}",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     response_model=ActivityRead,
     summary="Обновить деятельность",
     description="""
@@ -199,6 +257,10 @@ async def update_activity(
 
 @router.delete(
     "/{activity_id}",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     summary="Удалить деятельность",
     description="""
 Удаляет деятельность по её ID.
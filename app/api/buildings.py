@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, Query, Path
+from fastapi import APIRouter, Depends, Query, Path, Request
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal
 
+from app.core.admission import Priority, db_slot
+from app.core.config import settings
+from app.core.counts import COUNT_DESCRIPTION, total_count_headers
+from app.core.dependencies import expensive_quota
 from app.core.exceptions import BuildingNotFound
-from app.db.session import get_db_session
+from app.core.formats import ARROW, FORMATS_CONTENT, FORMATS_DESCRIPTION, accepted, columns_response, rows_response
+from app.core.response_cache import CACHE_DESCRIPTION, response_cache
+from app.core.utils import parse_fields
+from app.db.session import get_db_session, get_read_session, statement_timeout
 from app.schemas.buildings import BuildingOut, BuildingCreate, BuildingUpdate
-from app.crud.buildings import BuildingCRUD
+from app.crud.buildings import BuildingCRUD, FIELDS
 
 router = APIRouter(
     prefix="/buildings",
@@ -15,6 +23,10 @@ router = APIRouter(
 
 @router.post(
     "/",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     response_model=BuildingOut,
     summary="Создать здание",
     description="""
@@ -47,6 +59,11 @@ async def create_building(building_in: BuildingCreate, db: AsyncSession = Depend
 
 @router.get(
     "/",
+    dependencies=[
+        Depends(expensive_quota),
+        Depends(db_slot(Priority.LOW)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_LIST_MS)),
+    ],
     response_model=List[BuildingOut],
     summary="Получить список зданий",
     description="""
@@ -54,11 +71,15 @@ async def create_building(building_in: BuildingCreate, db: AsyncSession = Depend
 
 Параметры запроса (необязательные):
 - address (str): Фильтр по адресу здания.
-""",
+
+Параметр `fields` (необязательный) — список полей через запятую (`id`, `address`, `latitude`, `longitude`).
+Если указан, выбираются только эти колонки и ответ содержит только их (`id` возвращается всегда).
+""" + FORMATS_DESCRIPTION + COUNT_DESCRIPTION + CACHE_DESCRIPTION,
     responses={
         200: {
             "description": "Список зданий",
             "content": {
+                **FORMATS_CONTENT,
                 "application/json": {
                     "example": [
                         {
@@ -80,18 +101,46 @@ async def create_building(building_in: BuildingCreate, db: AsyncSession = Depend
     },
 )
 async def list_buildings(
+        request: Request,
         address: str | None = Query(None, description="Фильтр по адресу здания"),
-        db: AsyncSession = Depends(get_db_session),
+        fields: str | None = Query(None, description="Поля ответа через запятую"),
+        limit: int | None = Query(None, ge=1, description="Размер страницы"),
+        offset: int = Query(0, ge=0, description="Сколько строк пропустить"),
+        count: Literal["none", "estimated", "exact"] = Query("none", description="Подсчёт общего числа строк в X-Total-Count"),
+        db: AsyncSession = Depends(get_read_session),
 ):
-    return await BuildingCRUD.get_list(db, address=address)
+    selected = parse_fields(fields, FIELDS) or FIELDS
+    media_type = accepted(request)
+
+    async def total(returned: int) -> dict:
+        return await total_count_headers(
+            count, limit, offset, returned, lambda mode: BuildingCRUD.count(db, mode, address)
+        )
+
+    # X-Total-Count кэшируется вместе с ответом и устаревает с той же версией данных
+    async def build():
+        if media_type == ARROW:
+            columns = await BuildingCRUD.get_columns(db, address=address, fields=selected, limit=limit, offset=offset)
+            return columns_response(columns, await total(len(columns["id"])))
+        rows = await BuildingCRUD.get_list(db, address=address, fields=selected, limit=limit, offset=offset)
+        return rows_response(media_type, rows, await total(len(rows)))
+
+    return await response_cache.respond(request, db, "building", build)
 
 
 @router.get(
     "/{building_id}",
+    dependencies=[
+        Depends(db_slot(Priority.HIGH)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_READ_MS)),
+    ],
     response_model=BuildingOut,
     summary="Получить здание по ID",
     description="""
 Возвращает здание по уникальному ID.
+
+Параметр `fields` (необязательный) — список полей через запятую (`id`, `address`, `latitude`, `longitude`).
+Если указан, выбираются только эти колонки и ответ содержит только их (`id` возвращается всегда).
 """,
     responses={
         200: {
@@ -119,8 +168,15 @@ async def list_buildings(
 )
 async def get_building(
         building_id: int = Path(..., description="ID здания"),
-        db: AsyncSession = Depends(get_db_session)
+        fields: str | None = Query(None, description="Поля ответа через запятую"),
+        db: AsyncSession = Depends(get_read_session)
 ):
+    selected = parse_fields(fields, FIELDS)
+    if selected:
+        building = await BuildingCRUD.get_fields(db, building_id, selected)
+        if not building:
+            raise BuildingNotFound
+        return ORJSONResponse(building)
     building = await BuildingCRUD.get(db, building_id)
     if not building:
         raise BuildingNotFound
@@ -129,6 +185,10 @@ async def get_building(
 
 @router.put(
     "/{building_id}",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     response_model=BuildingOut,
     summary="Обновить здание",
     description="""
@@ -176,6 +236,10 @@ async def update_building(
 
 @router.delete(
     "/{building_id}",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     summary="Удалить здание",
     description="""
 Удаляет здание по его ID.
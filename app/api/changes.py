@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from app.core.admission import Priority, db_slot
+from app.core.config import settings
+from app.crud.changes import ChangeCRUD
+from app.db.session import get_read_session, statement_timeout
+from app.schemas.changes import ChangeOut
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["Журнал изменений"],
+)
+
+
+@router.get(
+    "/",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_LIST_MS)),
+    ],
+    response_model=List[ChangeOut],
+    summary="Получить изменения после указанного номера",
+    description="""
+Возвращает изменения деятельностей, зданий и организаций в порядке возрастания `seq`.
+
+Для синхронизации клиент хранит `seq` последней полученной записи и передаёт его в `since`
+следующего запроса. Пустой ответ означает, что новых изменений нет.
+
+- `upsert`: в `data` — состояние объекта после изменения (как в ответе соответствующего GET).
+- `delete`: объект удалён, `data` равно null.
+
+Параметры запроса:
+- since (int): номер последнего уже полученного изменения (0 — с начала журнала).
+- limit (int): максимальное число записей в ответе.
+""",
+    responses={
+        200: {
+            "description": "Список изменений",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "seq": 42,
+                            "entity": "organization",
+                            "entity_id": 1,
+                            "op": "upsert",
+                            "data": {
+                                "id": 1,
+                                "name": "ООО Ромашка",
+                                "phones": ["2-222-222"],
+                                "building_id": 1,
+                                "activities": [{"id": 3, "name": "Ортодонтия"}]
+                            },
+                            "created_at": "2025-08-07T13:44:27.295507+00:00"
+                        },
+                        {
+                            "seq": 43,
+                            "entity": "building",
+                            "entity_id": 7,
+                            "op": "delete",
+                            "data": None,
+                            "created_at": "2025-08-07T13:45:01.000000+00:00"
+                        }
+                    ]
+                }
+            },
+        }
+    },
+)
+async def get_changes(
+        since: int = Query(0, ge=0, description="Номер последнего полученного изменения"),
+        limit: int = Query(1000, ge=1, le=10000, description="Максимальное число записей"),
+        db: AsyncSession = Depends(get_read_session),
+):
+    return ORJSONResponse(await ChangeCRUD.get_since(db, since, limit))
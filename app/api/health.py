@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+from starlette import status
+
+from app.core.warmup import readiness
+
+router = APIRouter(
+    prefix="/health",
+    tags=["Служебное"],
+)
+
+
+@router.get(
+    "/live",
+    summary="Проверка, что процесс жив",
+    description="""
+Отвечает `200`, пока процесс обрабатывает запросы. БД не проверяется:
+перезапуск экземпляра из-за недоступной БД не поможет.
+
+API-ключ не требуется.
+""",
+)
+async def live():
+    return {"status": "alive"}
+
+
+@router.get(
+    "/ready",
+    summary="Готовность принимать запросы",
+    description="""
+Отвечает `200`, когда экземпляр прогрет и primary БД отвечает, иначе `503`.
+
+При старте сервис в фоне открывает соединения пулов (primary и реплик) и выполняет на каждом
+горячие запросы (готовит их в кэшах SQLAlchemy и asyncpg). Офлайн-снимок и индекс nearby
+собираются параллельно и готовность не задерживают.
+Пока прогрев не закончен, балансировщик не направляет сюда запросы, поэтому первый запрос
+после деплоя или масштабирования не медленнее последующих.
+
+API-ключ не требуется.
+""",
+    responses={503: {"description": "Прогрев не закончен или БД недоступна"}},
+)
+async def ready():
+    database_error = await readiness.check_database() if readiness.ready else None
+    ok = readiness.ready and database_error is None
+    return ORJSONResponse(
+        {"status": "ready" if ok else "not ready", "warmup": readiness.snapshot(), "database_error": database_error},
+        status_code=status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
@@ -0,0 +1,157 @@
+import asyncio
+import uuid
+
+from fastapi import APIRouter, Depends, Path, Query, Request
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+
+from app.core.dependencies import require_admin
+from app.core.formats import FORMATS_CONTENT
+from app.core.exceptions import (
+    JobInputRequired, JobNotFound, JobResultNotFound, invalid_job_format, unknown_job_kind,
+)
+from app.core.job_kinds import KINDS, job_path
+from app.core.jobs import jobs
+from app.crud.jobs import DONE, JobCRUD
+from app.db.session import get_db_session
+from app.schemas.jobs import JobOut
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Фоновые задачи"],
+    dependencies=[Depends(require_admin)],
+)
+
+KINDS_DESCRIPTION = "\n".join(f"- `{kind.name}`: {kind.description}" for kind in KINDS.values())
+
+
+async def _save_input(request: Request) -> str | None:
+    """Сохраняет тело запроса в JOBS_DIR потоком, не держа его целиком в памяти."""
+    name = f"upload-{uuid.uuid4().hex}.ndjson"
+    path = job_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    size = 0
+    with path.open("wb") as f:
+        async for chunk in request.stream():
+            size += len(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    if not size:
+        path.unlink(missing_ok=True)
+        return None
+    return name
+
+
+@router.post(
+    "/{kind}",
+    status_code=202,
+    response_model=JobOut,
+    summary="Запустить фоновую задачу",
+    description=f"""
+Ставит задачу в очередь и сразу возвращает её с `status=pending`; ход выполнения — `GET /jobs/{{id}}`.
+
+Виды задач:
+{KINDS_DESCRIPTION}
+
+Одновременно выполняется не больше `JOBS_MAX_CONCURRENCY` задач, для отдельных видов —
+не больше лимита из `JOBS_CONCURRENCY` (по умолчанию одна задача вида). Запросы к БД фоновые задачи
+выполняют порциями по `JOBS_BATCH_SIZE` с низшим приоритетом допуска, поэтому API под нагрузкой
+обслуживается в первую очередь. Возобновляемые задачи после перезапуска сервиса продолжают
+с сохранённого прогресса.
+
+Доступно только с административным ключом.
+""",
+    responses={
+        400: {"description": "Для задачи нужно тело запроса или формат не поддерживается"},
+        404: {"description": "Неизвестный вид задачи"},
+    },
+)
+async def create_job(
+        request: Request,
+        kind: str = Path(..., description="Вид задачи"),
+        format: str | None = Query(None, description="Формат результата для задач, которые его поддерживают"),
+        db: AsyncSession = Depends(get_db_session),
+):
+    job_kind = KINDS.get(kind)
+    if job_kind is None:
+        raise unknown_job_kind(kind, KINDS)
+    params = {}
+    if format is not None and format not in job_kind.formats:
+        raise invalid_job_format(format, job_kind.formats)
+    if job_kind.formats:
+        params["format"] = format or job_kind.formats[0]
+    if job_kind.accepts_input:
+        params["input"] = await _save_input(request)
+        if params["input"] is None:
+            raise JobInputRequired
+    job = await JobCRUD.create(db, kind, params)
+    jobs.wake()
+    return job
+
+
+@router.get(
+    "/",
+    response_model=List[JobOut],
+    summary="Список фоновых задач",
+    description="Последние задачи, новые первыми.",
+)
+async def list_jobs(
+        limit: int = Query(50, ge=1, le=500, description="Максимальное число задач"),
+        db: AsyncSession = Depends(get_db_session),
+):
+    return await JobCRUD.get_list(db, limit)
+
+
+@router.get(
+    "/{job_id}",
+    response_model=JobOut,
+    summary="Состояние фоновой задачи",
+    description="""
+Статус (`pending`, `running`, `done`, `failed`, `cancelled`), прогресс `done` из `total`,
+доля выполненного `progress`, средняя скорость `rate_per_s` и оценка оставшегося времени `eta_s`.
+В `result` — промежуточный и итоговый результат задачи, в `error` — причина сбоя.
+""",
+    responses={404: {"description": "Задача не найдена"}},
+)
+async def get_job(job_id: int = Path(..., description="ID задачи"), db: AsyncSession = Depends(get_db_session)):
+    job = await JobCRUD.get(db, job_id)
+    if job is None:
+        raise JobNotFound
+    return job
+
+
+@router.post(
+    "/{job_id}/cancel",
+    response_model=JobOut,
+    summary="Отменить фоновую задачу",
+    description="""
+Задача в очереди отменяется сразу. Выполняющаяся останавливается исполнителем в течение
+`JOBS_HEARTBEAT_SECONDS`; уже зафиксированные порции остаются в БД. Завершённая задача не меняется.
+""",
+    responses={404: {"description": "Задача не найдена"}},
+)
+async def cancel_job(job_id: int = Path(..., description="ID задачи"), db: AsyncSession = Depends(get_db_session)):
+    job = await JobCRUD.request_cancel(db, job_id)
+    if job is None:
+        raise JobNotFound
+    return job
+
+
+@router.get(
+    "/{job_id}/result",
+    response_class=FileResponse,
+    summary="Скачать файл результата задачи",
+    description="Файл, созданный завершённой задачей (например, выгрузка `export`).",
+    responses={
+        200: {"description": "Файл результата", "content": {"application/gzip": {}, **FORMATS_CONTENT}},
+        404: {"description": "Задача не найдена или у неё нет файла результата"},
+    },
+)
+async def get_job_result(job_id: int = Path(..., description="ID задачи"), db: AsyncSession = Depends(get_db_session)):
+    job = await JobCRUD.get(db, job_id)
+    if job is None:
+        raise JobNotFound
+    name = (job.result or {}).get("file")
+    if job.status != DONE or not name or not job_path(name).exists():
+        raise JobResultNotFound
+    return FileResponse(job_path(name), media_type=job.result.get("media_type"), filename=name)
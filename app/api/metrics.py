@@ -0,0 +1,114 @@
+from fastapi import APIRouter, Depends, Path
+from fastapi.responses import PlainTextResponse
+
+from app.core.admission import admission
+from app.core.api_keys import api_keys
+from app.core.counts import exact_counts
+from app.core.dependencies import require_admin
+from app.core.exceptions import ProfileNotFound
+from app.core.group_commit import organization_writes
+from app.core.jobs import jobs
+from app.core.nearby import nearby
+from app.core.profiling import profiles, slow_queries
+from app.core.response_cache import response_cache
+from app.db.session import pool_snapshot, replicas, statement_cache
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Служебное"],
+    dependencies=[Depends(require_admin)],
+)
+
+
+@router.get(
+    "/",
+    summary="Метрики сервиса",
+    description="""
+Возвращает текущее состояние внутренних механизмов сервиса:
+- admission: ограничитель одновременных запросов к БД (активные, ожидающие по приоритетам, отказы).
+- api_keys: остаток токенов и число отказов `429` по каждому API-ключу.
+- statements: доля попаданий в кэш скомпилированных запросов SQLAlchemy (`compiled`)
+  и в кэш подготовленных выражений asyncpg (`prepared`).
+- replicas: реплики для чтения — доступность, число сбоев, последняя ошибка, занятые соединения.
+- response_cache: кэш ответов списков — записи и занятая память, попадания, ответы `304`,
+  ответы, слишком большие для кэша, отданные варианты по `Content-Encoding` и суммарное время сжатия.
+- counts: кэш точных количеств `count=exact` — записи, попадания и промахи.
+- group_commit: групповой коммит записей организаций — очередь, записи и группы, средний
+  и наибольший размер группы, неудачные группы и отказы `503`.
+- nearby: индекс `/organizations/nearby` — применённая версия журнала, здания, ячейки и организации.
+- jobs: выполняющиеся в этом процессе фоновые задачи и лимиты по видам.
+
+Доступно только с административным ключом.
+""",
+)
+async def get_metrics():
+    return {
+        "admission": admission.snapshot(),
+        "api_keys": api_keys.snapshot(),
+        "statements": statement_cache.snapshot(),
+        "replicas": replicas.snapshot(),
+        "response_cache": response_cache.snapshot(),
+        "counts": exact_counts.snapshot(),
+        "group_commit": organization_writes.snapshot(),
+        "nearby": nearby.snapshot(),
+        "jobs": jobs.snapshot(),
+    }
+
+
+@router.get(
+    "/pool",
+    summary="Состояние пулов соединений с БД",
+    description="""
+Для primary и каждой реплики:
+- занятость пула: `size`, `checked_out`, `idle`, `overflow` из `max_overflow`;
+- время выдачи соединения (`checkout_ms`: среднее, p50 и p99 по последним выдачам, максимум) —
+  ожидание свободного соединения, открытие нового и pre-ping; `timeouts` — отказы по `DB_POOL_TIMEOUT`;
+- оборот соединений с момента запуска (`uptime_s`): `connects`, `closes`, `invalidations`.
+
+Размер пула задаётся `DB_POOL_SIZE` и `DB_MAX_OVERFLOW`. Если `checkout_ms` растёт, а `checked_out`
+упирается в предел, пула не хватает. Если `connects` растёт вместе с `checkouts`, соединения
+пересоздаются слишком часто: стоит увеличить `DB_POOL_SIZE` или `DB_POOL_RECYCLE`.
+""",
+)
+async def get_pool():
+    return pool_snapshot()
+
+
+@router.get(
+    "/slow-queries",
+    summary="Журнал медленных SQL-запросов",
+    description="""
+Последние SQL-запросы, выполнявшиеся дольше `SLOW_QUERY_MS`: текст, параметры, длительность
+и, при `SLOW_QUERY_EXPLAIN=true`, план `EXPLAIN (ANALYZE, BUFFERS)`. Новые записи первыми.
+""",
+)
+async def get_slow_queries():
+    return list(reversed(slow_queries))
+
+
+@router.get(
+    "/profiles",
+    summary="Список сохранённых профилей запросов",
+    description="""
+Профили запросов, выполненных с заголовком `X-Profile: 1` (или `?profile=1`) административным ключом.
+Работает при `PROFILING_ENABLED=true`.
+""",
+)
+async def list_profiles():
+    return profiles.list()
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_class=PlainTextResponse,
+    summary="Получить профиль запроса",
+    description="""
+Возвращает вывод `pstats` (сортировка по cumulative) для профиля из заголовка ответа `X-Profile-Id`.
+""",
+    responses={404: {"description": "Профиль не найден"}},
+)
+async def get_profile(profile_id: str = Path(..., description="ID профиля")):
+    profile = profiles.get(profile_id)
+    if not profile:
+        raise ProfileNotFound
+    return profile["stats"]
@@ -1,22 +1,57 @@
-from fastapi import APIRouter, Depends, Query, Path
+from fastapi import APIRouter, Depends, Query, Path, Request
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Literal, Union
 from starlette import status
 
-from app.core.exceptions import OrganizationNotFound
-from app.db.session import get_db_session
-from app.schemas.organizations import OrganizationCreate, OrganizationUpdate, OrganizationOut
-from app.crud.organizations import OrganizationCRUD
+from app.core.admission import Priority, db_slot
+from app.core.config import settings
+from app.core.counts import COUNT_DESCRIPTION, total_count_headers
+from app.core.dependencies import expensive_quota
+from app.core.exceptions import ArrowIncludeNotSupported, OrganizationNotFound
+from app.core.formats import (
+    ARROW, FORMATS_CONTENT, FORMATS_DESCRIPTION, accepted, columns_response, rows_response,
+)
+from app.core.group_commit import organization_writes
+from app.core.nearby import decode_cursor, encode_cursor
+from app.core.utils import parse_fields, parse_include
+from app.db.session import get_db_session, get_read_session, statement_timeout
+from app.schemas.organizations import (
+    OrganizationCreate, OrganizationUpdate, OrganizationOut, OrganizationIncluded, OrganizationListIncluded,
+    OrganizationNearbyOut,
+)
+from app.crud.organizations import OrganizationCRUD, FIELDS, INCLUDES, INCLUDE_REQUIRES
 
 router = APIRouter(
     prefix="/organizations",
     tags=["Организации"]
 )
 
+INCLUDE_DESCRIPTION = """
+Параметр `include` (необязательный) — связанные объекты через запятую:
+- `building` — здания организаций;
+- `activities.path` — деятельности вместе со всеми предками; у каждой деятельности организации
+  появляется `path` — ID от корня дерева до неё самой.
+
+С `include` ответ оборачивается в `{"data": ..., "included": {"buildings": [...], "activities": [...]}}`:
+связанные объекты загружаются одним запросом на связь и встречаются в `included` по одному разу,
+сколько бы организаций на них ни ссылалось.
+"""
+
+
+def _fields_with_includes(fields: str | None, include: list[str]) -> list[str]:
+    selected = parse_fields(fields, FIELDS) or list(FIELDS)
+    return selected + [INCLUDE_REQUIRES[i] for i in include if INCLUDE_REQUIRES[i] not in selected]
+
 
 @router.get(
     "/",
-    response_model=List[OrganizationOut],
+    dependencies=[
+        Depends(expensive_quota),
+        Depends(db_slot(Priority.LOW)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_LIST_MS)),
+    ],
+    response_model=Union[List[OrganizationOut], OrganizationListIncluded],
     summary="Получить список организаций",
     description="""
 Возвращает список организаций с возможностью фильтрации по:
@@ -24,13 +59,20 @@ router = APIRouter(
 - зданию (`building_id`)
 - виду деятельности (`activity_id`)
 - координатам и радиусу поиска (`lat`, `lon`, `radius_km`)
+- телефону (`phone`): формат не важен, учитываются только цифры (`8` в начале равно `+7`).
+  Полный номер ищется точно, неполный (от 5 цифр) — по окончанию номера.
 
 Если фильтры не указаны, возвращаются все организации.
-    """,
+
+Параметр `fields` (необязательный) — список полей через запятую (`id`, `name`, `phones`, `building_id`, `activities`).
+Если указан, выбираются только эти колонки, деятельности загружаются только при запросе `activities`,
+а ответ содержит только перечисленные поля (`id` возвращается всегда).
+    """ + INCLUDE_DESCRIPTION + FORMATS_DESCRIPTION + COUNT_DESCRIPTION,
     responses={
         200: {
             "description": "Список организаций",
             "content": {
+                **FORMATS_CONTENT,
                 "application/json": {
                     "example": [
                         {
@@ -49,32 +91,118 @@ router = APIRouter(
     }
 )
 async def get_organizations(
+        request: Request,
         name: str | None = Query(None, description="Название организации для поиска"),
         building_id: int | None = Query(None, description="ID здания"),
         activity_id: int | None = Query(None, description="ID вида деятельности"),
         lat: float | None = Query(None, description="Широта для геопоиска"),
         lon: float | None = Query(None, description="Долгота для геопоиска"),
         radius_km: int | None = Query(None, description="Радиус поиска в км"),
-        db: AsyncSession = Depends(get_db_session),
+        phone: str | None = Query(None, description="Телефон или его окончание (от 5 цифр)"),
+        fields: str | None = Query(None, description="Поля ответа через запятую"),
+        include: str | None = Query(None, description="Связанные объекты через запятую: building, activities.path"),
+        limit: int | None = Query(None, ge=1, description="Размер страницы"),
+        offset: int = Query(0, ge=0, description="Сколько строк пропустить"),
+        count: Literal["none", "estimated", "exact"] = Query("none", description="Подсчёт общего числа строк в X-Total-Count"),
+        db: AsyncSession = Depends(get_read_session),
+):
+    includes = parse_include(include, INCLUDES)
+    media_type = accepted(request)
+    filters = dict(name=name, building_id=building_id, activity_id=activity_id, lat=lat, lon=lon,
+                   radius_km=radius_km, phone=phone)
+    page = dict(limit=limit, offset=offset)
+
+    async def total(returned: int) -> dict:
+        return await total_count_headers(
+            count, limit, offset, returned, lambda mode: OrganizationCRUD.count(db, mode, **filters)
+        )
+
+    if media_type == ARROW:
+        if includes:
+            raise ArrowIncludeNotSupported
+        columns = await OrganizationCRUD.get_columns(
+            db, **filters, fields=parse_fields(fields, FIELDS) or FIELDS, **page
+        )
+        return columns_response(columns, await total(len(columns["id"])))
+
+    rows = await OrganizationCRUD.get_list(db, **filters, fields=_fields_with_includes(fields, includes), **page)
+    headers = await total(len(rows))
+    if includes:
+        included = await OrganizationCRUD.get_included(db, rows, includes)
+        return rows_response(media_type, {"data": rows, "included": included}, headers)
+    return rows_response(media_type, rows, headers)
+
+
+@router.get(
+    "/nearby",
+    dependencies=[
+        Depends(expensive_quota),
+        Depends(db_slot(Priority.LOW)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_LIST_MS)),
+    ],
+    response_model=List[OrganizationNearbyOut],
+    summary="Организации рядом с точкой",
+    description="""
+Организации в радиусе `radius_km` от точки (`lat`, `lon`) по возрастанию расстояния;
+`distance_km` — расстояние до здания организации. При равном расстоянии порядок по `id`.
+
+Страницы по `limit` строк: если есть следующая, в заголовке `X-Next-Cursor` приходит курсор —
+его передают в `cursor` следующего запроса. Курсор — позиция (расстояние, `id`), а не смещение:
+записи между запросами не сдвигают страницы, а каждая следующая страница стоит столько же,
+сколько первая, даже в плотном центре города.
+
+Индекс расстояний сверяется с журналом изменений не чаще раза в `NEARBY_SYNC_SECONDS`:
+только что записанная организация может появиться в выдаче с такой задержкой.
+""",
+    responses={
+        200: {
+            "description": "Организации по возрастанию расстояния",
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "id": 1,
+                            "name": "ООО Ромашка",
+                            "phones": ["2-222-222"],
+                            "building_id": 12,
+                            "activities": [{"id": 3, "name": "Ортодонтия"}],
+                            "distance_km": 0.42
+                        }
+                    ]
+                }
+            }
+        },
+        400: {"description": "Неверный курсор"}
+    }
+)
+async def get_nearby_organizations(
+        lat: float = Query(..., ge=-90, le=90, description="Широта точки"),
+        lon: float = Query(..., ge=-180, le=180, description="Долгота точки"),
+        radius_km: float = Query(..., gt=0, description="Радиус поиска в км"),
+        limit: int = Query(20, ge=1, le=500, description="Размер страницы"),
+        cursor: str | None = Query(None, description="Курсор из X-Next-Cursor предыдущей страницы"),
+        db: AsyncSession = Depends(get_read_session),
 ):
-    return await OrganizationCRUD.get_list(
-        db=db,
-        name=name,
-        building_id=building_id,
-        activity_id=activity_id,
-        lat=lat,
-        lon=lon,
-        radius_km=radius_km,
-    )
+    after = decode_cursor(cursor) if cursor else None
+    rows, next_cursor = await OrganizationCRUD.get_nearby(db, lat, lon, radius_km, limit, after)
+    headers = {"X-Next-Cursor": encode_cursor(next_cursor)} if next_cursor else None
+    return ORJSONResponse(rows, headers=headers)
 
 
 @router.get(
     "/{org_id}",
-    response_model=OrganizationOut,
+    dependencies=[
+        Depends(db_slot(Priority.HIGH)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_READ_MS)),
+    ],
+    response_model=Union[OrganizationOut, OrganizationIncluded],
     summary="Получить организацию по ID",
     description="""
 Возвращает организацию по уникальному ID.
-""",
+
+Параметр `fields` (необязательный) — список полей через запятую (`id`, `name`, `phones`, `building_id`, `activities`).
+Если указан, выбираются только эти колонки и ответ содержит только их (`id` возвращается всегда).
+""" + INCLUDE_DESCRIPTION,
     responses={
         200: {"description": "Информация об организации"},
         404: {"description": "Организация не найдена"}
@@ -82,8 +210,18 @@ async def get_organizations(
 )
 async def get_organization(
         org_id: int = Path(..., description="ID организации"),
-        db: AsyncSession = Depends(get_db_session)
+        fields: str | None = Query(None, description="Поля ответа через запятую"),
+        include: str | None = Query(None, description="Связанные объекты через запятую: building, activities.path"),
+        db: AsyncSession = Depends(get_read_session)
 ):
+    includes = parse_include(include, INCLUDES)
+    if fields or includes:
+        org = await OrganizationCRUD.get_fields(db, org_id, _fields_with_includes(fields, includes))
+        if not org:
+            raise OrganizationNotFound
+        if includes:
+            return ORJSONResponse({"data": org, "included": await OrganizationCRUD.get_included(db, [org], includes)})
+        return ORJSONResponse(org)
     org = await OrganizationCRUD.get(db, org_id)
     if not org:
         raise OrganizationNotFound
@@ -92,6 +230,10 @@ async def get_organization(
 
 @router.post(
     "/",
+    dependencies=[
+        Depends(organization_writes.write_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     response_model=OrganizationOut,
     summary="Создать организацию",
     description="""
@@ -110,11 +252,17 @@ async def get_organization(
     }
 )
 async def create_organization(org_in: OrganizationCreate, db: AsyncSession = Depends(get_db_session)):
+    if organization_writes.enabled:
+        return await organization_writes.submit((None, org_in))
     return await OrganizationCRUD.create(db, org_in)
 
 
 @router.put(
     "/{org_id}",
+    dependencies=[
+        Depends(organization_writes.write_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     response_model=OrganizationOut,
     summary="Обновить данные организации",
     responses={
@@ -127,7 +275,10 @@ async def update_organization(
         org_id: int = Path(..., description="ID организации"),
         db: AsyncSession = Depends(get_db_session)
 ):
-    org = await OrganizationCRUD.update(db, org_id, org_in)
+    if organization_writes.enabled:
+        org = await organization_writes.submit((org_id, org_in))
+    else:
+        org = await OrganizationCRUD.update(db, org_id, org_in)
     if not org:
         raise OrganizationNotFound
     return org
@@ -135,6 +286,10 @@ async def update_organization(
 
 @router.delete(
     "/{org_id}",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)),
+    ],
     summary="Удалить организацию",
     responses={
         200: {
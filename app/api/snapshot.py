@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.admission import Priority, db_slot
+from app.core.config import settings
+from app.core.snapshot import snapshots
+from app.crud.changes import ChangeCRUD
+from app.db.session import get_db_session, statement_timeout
+
+router = APIRouter(
+    prefix="/snapshot",
+    tags=["Снимок справочника"],
+)
+
+
+@router.get(
+    "/",
+    dependencies=[
+        Depends(db_slot(Priority.NORMAL)),
+        Depends(statement_timeout(settings.STATEMENT_TIMEOUT_READ_MS)),
+    ],
+    response_class=FileResponse,
+    summary="Скачать офлайн-снимок справочника",
+    description="""
+Возвращает SQLite-базу со всем справочником для локальной фильтрации без обращения к API:
+- `activities` (id, name, parent_id, level) и `activity_ancestors` (ancestor_id, activity_id) —
+  все потомки деятельности, включая её саму, одним запросом по индексу;
+- `buildings` (id, address, latitude, longitude);
+- `organizations` (id, name, building_id), `organization_phones`, `organization_activities`;
+- `meta`: формат и версия снимка.
+
+Версия снимка — `seq` последнего изменения из `/changes`; после загрузки снимка клиент может
+догонять изменения через `/changes?since=<версия>`. Снимок пересобирается в фоне после изменений,
+но не чаще, чем раз в `SNAPSHOT_MIN_INTERVAL` секунд.
+
+Поддерживаются `ETag`/`If-None-Match` (ответ `304`) и докачка через `Range`/`If-Range`.
+""",
+    responses={
+        200: {"description": "Файл SQLite", "content": {"application/vnd.sqlite3": {}}},
+        304: {"description": "Снимок не изменился"},
+    },
+)
+async def get_snapshot(request: Request, db: AsyncSession = Depends(get_db_session)):
+    path, version = await snapshots.current(await ChangeCRUD.last_seq(db))
+    etag = f'"handbook-{version}"'
+    headers = {"ETag": etag, "X-Snapshot-Version": str(version), "Cache-Control": "no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="application/vnd.sqlite3", filename=path.name, headers=headers)
@@ -0,0 +1,104 @@
+import asyncio
+import heapq
+import itertools
+from enum import IntEnum
+
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloaded
+
+
+class Priority(IntEnum):
+    """Чем меньше значение, тем раньше запрос получает слот."""
+    HIGH = 0  # чтение одной сущности по ID
+    NORMAL = 1  # запись
+    LOW = 2  # списки и тяжёлые выборки
+    BACKGROUND = 3  # порции фоновых задач
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self, priority: Priority):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise ServiceOverloaded
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (int(priority), next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # слот уже передан этому запросу — возвращаем его следующему
+                self.release()
+            else:
+                future.cancel()
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise ServiceOverloaded
+            raise
+        self.admitted += 1
+
+    def release(self):
+        # слот передаётся первому ожидающему без уменьшения счётчика активных
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def snapshot(self) -> dict:
+        waiting = {p.name.lower(): 0 for p in Priority}
+        for priority, _, _ in self._waiters:
+            waiting[Priority(priority).name.lower()] += 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": waiting,
+            "admitted_total": self.admitted,
+            "queued_total": self.queued,
+            "rejected_total": self.rejected,
+            "timed_out_total": self.timed_out,
+        }
+
+
+admission = AdmissionController(
+    max_concurrency=settings.ADMISSION_MAX_CONCURRENCY,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+)
+
+
+def db_slot(priority: Priority):
+    """Зависимость маршрута: занимает слот доступа к БД на время обработки запроса."""
+    async def dependency():
+        await admission.acquire(priority)
+        try:
+            yield
+        finally:
+            admission.release()
+
+    return dependency
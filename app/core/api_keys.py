@@ -0,0 +1,111 @@
+import hashlib
+import hmac
+import json
+import time
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+
+
+class TokenBucket:
+    """
+    Без блокировок: take вызывается только из цикла событий — зависимости app.core.dependencies
+    объявлены async, и FastAPI не уносит их в пул потоков.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def take(self, cost: float = 1) -> tuple[bool, int, float]:
+        """Возвращает (разрешено, остаток токенов, через сколько секунд повторить)."""
+        if self.unlimited:
+            return True, self.capacity, 0.0
+
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, int(self.tokens), 0.0
+        return False, 0, (cost - self.tokens) / self.rate
+
+
+@dataclass
+class ApiKey:
+    name: str
+    digest: bytes
+    admin: bool
+    requests: TokenBucket
+    expensive: TokenBucket
+    limited: int = field(default=0)
+    expensive_limited: int = field(default=0)
+
+
+def _digest(raw: str) -> bytes:
+    return hashlib.sha256(raw.encode()).digest()
+
+
+class ApiKeyRegistry:
+    """
+    Ключи хранятся по SHA-256 дайджесту: поиск — одно обращение к словарю,
+    а время сравнения не зависит от того, сколько символов ключа совпало.
+    """
+
+    def __init__(self):
+        self._keys: dict[bytes, ApiKey] = {}
+
+    def add(self, raw: str, name: str, admin: bool = False,
+            rate: float = settings.RATE_LIMIT_RATE,
+            burst: int = settings.RATE_LIMIT_BURST,
+            expensive_rate: float = settings.RATE_LIMIT_EXPENSIVE_RATE,
+            expensive_burst: int = settings.RATE_LIMIT_EXPENSIVE_BURST):
+        digest = _digest(raw)
+        self._keys[digest] = ApiKey(
+            name=name,
+            digest=digest,
+            admin=admin,
+            requests=TokenBucket(rate, burst),
+            expensive=TokenBucket(expensive_rate, expensive_burst),
+        )
+
+    def lookup(self, raw: str) -> ApiKey | None:
+        digest = _digest(raw)
+        key = self._keys.get(digest)
+        if key is None or not hmac.compare_digest(key.digest, digest):
+            return None
+        return key
+
+    def snapshot(self) -> dict:
+        return {
+            key.name: {
+                "admin": key.admin,
+                "requests_remaining": None if key.requests.unlimited else int(key.requests.tokens),
+                "expensive_remaining": None if key.expensive.unlimited else int(key.expensive.tokens),
+                "limited_total": key.limited,
+                "expensive_limited_total": key.expensive_limited,
+            }
+            for key in self._keys.values()
+        }
+
+
+def load_api_keys() -> ApiKeyRegistry:
+    registry = ApiKeyRegistry()
+    if settings.api_key:
+        registry.add(settings.api_key, name="default", admin=True)
+    if settings.API_KEYS:
+        for i, (raw, options) in enumerate(json.loads(settings.API_KEYS).items(), start=1):
+            registry.add(raw, **{"name": f"key-{i}", **options})
+    return registry
+
+
+api_keys = load_api_keys()
@@ -17,7 +17,110 @@ class Settings(BaseSettings):
         f"{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
     )
 
+    # Пул соединений (для primary и каждой реплики отдельно)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    # Сколько секунд ждать свободного соединения, прежде чем вернуть ошибку
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 30))
+    # Соединения старше DB_POOL_RECYCLE секунд переоткрываются; -1 — без ограничения
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", -1))
+    # Проверять соединение (SELECT 1) при выдаче из пула: дороже, но переживает рестарт БД и балансировщика
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "false").lower() == "true"
+    # Кэш подготовленных выражений asyncpg на соединение; 0 — для pgbouncer в режиме transaction
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", 100))
+    # Кэш скомпилированных запросов SQLAlchemy (число разных форм запросов) на движок
+    DB_QUERY_CACHE_SIZE: int = int(os.getenv("DB_QUERY_CACHE_SIZE", 500))
+    # Печатать SQL-запросы в лог
+    DB_ECHO: bool = os.getenv("DB_ECHO", "false").lower() == "true"
+
+    # Реплики только для чтения: URL через запятую (postgresql+asyncpg://...); пусто — всё читается с primary
+    DB_REPLICA_URLS: str = os.getenv("DB_REPLICA_URLS", "")
+    # Выбор реплики: round_robin или least_connections (меньше всего занятых соединений пула)
+    DB_REPLICA_STRATEGY: str = os.getenv("DB_REPLICA_STRATEGY", "round_robin")
+    # Через сколько секунд недоступная реплика снова получает запросы
+    DB_REPLICA_RETRY_SECONDS: float = float(os.getenv("DB_REPLICA_RETRY_SECONDS", 30))
+    # Таймаут подключения к реплике, после которого запрос уходит на другую реплику или primary
+    DB_REPLICA_CONNECT_TIMEOUT: float = float(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", 2))
+    # Сколько секунд после записи клиент читает с primary, чтобы видеть свои изменения
+    DB_READ_AFTER_WRITE_SECONDS: float = float(os.getenv("DB_READ_AFTER_WRITE_SECONDS", 5))
+
     api_key: str = os.getenv("API_KEY")
+    # Дополнительные ключи в JSON: {"<ключ>": {"name": "partner", "rate": 10, "burst": 20,
+    # "expensive_rate": 1, "expensive_burst": 5, "admin": false}}; пропущенные лимиты берутся по умолчанию
+    API_KEYS: str = os.getenv("API_KEYS", "")
+
+    # Token bucket на ключ: rate — запросов в секунду, burst — ёмкость; 0 отключает лимит
+    RATE_LIMIT_RATE: float = float(os.getenv("RATE_LIMIT_RATE", 20))
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", 40))
+    # Отдельный бюджет для дорогих маршрутов (списки, геопоиск, выгрузки)
+    RATE_LIMIT_EXPENSIVE_RATE: float = float(os.getenv("RATE_LIMIT_EXPENSIVE_RATE", 2))
+    RATE_LIMIT_EXPENSIVE_BURST: int = int(os.getenv("RATE_LIMIT_EXPENSIVE_BURST", 10))
+
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Доля запросов, попадающих в access-лог (ответы 5xx пишутся всегда)
+    ACCESS_LOG_SAMPLE_RATE: float = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", 1.0))
+
+    # Профилирование отдельных запросов по заголовку X-Profile: 1 (только для админ-ключа)
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILE_KEEP: int = int(os.getenv("PROFILE_KEEP", 20))
+    # Журнал медленных SQL-запросов; 0 отключает
+    SLOW_QUERY_MS: int = int(os.getenv("SLOW_QUERY_MS", 0))
+    SLOW_QUERY_EXPLAIN: bool = os.getenv("SLOW_QUERY_EXPLAIN", "false").lower() == "true"
+    SLOW_QUERY_KEEP: int = int(os.getenv("SLOW_QUERY_KEEP", 100))
+
+    # Допуск запросов к БД: не больше ADMISSION_MAX_CONCURRENCY одновременно,
+    # остальные ждут в очереди ограниченной длины, лишние получают 503.
+    ADMISSION_MAX_CONCURRENCY: int = int(os.getenv("ADMISSION_MAX_CONCURRENCY", 15))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", 100))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 5))
+    ADMISSION_RETRY_AFTER: int = int(os.getenv("ADMISSION_RETRY_AFTER", 1))
+
+    # Групповой коммит одиночных записей организаций (POST и PUT /organizations): записи из разных
+    # запросов копятся GROUP_COMMIT_WINDOW_MS (не больше GROUP_COMMIT_MAX_BATCH) и фиксируются
+    # одной транзакцией; при очереди больше GROUP_COMMIT_MAX_QUEUE запись получает 503
+    GROUP_COMMIT_ENABLED: bool = os.getenv("GROUP_COMMIT_ENABLED", "false").lower() == "true"
+    GROUP_COMMIT_WINDOW_MS: float = float(os.getenv("GROUP_COMMIT_WINDOW_MS", 3))
+    GROUP_COMMIT_MAX_BATCH: int = int(os.getenv("GROUP_COMMIT_MAX_BATCH", 500))
+    GROUP_COMMIT_MAX_QUEUE: int = int(os.getenv("GROUP_COMMIT_MAX_QUEUE", 5000))
+
+    # Прогрев при старте: сколько соединений каждого пула открыть и подготовить, пауза между попытками
+    WARMUP_CONNECTIONS: int = int(os.getenv("WARMUP_CONNECTIONS", os.getenv("DB_POOL_SIZE", 5)))
+    WARMUP_RETRY_SECONDS: float = float(os.getenv("WARMUP_RETRY_SECONDS", 5))
+    # Сколько секунд /health/ready ждёт ответа primary
+    HEALTH_DB_TIMEOUT: float = float(os.getenv("HEALTH_DB_TIMEOUT", 1))
+
+    # Кэш готовых ответов списков с заранее сжатыми вариантами; 0 отключает.
+    # Тела меньше RESPONSE_CACHE_MIN_COMPRESS_BYTES отдаются без сжатия
+    RESPONSE_CACHE_MAX_BYTES: int = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    RESPONSE_CACHE_MIN_COMPRESS_BYTES: int = int(os.getenv("RESPONSE_CACHE_MIN_COMPRESS_BYTES", 1024))
+    # Размер ячейки сетки индекса /organizations/nearby, км
+    NEARBY_CELL_KM: float = float(os.getenv("NEARBY_CELL_KM", 1))
+    # Как часто индекс /organizations/nearby сверяется с журналом изменений, сек; 0 — на каждый запрос
+    NEARBY_SYNC_SECONDS: float = float(os.getenv("NEARBY_SYNC_SECONDS", 1))
+    # Сколько точных количеств (count=exact) по наборам фильтров хранить до следующего изменения данных
+    COUNT_CACHE_SIZE: int = int(os.getenv("COUNT_CACHE_SIZE", 1000))
+
+    # Офлайн-снимок справочника (SQLite) для GET /snapshot
+    SNAPSHOT_DIR: str = os.getenv("SNAPSHOT_DIR", "/tmp/handbook-snapshots")
+    SNAPSHOT_MIN_INTERVAL: int = int(os.getenv("SNAPSHOT_MIN_INTERVAL", 60))
+
+    # Фоновые задачи (/jobs): каталог для входных и выходных файлов, общий лимит одновременных задач
+    # и лимиты по видам в JSON ({"export": 2}; по умолчанию 1), процессы для CPU-тяжёлых шагов
+    JOBS_DIR: str = os.getenv("JOBS_DIR", "/tmp/handbook-jobs")
+    JOBS_MAX_CONCURRENCY: int = int(os.getenv("JOBS_MAX_CONCURRENCY", 2))
+    JOBS_CONCURRENCY: str = os.getenv("JOBS_CONCURRENCY", "")
+    JOBS_PROCESS_WORKERS: int = int(os.getenv("JOBS_PROCESS_WORKERS", 2))
+    # Размер порции: столько строк обрабатывается и фиксируется в одной транзакции
+    JOBS_BATCH_SIZE: int = int(os.getenv("JOBS_BATCH_SIZE", 5000))
+    JOBS_POLL_SECONDS: float = float(os.getenv("JOBS_POLL_SECONDS", 2))
+    JOBS_HEARTBEAT_SECONDS: float = float(os.getenv("JOBS_HEARTBEAT_SECONDS", 5))
+    # Задача без отметки исполнителя дольше этого времени считается брошенной и запускается снова
+    JOBS_STALE_SECONDS: float = float(os.getenv("JOBS_STALE_SECONDS", 60))
+
+    # statement_timeout (мс) для запросов разных классов маршрутов
+    STATEMENT_TIMEOUT_READ_MS: int = int(os.getenv("STATEMENT_TIMEOUT_READ_MS", 2000))
+    STATEMENT_TIMEOUT_LIST_MS: int = int(os.getenv("STATEMENT_TIMEOUT_LIST_MS", 15000))
+    STATEMENT_TIMEOUT_WRITE_MS: int = int(os.getenv("STATEMENT_TIMEOUT_WRITE_MS", 5000))
 
 
 settings = Settings()
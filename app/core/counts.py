@@ -0,0 +1,116 @@
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from app.core.config import settings
+from app.crud.changes import ChangeCRUD
+
+NONE = "none"
+ESTIMATED = "estimated"
+EXACT = "exact"
+COUNT_MODES = (NONE, ESTIMATED, EXACT)
+
+# Описание подсчёта; дополняет description маршрута
+COUNT_DESCRIPTION = """
+Постраничный вывод: `limit` и `offset` (строки упорядочены по `id`). Параметр `count` — общее число
+подходящих строк в заголовке `X-Total-Count`:
+- `none` (по умолчанию) — не считать;
+- `estimated` — оценка без обхода строк: статистика таблицы (`pg_class.reltuples`) без фильтров
+  или оценка планировщика для запроса с фильтрами; может отличаться от точного числа;
+- `exact` — точное число; кэшируется до следующего изменения данных, поэтому листание страниц
+  не пересчитывает его на каждом запросе.
+
+На последней странице число известно без подсчёта, и заголовок точен в любом режиме, кроме `none`.
+"""
+
+TABLE_ROWS = text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)")
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (FORMAT JSON) для собранного запроса; параметры передаются как при обычном выполнении."""
+    inherit_cache = True
+    _traverse_internals = [("statement", InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def estimate_rows(session: AsyncSession, statement, params: dict) -> int:
+    """Оценка планировщиком числа строк запроса — без его выполнения."""
+    result = await session.execute(Explain(statement), params)
+    return int(result.scalar()[0]["Plan"]["Plan Rows"])
+
+
+async def table_rows(session: AsyncSession, table: str) -> int | None:
+    """Число строк таблицы по статистике; None, если таблицу ещё не анализировали."""
+    rows = await session.scalar(TABLE_ROWS, {"table": table})
+    return rows if rows is not None and rows >= 0 else None
+
+
+def known_total(limit: int | None, offset: int, returned: int) -> int | None:
+    """Общее число строк, если оно следует из самой страницы: она последняя и не пустая (или первая)."""
+    if (limit is None or returned < limit) and (returned or not offset):
+        return offset + returned
+    return None
+
+
+class CountCache:
+    """
+    Точные количества строк по наборам фильтров.
+
+    Версия — seq последнего изменения из журнала /changes: любая запись в справочник делает
+    все сохранённые количества устаревшими, в том числе записи через другие экземпляры сервиса.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._counts: OrderedDict[tuple, tuple[int, int]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, session: AsyncSession, key: tuple, count: Callable[[], Awaitable[int]]) -> int:
+        version = await ChangeCRUD.last_seq(session)
+        cached = self._counts.get(key)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            self._counts.move_to_end(key)
+            return cached[1]
+        self.misses += 1
+        total = await count()
+        self._counts[key] = (version, total)
+        self._counts.move_to_end(key)
+        while len(self._counts) > self.size:
+            self._counts.popitem(last=False)
+        return total
+
+    def snapshot(self) -> dict:
+        return {"entries": len(self._counts), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+exact_counts = CountCache(settings.COUNT_CACHE_SIZE)
+
+
+async def total_count_headers(
+        mode: str,
+        limit: int | None,
+        offset: int,
+        returned: int,
+        count: Callable[[str], Awaitable[int | None]],
+) -> dict:
+    """Заголовок X-Total-Count для режима mode; count(mode) считается, только если страница его не даёт."""
+    if mode == NONE:
+        return {}
+    total = known_total(limit, offset, returned)
+    if total is None:
+        total = await count(mode)
+    return {"X-Total-Count": str(total)} if total is not None else {}
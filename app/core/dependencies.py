@@ -1,13 +1,52 @@
-from fastapi import Security
+from fastapi import Request, Security
 from fastapi.security.api_key import APIKeyHeader
-from app.core.config import settings
-from app.core.exceptions import NoAPIKey, WrongAPIKey
+from app.core.api_keys import ApiKey, api_keys
+from app.core.exceptions import AdminRequired, NoAPIKey, WrongAPIKey, rate_limit_exceeded
 
 api_key_header = APIKeyHeader(name="API-Key", auto_error=False)
 
 
-def verify_api_key(api_key: str = Security(api_key_header)):
+def _add_response_headers(request: Request, headers: dict[str, str]):
+    # Заголовки добавляет StateHeadersMiddleware — так они попадают и в ответы,
+    # которые обработчик возвращает готовым объектом Response
+    request.state.response_headers = {**getattr(request.state, "response_headers", {}), **headers}
+
+
+async def verify_api_key(request: Request, api_key: str = Security(api_key_header)) -> ApiKey:
     if not api_key:
         raise NoAPIKey
-    if api_key != settings.api_key:
+    key = api_keys.lookup(api_key)
+    if key is None:
         raise WrongAPIKey
+
+    allowed, remaining, retry_after = key.requests.take()
+    if not allowed:
+        key.limited += 1
+        raise rate_limit_exceeded(key.requests.capacity, retry_after)
+    if not key.requests.unlimited:
+        _add_response_headers(request, {
+            "X-RateLimit-Limit": str(key.requests.capacity),
+            "X-RateLimit-Remaining": str(remaining),
+        })
+
+    request.state.api_key = key
+    return key
+
+
+async def expensive_quota(request: Request):
+    """Списывает токен из отдельного бюджета дорогих маршрутов (списки, геопоиск, выгрузки)."""
+    key: ApiKey = request.state.api_key
+    allowed, remaining, retry_after = key.expensive.take()
+    if not allowed:
+        key.expensive_limited += 1
+        raise rate_limit_exceeded(key.expensive.capacity, retry_after)
+    if not key.expensive.unlimited:
+        _add_response_headers(request, {
+            "X-RateLimit-Expensive-Limit": str(key.expensive.capacity),
+            "X-RateLimit-Expensive-Remaining": str(remaining),
+        })
+
+
+async def require_admin(request: Request):
+    if not request.state.api_key.admin:
+        raise AdminRequired
@@ -0,0 +1,32 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+# SQLSTATE query_canceled: сработал statement_timeout
+QUERY_CANCELED = "57014"
+
+
+async def integrity_error_handler(request: Request, exc: IntegrityError):
+    if "foreign key constraint" in str(exc.orig).lower():
+        return JSONResponse(status_code=404, content={"detail": "Связанный объект не найден"})
+    elif "unique constraint" in str(exc.orig).lower():
+        return JSONResponse(status_code=409, content={"detail": "Запись с такими данными уже существует"})
+    return JSONResponse(status_code=400, content={"detail": "Ошибка целостности данных"})
+
+
+async def dbapi_error_handler(request: Request, exc: DBAPIError):
+    if getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED:
+        return JSONResponse(status_code=504, content={"detail": "Превышено время выполнения запроса к базе данных"})
+    # остальные ошибки БД обрабатывает AccessLogMiddleware как 500
+    raise exc
+
+
+async def value_error_handler(request: Request, exc: ValueError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+exception_handlers = {
+    IntegrityError: integrity_error_handler,
+    DBAPIError: dbapi_error_handler,
+    ValueError: value_error_handler,
+}
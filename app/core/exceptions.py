@@ -1,10 +1,69 @@
+import math
 from fastapi import HTTPException, status
+from app.core.config import settings
 
 OrganizationNotFound = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Организация не найдена")
 ActivityNotFound = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Деятельность не найдена")
 BuildingNotFound = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Здание не найдено")
 NoAPIKey = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Отсутсвует API key")
 WrongAPIKey = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный API key")
+ProfileNotFound = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Профиль не найден")
+AdminRequired = HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Требуется административный API key")
 ParentActivityNotFound = HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                                        detail="Родительская деятельность не найдена")
+PhoneTooShort = HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                              detail="Для поиска по телефону нужно не менее 5 цифр")
 MaxLevelReached = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Максимальная вложенность достигнута")
+JobNotFound = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Задача не найдена")
+JobResultNotFound = HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                  detail="У задачи нет готового файла результата")
+JobInputRequired = HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                 detail="Для задачи нужно передать данные в теле запроса")
+InvalidCursor = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Неверный курсор")
+ArrowIncludeNotSupported = HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE,
+                                         detail="Формат Arrow не поддерживает include")
+ServiceOverloaded = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Сервис перегружен, повторите запрос позже",
+    headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+)
+
+
+def rate_limit_exceeded(limit: int, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Превышен лимит запросов",
+        headers={
+            "Retry-After": str(max(1, math.ceil(retry_after))),
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Remaining": "0",
+        },
+    )
+
+
+def invalid_fields(unknown: list[str], allowed: tuple[str, ...]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Неизвестные поля: {', '.join(unknown)}. Допустимые: {', '.join(allowed)}",
+    )
+
+
+def invalid_include(unknown: list[str], allowed: tuple[str, ...]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Неизвестные связи в include: {', '.join(unknown)}. Допустимые: {', '.join(allowed)}",
+    )
+
+
+def unknown_job_kind(kind: str, allowed) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Неизвестный вид задачи: {kind}. Допустимые: {', '.join(allowed)}",
+    )
+
+
+def invalid_job_format(value: str, allowed: tuple[str, ...]) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Неподдерживаемый формат: {value}. Допустимые: {', '.join(allowed) or 'нет'}",
+    )
@@ -0,0 +1,116 @@
+import msgpack
+import pyarrow as pa
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+# при равном q из Accept выбирается формат, стоящий раньше
+MEDIA_TYPES = (JSON, MSGPACK, ARROW)
+# ответ зависит от Accept — кэши должны это учитывать
+VARY = {"Vary": "Accept"}
+
+# Описание форматов для списков; дополняет description маршрута
+FORMATS_DESCRIPTION = """
+Формат ответа выбирается заголовком `Accept`:
+- `application/json` (по умолчанию);
+- `application/msgpack` — та же структура, что и в JSON, в MessagePack;
+- `application/vnd.apache.arrow.stream` — таблица Arrow IPC (stream) по колонкам: ID — `int32`,
+  координаты — `float64`, телефоны — `list<string>`, деятельности организации — `activity_ids: list<int32>`.
+  Не совместим с `include`.
+"""
+FORMATS_CONTENT = {
+    MSGPACK: {"schema": {"type": "string", "format": "binary"}},
+    ARROW: {"schema": {"type": "string", "format": "binary"}},
+}
+
+ARROW_TYPES = {
+    "id": pa.int32(),
+    "name": pa.string(),
+    "address": pa.string(),
+    "phones": pa.list_(pa.string()),
+    "building_id": pa.int32(),
+    "parent_id": pa.int32(),
+    "level": pa.int32(),
+    "latitude": pa.float64(),
+    "longitude": pa.float64(),
+    "activity_ids": pa.list_(pa.int32()),
+}
+
+
+def accept_weights(header: str) -> dict[str, float]:
+    """Значения заголовка Accept или Accept-Encoding с их q: {"application/json": 1.0, "*/*": 0.1}."""
+    weights = {}
+    for part in header.split(","):
+        value, *options = (p.strip() for p in part.split(";"))
+        q = 1.0
+        for option in options:
+            key, _, number = option.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        if value:
+            weights[value.lower()] = q
+    return weights
+
+
+def negotiate(accept: str | None) -> str:
+    """Выбирает формат ответа по заголовку Accept; без подходящего формата — JSON."""
+    if not accept:
+        return JSON
+    weights = accept_weights(accept)
+
+    def weight(media_type: str) -> float:
+        for key in (media_type, media_type.split("/")[0] + "/*", "*/*"):
+            if key in weights:
+                return weights[key]
+        return 0.0
+
+    best = max(MEDIA_TYPES, key=weight)
+    return best if weight(best) > 0 else JSON
+
+
+def arrow_batch(columns: dict[str, list]) -> pa.RecordBatch:
+    """Собирает RecordBatch из колонок-списков; типы колонок — по ARROW_TYPES."""
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=ARROW_TYPES[name]) for name, values in columns.items()],
+        names=list(columns),
+    )
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, datetime=True)
+
+
+class ArrowResponse(Response):
+    """Поток Arrow IPC из одной RecordBatch; content — колонки {имя: список значений}."""
+    media_type = ARROW
+
+    def render(self, content: dict[str, list]) -> bytes:
+        batch = arrow_batch(content)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, batch.schema) as writer:
+            writer.write_batch(batch)
+        return sink.getvalue().to_pybytes()
+
+
+def accepted(request: Request) -> str:
+    return negotiate(request.headers.get("accept"))
+
+
+def rows_response(media_type: str, content, headers: dict | None = None) -> Response:
+    """Строки списка в JSON или MessagePack; сериализуются напрямую, минуя повторную валидацию response_model."""
+    headers = {**VARY, **(headers or {})}
+    if media_type == MSGPACK:
+        return MsgPackResponse(content, headers=headers)
+    return ORJSONResponse(content, headers=headers)
+
+
+def columns_response(columns: dict[str, list], headers: dict | None = None) -> Response:
+    return ArrowResponse(columns, headers={**VARY, **(headers or {})})
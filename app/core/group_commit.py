@@ -0,0 +1,172 @@
+import asyncio
+import contextvars
+import logging
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.admission import Priority, admission, db_slot
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloaded
+from app.crud.organizations import OrganizationCRUD
+from app.db.session import AsyncSessionLocal, statement_timeout
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommit:
+    """
+    Конвейер записи с групповым коммитом.
+
+    Одиночные записи из разных запросов копятся в очереди в течение window_ms (не больше max_batch)
+    и применяются функцией apply одной транзакцией с одним коммитом — одним сбросом WAL на всю группу
+    вместо сброса на каждую запись. apply(session, items) возвращает по результату на элемент:
+    значение или исключение; каждый запрос получает свой. Результат отдаётся только после коммита,
+    поэтому ответ по-прежнему означает сохранённую запись. Пока группа фиксируется, следующая копится
+    в очереди: чем больше нагрузка, тем крупнее группы.
+    """
+
+    def __init__(
+            self,
+            apply: Callable[[AsyncSession, list], Awaitable[list]],
+            enabled: bool,
+            window_ms: float,
+            max_batch: int,
+            max_queue: int,
+    ):
+        self.apply = apply
+        self.enabled = enabled
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+
+        self.writes = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.failed_batches = 0
+        self.rejected = 0
+
+    def start(self):
+        if self.enabled:
+            # свой контекст: statement_timeout записи ставится в задаче конвейера, а не в запросе
+            self._worker = asyncio.create_task(self._run(), context=contextvars.Context())
+            self._worker.add_done_callback(self._reject_queued)
+
+    async def stop(self):
+        """Дописывает то, что уже в очереди, и останавливает конвейер."""
+        if self._worker is not None and not self._worker.done():
+            self._queue.put_nowait(_STOP)
+            await self._worker
+        self._worker = None
+
+    def _reject_queued(self, _worker: asyncio.Task):
+        # конвейер завершился (остановлен или снят) — записям в очереди ответ уже не придёт
+        while not self._queue.empty():
+            entry = self._queue.get_nowait()
+            if entry is not _STOP and not entry[1].done():
+                self.rejected += 1
+                entry[1].set_exception(ServiceOverloaded)
+
+    async def submit(self, item):
+        """Ставит запись в очередь и ждёт коммита её группы; ошибка этой записи поднимается здесь."""
+        future = asyncio.get_running_loop().create_future()
+        if self._worker is None or self._worker.done():
+            # конвейер не запущен или остановлен — запись фиксируется сразу, группой из одной записи
+            await self._commit([(item, future)])
+            return await future
+        if self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise ServiceOverloaded
+        self._queue.put_nowait((item, future))
+        return await future
+
+    async def _run(self):
+        await statement_timeout(settings.STATEMENT_TIMEOUT_WRITE_MS)()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                entry = self._queue.get_nowait()
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                # сбой одной группы не останавливает конвейер: ошибку получают только её запросы
+                logger.exception("group commit of %d writes crashed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _commit(self, batch: list):
+        # запросы, которые ушли, не дождавшись, в группу не попадают
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        try:
+            await admission.acquire(Priority.NORMAL)
+            try:
+                async with AsyncSessionLocal() as session:
+                    results = await self.apply(session, [item for item, _ in batch])
+            finally:
+                admission.release()
+        except Exception as e:
+            # транзакция группы не зафиксирована — ошибку получает каждый запрос группы
+            self.failed_batches += 1
+            logger.warning("group commit of %d writes failed: %r", len(batch), e)
+            results = [e] * len(batch)
+
+        self.writes += len(batch)
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def write_slot(self, priority: Priority):
+        """
+        Зависимость маршрута записи. С конвейером слот допуска к БД занимает сама группа,
+        а не каждый ожидающий запрос — иначе размер группы ограничил бы ADMISSION_MAX_CONCURRENCY.
+        """
+        if not self.enabled:
+            return db_slot(priority)
+
+        async def dependency():
+            return None
+
+        return dependency
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "writes": self.writes,
+            "batches": self.batches,
+            "avg_batch": round(self.writes / self.batches, 1) if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "failed_batches": self.failed_batches,
+            "rejected": self.rejected,
+        }
+
+
+organization_writes = GroupCommit(
+    OrganizationCRUD.write_batch,
+    enabled=settings.GROUP_COMMIT_ENABLED,
+    window_ms=settings.GROUP_COMMIT_WINDOW_MS,
+    max_batch=settings.GROUP_COMMIT_MAX_BATCH,
+    max_queue=settings.GROUP_COMMIT_MAX_QUEUE,
+)
@@ -0,0 +1,303 @@
+import asyncio
+import gzip
+import itertools
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+import msgpack
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, text
+
+from app.core.config import settings
+from app.core.formats import ARROW, MSGPACK, arrow_batch
+from app.core.jobs import JobContext, JobKind
+from app.core.snapshot import snapshots
+from app.core.utils import any_id, normalize_phone, phone_suffixes
+from app.crud.changes import ChangeCRUD, UPSERT
+from app.crud.organizations import ACTIVITY_IDS
+from app.crud.search import OrganizationSearchCRUD
+from app.db.session import AsyncSessionLocal
+from app.models.activity import Activity
+from app.models.building import Building
+from app.models.organization import Organization, organization_activities
+from app.schemas.activities import ActivityRead
+from app.schemas.organizations import OrganizationCreate
+
+# Сколько ошибок разбора сохраняется в результате задачи импорта
+MAX_REPORTED_ERRORS = 100
+
+RELEVEL_SQL = text("""
+WITH RECURSIVE tree AS (
+    SELECT id, 0 AS level FROM activities WHERE parent_id IS NULL
+    UNION ALL
+    SELECT a.id, t.level + 1 FROM activities a JOIN tree t ON a.parent_id = t.id
+)
+UPDATE activities a SET level = t.level
+FROM tree t
+WHERE a.id = t.id AND a.level <> t.level
+RETURNING a.id, a.name, a.parent_id, a.level
+""")
+
+EXPORT_COLUMNS = ("id", "name", "phones", "building_id", "latitude", "longitude", "activity_ids")
+EXPORT_QUERY = (
+    select(
+        Organization.id,
+        Organization.name,
+        Organization.phones,
+        Organization.building_id,
+        Building.latitude,
+        Building.longitude,
+        ACTIVITY_IDS,
+    )
+    # организации без здания тоже выгружаются — с пустыми координатами
+    .outerjoin(Building, Building.id == Organization.building_id)
+    .order_by(Organization.id)
+)
+# Маркер конца потока Arrow IPC
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+def job_path(name: str) -> Path:
+    return Path(settings.JOBS_DIR) / name
+
+
+# Функции ниже выполняются в пуле процессов: без обращений к БД, аргументы и результат — простые типы
+
+def parse_organizations(lines: list[bytes], first_line: int) -> tuple[list[dict], list[dict]]:
+    """Разбирает и проверяет строки NDJSON с организациями в формате OrganizationCreate."""
+    rows, errors = [], []
+    for line_no, line in enumerate(lines, start=first_line):
+        if not line.strip():
+            continue
+        try:
+            org = OrganizationCreate.model_validate(orjson.loads(line))
+        except (orjson.JSONDecodeError, ValidationError) as e:
+            errors.append({"line": line_no, "error": str(e)})
+            continue
+        normalized = [normalize_phone(p) for p in org.phones]
+        rows.append({
+            "line": line_no,
+            "name": org.name,
+            "phones": org.phones,
+            "phones_normalized": normalized,
+            "phone_suffixes": phone_suffixes(normalized),
+            "building_id": org.building_id,
+            "activity_ids": sorted(set(org.activity_ids)),
+        })
+    return rows, errors
+
+
+def encode_ndjson(rows: list[tuple]) -> bytes:
+    """Порция выгрузки: строки NDJSON, сжатые отдельным членом gzip — такие члены можно склеивать."""
+    lines = b"".join(orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows)
+    return gzip.compress(lines, compresslevel=6)
+
+
+def encode_msgpack(rows: list[tuple]) -> bytes:
+    """Порция выгрузки: объекты MessagePack подряд — файл читается потоковым Unpacker."""
+    return b"".join(msgpack.packb(dict(zip(EXPORT_COLUMNS, row))) for row in rows)
+
+
+def encode_arrow(rows: list[tuple]) -> bytes:
+    """Порция выгрузки: RecordBatch Arrow IPC, собранный по колонкам."""
+    columns = dict(zip(EXPORT_COLUMNS, map(list, zip(*rows))))
+    return arrow_batch(columns).serialize().to_pybytes()
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    extension: str
+    media_type: str
+    encode: Callable[[list[tuple]], bytes]
+    header: bytes = b""
+    footer: bytes = b""
+
+
+EXPORT_FORMATS = {
+    "ndjson": ExportFormat("ndjson.gz", "application/gzip", encode_ndjson),
+    "msgpack": ExportFormat("msgpack", MSGPACK, encode_msgpack),
+    # поток Arrow IPC: схема, RecordBatch каждой порции и маркер конца
+    "arrow": ExportFormat(
+        "arrows", ARROW, encode_arrow,
+        header=arrow_batch({c: [] for c in EXPORT_COLUMNS}).schema.serialize().to_pybytes(),
+        footer=ARROW_EOS,
+    ),
+}
+
+
+def _count_lines(path: Path) -> int:
+    with path.open("rb") as f:
+        return sum(1 for _ in f)
+
+
+def _line_offset(path: Path, line: int) -> int:
+    """Смещение в байтах начала строки line (с нуля) — для задач, прерванных до сохранения смещения."""
+    with path.open("rb") as f:
+        for _ in itertools.islice(f, line):
+            pass
+        return f.tell()
+
+
+def _read_lines(path: Path, offset: int, count: int) -> tuple[list[bytes], int]:
+    """До count строк с позиции offset и смещение, с которого читать следующую порцию."""
+    with path.open("rb") as f:
+        f.seek(offset)
+        lines = list(itertools.islice(f, count))
+        return lines, f.tell()
+
+
+async def import_organizations(ctx: JobContext):
+    """Загружает организации из NDJSON порциями; каждая порция фиксируется вместе с прогрессом."""
+    path = job_path(ctx.params["input"])
+    total = await asyncio.to_thread(_count_lines, path)
+    errors = ctx.result.get("errors", [])
+    imported = ctx.result.get("imported", 0)
+    error_count = ctx.result.get("error_count", 0)
+    # смещение следующей порции сохраняется вместе с прогрессом: файл не перечитывается с начала
+    offset = ctx.result.get("offset")
+    if offset is None:
+        offset = await asyncio.to_thread(_line_offset, path, ctx.done)
+
+    while ctx.done < total:
+        lines, offset = await asyncio.to_thread(_read_lines, path, offset, settings.JOBS_BATCH_SIZE)
+        rows, bad = await ctx.run_cpu(parse_organizations, lines, ctx.done + 1)
+
+        async with ctx.db_slot(), AsyncSessionLocal() as session:
+            building_ids = {r["building_id"] for r in rows}
+            activity_ids = {a for r in rows for a in r["activity_ids"]}
+            buildings = set((await session.execute(
+                select(Building.id).where(any_id(Building.id, building_ids))
+            )).scalars())
+            activities = dict((await session.execute(
+                select(Activity.id, Activity.name).where(any_id(Activity.id, activity_ids))
+            )).all())
+
+            valid = []
+            for r in rows:
+                missing = [a for a in r["activity_ids"] if a not in activities]
+                if r["building_id"] not in buildings:
+                    bad.append({"line": r["line"], "error": f"Здание {r['building_id']} не найдено"})
+                elif missing:
+                    bad.append({"line": r["line"], "error": f"Деятельности не найдены: {missing}"})
+                else:
+                    valid.append(r)
+
+            if valid:
+                result = await session.execute(
+                    insert(Organization).returning(Organization.id, sort_by_parameter_order=True),
+                    [{k: r[k] for k in ("name", "phones", "phones_normalized", "phone_suffixes", "building_id")}
+                     for r in valid],
+                )
+                org_ids = list(result.scalars())
+                links = [{"organization_id": org_id, "activity_id": a}
+                         for org_id, r in zip(org_ids, valid) for a in r["activity_ids"]]
+                if links:
+                    await session.execute(insert(organization_activities), links)
+                await ChangeCRUD.record_many(session, "organization", [
+                    (org_id, UPSERT, {
+                        "id": org_id,
+                        "name": r["name"],
+                        "phones": r["phones"],
+                        "building_id": r["building_id"],
+                        "activities": [{"id": a, "name": activities[a]} for a in r["activity_ids"]],
+                    })
+                    for org_id, r in zip(org_ids, valid)
+                ])
+                await OrganizationSearchCRUD.refresh(session, org_ids)
+
+            imported += len(valid)
+            error_count += len(bad)
+            errors = (errors + sorted(bad, key=lambda e: e["line"]))[:MAX_REPORTED_ERRORS]
+            await ctx.advance(len(lines), session, total, imported=imported, error_count=error_count, errors=errors,
+                              offset=offset)
+            await session.commit()
+
+    path.unlink(missing_ok=True)
+
+
+async def export_organizations(ctx: JobContext):
+    """Выгружает все организации в файл формата params.format; кодирование порций идёт в пуле процессов."""
+    export_format = EXPORT_FORMATS[ctx.params.get("format", "ndjson")]
+    name = f"job-{ctx.id}-organizations.{export_format.extension}"
+    path = job_path(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    async with ctx.db_slot(), AsyncSessionLocal() as session:
+        total = await session.scalar(select(func.count()).select_from(Organization))
+        await ctx.advance(0, total=total)
+        with path.open("wb") as f:
+            f.write(export_format.header)
+            stream = await session.stream(EXPORT_QUERY)
+            async for batch in stream.partitions(settings.JOBS_BATCH_SIZE):
+                chunk = await ctx.run_cpu(export_format.encode, [tuple(row) for row in batch])
+                await asyncio.to_thread(f.write, chunk)
+                await ctx.advance(len(batch), file=name, media_type=export_format.media_type, bytes=f.tell())
+            f.write(export_format.footer)
+        await ctx.advance(0, bytes=path.stat().st_size)
+
+
+async def rebuild_search(ctx: JobContext):
+    """Пересобирает organization_search порциями по ID — без одной огромной транзакции."""
+    async with AsyncSessionLocal() as session:
+        total = await session.scalar(select(func.count()).select_from(Organization))
+    last_id = ctx.result.get("last_id", 0)
+    while True:
+        async with ctx.db_slot(), AsyncSessionLocal() as session:
+            ids = list((await session.execute(
+                select(Organization.id).where(Organization.id > last_id)
+                .order_by(Organization.id).limit(settings.JOBS_BATCH_SIZE)
+            )).scalars())
+            if not ids:
+                return
+            await OrganizationSearchCRUD.refresh(session, ids)
+            last_id = ids[-1]
+            await ctx.advance(len(ids), session, total, last_id=last_id)
+            await session.commit()
+
+
+async def relevel_activities(ctx: JobContext):
+    """Пересчитывает level деятельностей по фактической глубине в дереве; изменения попадают в журнал."""
+    async with ctx.db_slot(), AsyncSessionLocal() as session:
+        updated = (await session.execute(RELEVEL_SQL)).all()
+        for row in updated:
+            await ChangeCRUD.record(session, "activity", row.id, UPSERT,
+                                    ActivityRead.model_validate(row).model_dump(mode="json"))
+        await ctx.advance(len(updated), session, len(updated), updated=[row.id for row in updated])
+        await session.commit()
+
+
+async def rebuild_snapshot(ctx: JobContext):
+    path, version = await snapshots.rebuild()
+    await ctx.advance(1, total=1, file=path.name, version=version)
+
+
+KINDS = {kind.name: kind for kind in (
+    JobKind(
+        "import", import_organizations,
+        "Загрузка организаций из NDJSON в теле запроса (строка — объект как в POST /organizations/). "
+        "Строки с ошибками пропускаются и перечисляются в result.errors.",
+        resumable=True, accepts_input=True,
+    ),
+    JobKind(
+        "export", export_organizations,
+        "Выгрузка всех организаций с координатами зданий и ID деятельностей; файл — GET /jobs/{id}/result. "
+        "Формат — параметр format: ndjson (NDJSON.gz), msgpack (объекты MessagePack подряд), "
+        "arrow (поток Arrow IPC по колонкам).",
+        formats=tuple(EXPORT_FORMATS),
+    ),
+    JobKind(
+        "search-rebuild", rebuild_search,
+        "Пересборка таблицы поиска organization_search порциями.",
+        resumable=True,
+    ),
+    JobKind(
+        "activity-levels", relevel_activities,
+        "Пересчёт уровней деятельностей по фактической глубине в дереве.",
+    ),
+    JobKind(
+        "snapshot", rebuild_snapshot,
+        "Пересборка офлайн-снимка /snapshot без ожидания SNAPSHOT_MIN_INTERVAL.",
+    ),
+)}
@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.admission import Priority, admission
+from app.core.config import settings
+from app.crud.jobs import CANCELLED, DONE, FAILED, JobCRUD
+from app.db.session import AsyncSessionLocal
+from app.models.job import Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobContext:
+    """То, что видит обработчик задачи: параметры, прогресс, пул процессов и слот доступа к БД."""
+
+    def __init__(self, job: Job, resumable: bool, process_pool: Callable[[], ProcessPoolExecutor]):
+        self.id = job.id
+        self.params = job.params
+        # после перезапуска возобновляемая задача продолжает с сохранённого прогресса
+        self.done = job.done if resumable else 0
+        self.total = job.total if resumable else None
+        self.result = dict(job.result or {}) if resumable else {}
+        self.cancel_requested = False
+        self._process_pool = process_pool
+
+    async def run_cpu(self, fn, *args):
+        """Выполняет fn в пуле процессов, не блокируя цикл событий; fn и аргументы должны сериализоваться pickle."""
+        return await asyncio.get_running_loop().run_in_executor(self._process_pool(), fn, *args)
+
+    @asynccontextmanager
+    async def db_slot(self):
+        """Слот допуска к БД с низшим приоритетом: запросы API получают слоты раньше фоновых задач."""
+        while True:
+            try:
+                await admission.acquire(Priority.BACKGROUND)
+                break
+            except HTTPException:
+                # очередь допуска переполнена — фоновая задача подождёт, а не упадёт
+                await asyncio.sleep(settings.ADMISSION_RETRY_AFTER)
+        try:
+            yield
+        finally:
+            admission.release()
+
+    async def advance(self, count: int, session: AsyncSession | None = None, total: int | None = None, **result):
+        """
+        Учитывает обработанную порцию. С session прогресс пишется в её транзакцию —
+        порция и прогресс фиксируются вместе, и после перезапуска порция не повторится.
+        """
+        self.done += count
+        if total is not None:
+            self.total = total
+        self.result.update(result)
+        if session is not None:
+            await JobCRUD.progress(session, self.id, self.done, self.total, self.result)
+            return
+        async with AsyncSessionLocal() as own:
+            await JobCRUD.progress(own, self.id, self.done, self.total, self.result)
+            await own.commit()
+
+
+@dataclass(frozen=True)
+class JobKind:
+    name: str
+    run: Callable[[JobContext], Awaitable[None]]
+    description: str
+    # продолжает с сохранённого прогресса после перезапуска, а не начинает заново
+    resumable: bool = False
+    # принимает тело запроса (файл с данными)
+    accepts_input: bool = False
+    # допустимые значения параметра format; первый — по умолчанию
+    formats: tuple[str, ...] = ()
+
+
+class JobManager:
+    """
+    Исполнитель фоновых задач внутри процесса сервиса.
+
+    Задачи берутся из таблицы jobs (SELECT ... FOR UPDATE SKIP LOCKED — несколько процессов
+    делят очередь), одновременно выполняется не больше max_concurrency задач и не больше
+    лимита на вид задачи. Работа с БД идёт порциями через слоты допуска с низшим приоритетом,
+    CPU-тяжёлые шаги — в пуле процессов. Выполняющаяся задача раз в heartbeat_seconds отмечается
+    в БД и узнаёт о запрошенной отмене; задача без отметки дольше stale_seconds (процесс упал)
+    возвращается в очередь.
+    """
+
+    def __init__(self, limits: dict[str, int], max_concurrency: int, process_workers: int,
+                 poll_seconds: float, heartbeat_seconds: float, stale_seconds: float):
+        self.limits = limits
+        self.max_concurrency = max_concurrency
+        self.process_workers = process_workers
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.kinds: dict[str, JobKind] = {}
+        self._running: dict[int, tuple[str, asyncio.Task]] = {}
+        self._wake = asyncio.Event()
+        self._poller: asyncio.Task | None = None
+        self._pool: ProcessPoolExecutor | None = None
+
+    def limit(self, kind: str) -> int:
+        return self.limits.get(kind, 1)
+
+    def start(self, kinds: dict[str, JobKind]):
+        self.kinds = kinds
+        # чистый контекст: задачам не нужны statement_timeout и счётчики запроса
+        self._poller = asyncio.create_task(self._poll(), context=contextvars.Context())
+
+    async def stop(self):
+        """Останавливает приём задач; прерванные задачи возвращаются в очередь и продолжатся после запуска."""
+        tasks = [task for _, task in self._running.values()]
+        if self._poller is not None:
+            tasks.append(self._poller)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def wake(self):
+        """Проверить очередь сейчас, не дожидаясь poll_seconds."""
+        self._wake.set()
+
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn, а не fork: дочерний процесс не наследует цикл событий и соединения с БД
+            self._pool = ProcessPoolExecutor(self.process_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _has_slot(self, kind: str) -> bool:
+        running = sum(1 for k, _ in self._running.values() if k == kind)
+        return len(self._running) < self.max_concurrency and running < self.limit(kind)
+
+    async def _poll(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    await JobCRUD.reclaim_stale(session, self.stale_seconds)
+                    for kind in self.kinds:
+                        while self._has_slot(kind):
+                            job = await JobCRUD.claim(session, kind)
+                            if job is None:
+                                break
+                            self._launch(job)
+            except Exception:
+                logger.exception("job queue poll failed")
+            self._wake.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+
+    def _launch(self, job: Job):
+        task = asyncio.create_task(self._run(job), context=contextvars.Context())
+        self._running[job.id] = (job.kind, task)
+
+        def finished(_):
+            self._running.pop(job.id, None)
+            self.wake()
+
+        task.add_done_callback(finished)
+
+    async def _heartbeat(self, ctx: JobContext, work: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            async with AsyncSessionLocal() as session:
+                if await JobCRUD.heartbeat(session, ctx.id):
+                    ctx.cancel_requested = True
+                    work.cancel()
+                    return
+
+    async def _run(self, job: Job):
+        kind = self.kinds[job.kind]
+        ctx = JobContext(job, kind.resumable, self.process_pool)
+        logger.info("job %s (%s) started", job.id, job.kind)
+        work = asyncio.create_task(kind.run(ctx))
+        heartbeat = asyncio.create_task(self._heartbeat(ctx, work))
+        error = None
+        try:
+            await work
+            status = DONE
+        except asyncio.CancelledError:
+            if not ctx.cancel_requested:
+                # остановка процесса: задача продолжится после запуска
+                async with AsyncSessionLocal() as session:
+                    await JobCRUD.requeue(session, job.id)
+                raise
+            status = CANCELLED
+        except Exception as e:
+            logger.exception("job %s (%s) failed", job.id, job.kind)
+            status, error = FAILED, repr(e)
+            if isinstance(e, BrokenProcessPool):
+                # рабочий процесс упал: следующие задачи получат новый пул
+                self._pool = None
+        finally:
+            heartbeat.cancel()
+        async with AsyncSessionLocal() as session:
+            await JobCRUD.finish(session, job.id, status, ctx.done, ctx.total, ctx.result, error)
+        logger.info("job %s (%s) %s", job.id, job.kind, status)
+
+    def snapshot(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": [{"id": job_id, "kind": kind} for job_id, (kind, _) in self._running.items()],
+            "limits": {kind: self.limit(kind) for kind in self.kinds},
+        }
+
+
+jobs = JobManager(
+    limits=json.loads(settings.JOBS_CONCURRENCY) if settings.JOBS_CONCURRENCY else {},
+    max_concurrency=settings.JOBS_MAX_CONCURRENCY,
+    process_workers=settings.JOBS_PROCESS_WORKERS,
+    poll_seconds=settings.JOBS_POLL_SECONDS,
+    heartbeat_seconds=settings.JOBS_HEARTBEAT_SECONDS,
+    stale_seconds=settings.JOBS_STALE_SECONDS,
+)
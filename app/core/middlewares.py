@@ -1,26 +1,157 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from fastapi.responses import JSONResponse
-from sqlalchemy.exc import IntegrityError
-import traceback
+import asyncio
+import json
+import logging
+import random
+import time
 
+from app.core.config import settings
+from app.db.session import track_queries
 
-class CatchExceptionsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        try:
-            print(f"REQUEST: {request.method} {request.url}", flush=True)
-            return await call_next(request)
+logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("app.access")
+
+# Нестандартный код nginx "Client Closed Request"
+CLIENT_CLOSED_REQUEST = 499
+
+INTERNAL_ERROR_BODY = json.dumps({"detail": "Internal Server Error"}).encode()
+
+
+class AccessLogMiddleware:
+    """
+    Пишет структурированный access-лог (метод, путь, статус, длительность,
+    число и время SQL-запросов) и превращает необработанные исключения в 500.
+    """
+
+    def __init__(self, app, sample_rate: float = settings.ACCESS_LOG_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        except IntegrityError as e:
-            if "foreign key constraint" in str(e.orig).lower():
-                return JSONResponse(status_code=404, content={"detail": "Связанный объект не найден"})
-            elif "unique constraint" in str(e.orig).lower():
-                return JSONResponse(status_code=409, content={"detail": "Запись с такими данными уже существует"})
-            else:
-                return JSONResponse(status_code=400, content={"detail": "Ошибка целостности данных"})
+        started = time.perf_counter()
+        queries = track_queries()
+        response = {"status": None}
 
-        except ValueError as e:
-            return JSONResponse(status_code=400, content={"detail": str(e)})
+        async def logging_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            await send(message)
 
+        try:
+            await self.app(scope, receive, logging_send)
         except Exception:
-            print("🔥 Exception caught:", traceback.format_exc(), flush=True)
-            return JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+            logger.exception("Unhandled exception on %s %s", scope["method"], scope["path"])
+            if response["status"] is None:
+                response["status"] = 500
+                await send({
+                    "type": "http.response.start",
+                    "status": 500,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(INTERNAL_ERROR_BODY)).encode())],
+                })
+                await send({"type": "http.response.body", "body": INTERNAL_ERROR_BODY})
+        finally:
+            status = response["status"]
+            if (status is not None and status >= 500) or random.random() < self.sample_rate:
+                api_key = scope.get("state", {}).get("api_key")
+                access_logger.info("request", extra={"fields": {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": scope["query_string"].decode("latin-1"),
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "db_queries": queries.count,
+                    "db_ms": round(queries.duration * 1000, 2),
+                    "client": api_key.name if api_key else None,
+                }})
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    Отменяет обработку запроса, если клиент закрыл соединение.
+
+    Отмена задачи прерывает выполняющийся запрос asyncpg (драйвер отправляет
+    серверу cancel), освобождает слот допуска и соединение пула.
+
+    Запрос обрабатывается в задаче сервера; на запрос добавляется одна задача — она читает
+    сообщения клиента и при разрыве отменяет задачу сервера.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        messages = asyncio.Queue()
+        response = {"started": False, "complete": False, "disconnected": False}
+
+        async def tracking_send(message):
+            if message["type"] == "http.response.start":
+                response["started"] = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response["complete"] = True
+            await send(message)
+
+        async def watch():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    # после отправки ответа сервер тоже сообщает о disconnect — это не отмена
+                    if not response["complete"]:
+                        response["disconnected"] = True
+                        task.cancel()
+                    return
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await self.app(scope, messages.get, tracking_send)
+        except asyncio.CancelledError:
+            # снимается только своя отмена; отмена самим сервером (остановка) идёт дальше
+            if not response["disconnected"] or task.uncancel() > 0:
+                raise
+            if not response["started"]:
+                # клиент ответ уже не получит, но статус попадёт в access-лог
+                await send({"type": "http.response.start", "status": CLIENT_CLOSED_REQUEST, "headers": []})
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            watcher.cancel()
+
+
+class StateHeadersMiddleware:
+    """
+    Добавляет к ответу заголовки, которые зависимости сложили в request.state.response_headers.
+
+    FastAPI переносит заголовки из параметра Response зависимостей только в ответы,
+    собранные им самим; обработчики, возвращающие готовый ORJSONResponse или FileResponse,
+    их теряют. Заголовки, уже выставленные в ответе, не перезаписываются.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                extra = scope.get("state", {}).get("response_headers")
+                if extra:
+                    present = {name.lower() for name, _ in message.get("headers", [])}
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        *((name.lower().encode(), value.encode()) for name, value in extra.items()
+                          if name.lower().encode() not in present),
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,231 @@
+import asyncio
+import heapq
+import time
+from bisect import insort
+from math import floor
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.exceptions import InvalidCursor
+from app.core.utils import KM_PER_DEGREE, haversine
+from app.crud.changes import ChangeCRUD, DELETE
+from app.models.building import Building
+from app.models.organization import Organization
+
+# Сколько записей журнала читать за раз при догоне
+SYNC_BATCH = 5000
+# Границы расстояния до ячейки считаются по её углам и краям с запасом: на малых ячейках
+# погрешность такого расчёта много меньше процента
+LOWER_SLACK = 0.99
+UPPER_SLACK = 1.01
+
+BUILDINGS = select(Building.id, Building.latitude, Building.longitude)
+ORGANIZATIONS = select(Organization.id, Organization.building_id)
+
+Cursor = tuple[float, int]
+CELL, BUILDING, ORGANIZATION = 0, 1, 2
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    # repr сохраняет float без потерь: на следующей странице расстояние сравнивается точно
+    return f"{cursor[0]!r}:{cursor[1]}"
+
+
+def decode_cursor(value: str) -> Cursor:
+    distance, _, org_id = value.partition(":")
+    try:
+        return float(distance), int(org_id)
+    except ValueError:
+        raise InvalidCursor
+
+
+class NearbyIndex:
+    """
+    Организации по расстоянию от точки — в памяти процесса.
+
+    Здания разложены по ячейкам сетки cell_km x cell_km (в градусах широты), у каждого здания —
+    отсортированный список ID его организаций. Выдача идёт от ближайших ячеек к дальним
+    (поиск по куче с нижней границей расстояния до ячейки), поэтому страница после курсора
+    (distance, id) стоит порядка размера страницы и числа пройденных ячеек, а не всех зданий в радиусе:
+    здания ячеек, целиком лежащих ближе курсора, не разбираются. Если вокруг точки пусто,
+    обход соседних ячеек сменяется разбором всех занятых — их не больше, чем зданий.
+
+    Индекс догоняет журнал /changes, в который OrganizationCRUD и BuildingCRUD пишут каждое
+    изменение в той же транзакции, — так он видит и записи через другие экземпляры сервиса.
+    Журнал проверяется не чаще раза в sync_seconds: запрос внутри этого окна не обращается к БД
+    за версией, а изменения становятся видны с задержкой до sync_seconds.
+    """
+
+    def __init__(self, cell_km: float, sync_seconds: float):
+        self.cell = cell_km / KM_PER_DEGREE
+        self.sync_seconds = sync_seconds
+        self._synced_at = 0.0
+        self.version: int | None = None
+        self._lock = asyncio.Lock()
+        self._points: dict[int, tuple[float, float]] = {}
+        self._cells: dict[tuple[int, int], set[int]] = {}
+        self._by_building: dict[int, list[int]] = {}
+        self._building_of: dict[int, int] = {}
+
+    async def sync(self, session: AsyncSession):
+        """Применяет изменения журнала после version; при первом вызове загружает всё."""
+        now = time.monotonic()
+        if self.version is not None and now - self._synced_at < self.sync_seconds:
+            return
+        # отметка ставится до запроса: одновременные запросы окна не идут в БД следом за первым
+        self._synced_at = now
+        last_seq = await ChangeCRUD.last_seq(session)
+        # реплика может отставать от уже применённой версии — назад индекс не откатывается
+        if self.version is not None and last_seq <= self.version:
+            return
+        async with self._lock:
+            if self.version is None:
+                await self._load(session, last_seq)
+            while self.version < last_seq:
+                changes = await ChangeCRUD.get_since(session, self.version, SYNC_BATCH)
+                if not changes:
+                    break
+                for change in changes:
+                    self._apply(change)
+                self.version = changes[-1]["seq"]
+
+    async def _load(self, session: AsyncSession, last_seq: int):
+        # версия читается до данных: изменения, попавшие между ними, применятся повторно — они идемпотентны
+        for building_id, lat, lon in await session.execute(BUILDINGS):
+            self._place_building(building_id, lat, lon)
+        for org_id, building_id in await session.execute(ORGANIZATIONS):
+            self._place_organization(org_id, building_id)
+        self.version = last_seq
+
+    def _apply(self, change: dict):
+        data = change["data"]
+        if change["entity"] == "building":
+            if change["op"] == DELETE:
+                self._place_building(change["entity_id"], None, None)
+            else:
+                self._place_building(change["entity_id"], data["latitude"], data["longitude"])
+        elif change["entity"] == "organization":
+            self._place_organization(change["entity_id"], None if change["op"] == DELETE else data["building_id"])
+
+    def _cell_of(self, lat: float, lon: float) -> tuple[int, int]:
+        return floor(lat / self.cell), floor(lon / self.cell)
+
+    def _place_building(self, building_id: int, lat: float | None, lon: float | None):
+        """Ставит здание в ячейку его координат; без координат здание убирается из сетки."""
+        point = self._points.pop(building_id, None)
+        if point is not None:
+            cell = self._cells[self._cell_of(*point)]
+            cell.discard(building_id)
+            if not cell:
+                del self._cells[self._cell_of(*point)]
+        if lat is not None and lon is not None:
+            self._points[building_id] = (lat, lon)
+            self._cells.setdefault(self._cell_of(lat, lon), set()).add(building_id)
+
+    def _place_organization(self, org_id: int, building_id: int | None):
+        """Переносит организацию в здание building_id; None — организация удалена."""
+        previous = self._building_of.pop(org_id, None)
+        if previous is not None:
+            orgs = self._by_building[previous]
+            orgs.remove(org_id)
+            if not orgs:
+                del self._by_building[previous]
+        if building_id is not None:
+            self._building_of[org_id] = building_id
+            insort(self._by_building.setdefault(building_id, []), org_id)
+
+    def _cell_bounds(self, lat: float, lon: float, cell: tuple[int, int]) -> tuple[float, float]:
+        """Нижняя и верхняя граница расстояния от точки до ячейки, км."""
+        lat_min, lon_min = cell[0] * self.cell, cell[1] * self.cell
+        lat_max, lon_max = lat_min + self.cell, lon_min + self.cell
+        nearest = haversine(lon, lat, min(max(lon, lon_min), lon_max), min(max(lat, lat_min), lat_max))
+        farthest = max(haversine(lon, lat, lo, la) for la in (lat_min, lat_max) for lo in (lon_min, lon_max))
+        return nearest * LOWER_SLACK, farthest * UPPER_SLACK
+
+    def nearest(
+            self,
+            lat: float,
+            lon: float,
+            radius_km: float | None,
+            limit: int,
+            after: Cursor | None = None,
+    ) -> list[Cursor]:
+        """
+        До limit пар (расстояние в км, ID организации) по возрастанию, строго после курсора after.
+        Расстояние — как у фильтра по радиусу (haversine), при равном расстоянии порядок по ID.
+        """
+        radius = float("inf") if radius_km is None else radius_km
+        after = after or (-1.0, 0)
+        start = self._cell_of(lat, lon)
+        # в куче ячейки (нижняя граница, CELL, ячейка), здания (расстояние, BUILDING, ID) и организации
+        # (расстояние, ORGANIZATION, ID): при равном расстоянии сначала раскрываются ячейки и здания,
+        # поэтому организации на одном расстоянии выходят по возрастанию ID
+        heap = [(0.0, CELL, start)]
+        seen = {start}
+        walking = True
+        found = []
+        # занятые ячейки, ещё не снятые с кучи, и здания с организациями в куче: когда не осталось
+        # ни тех, ни других, дальше только пустые ячейки
+        cells_left, queued = len(self._cells), 0
+        while heap and len(found) < limit and (cells_left or queued):
+            distance, kind, item = heapq.heappop(heap)
+            if distance > radius:
+                break
+            if kind == ORGANIZATION:
+                queued -= 1
+                found.append((distance, item))
+            elif kind == BUILDING:
+                queued -= 1
+                for org_id in self._by_building.get(item, ()):
+                    if (distance, org_id) > after:
+                        heapq.heappush(heap, (distance, ORGANIZATION, org_id))
+                        queued += 1
+            else:
+                if item in self._cells:
+                    cells_left -= 1
+                    queued += self._push_buildings(heap, lat, lon, radius, after[0], item)
+                if walking:
+                    row, col = item
+                    self._push_cells(heap, seen, lat, lon, radius,
+                                     ((row + dr, col + dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)))
+                    # вокруг точки пусто: обходить пустые ячейки дороже, чем сразу взять все занятые
+                    if len(seen) > len(self._cells):
+                        walking = False
+                        self._push_cells(heap, seen, lat, lon, radius, self._cells)
+        return found
+
+    def _push_cells(self, heap: list, seen: set, lat: float, lon: float, radius: float, cells):
+        for cell in cells:
+            if cell not in seen:
+                seen.add(cell)
+                nearest, _ = self._cell_bounds(lat, lon, cell)
+                if nearest <= radius:
+                    heapq.heappush(heap, (nearest, CELL, cell))
+
+    def _push_buildings(self, heap: list, lat: float, lon: float, radius: float, after_distance: float,
+                        cell: tuple[int, int]) -> int:
+        """Кладёт в кучу здания ячейки не ближе курсора; возвращает их число."""
+        # ячейка целиком ближе курсора — все её организации уже отданы на прошлых страницах
+        if self._cell_bounds(lat, lon, cell)[1] < after_distance:
+            return 0
+        pushed = 0
+        for building_id in self._cells[cell]:
+            b_lat, b_lon = self._points[building_id]
+            distance = haversine(lon, lat, b_lon, b_lat)
+            if after_distance <= distance <= radius and building_id in self._by_building:
+                heapq.heappush(heap, (distance, BUILDING, building_id))
+                pushed += 1
+        return pushed
+
+    def snapshot(self) -> dict:
+        return {
+            "version": self.version,
+            "buildings": len(self._points),
+            "cells": len(self._cells),
+            "organizations": len(self._building_of),
+        }
+
+
+nearby = NearbyIndex(settings.NEARBY_CELL_KM, settings.NEARBY_SYNC_SECONDS)
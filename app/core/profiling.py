@@ -0,0 +1,134 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+
+from sqlalchemy import event
+
+from app.core.api_keys import api_keys
+from app.core.config import settings
+
+logger = logging.getLogger("app.slow_query")
+
+PROFILE_TOP_N = 60
+MAX_LOGGED_STATEMENT = 4000
+
+
+class ProfileStore:
+    def __init__(self, keep: int):
+        self.keep = keep
+        self._profiles: OrderedDict[str, dict] = OrderedDict()
+
+    def add(self, profile_id: str, method: str, path: str, profiler: cProfile.Profile, duration: float):
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        self._profiles[profile_id] = {
+            "id": profile_id,
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "method": method,
+            "path": path,
+            "duration_ms": round(duration * 1000, 2),
+            "stats": out.getvalue(),
+        }
+        while len(self._profiles) > self.keep:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> dict | None:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> list[dict]:
+        return [{k: v for k, v in p.items() if k != "stats"} for p in reversed(self._profiles.values())]
+
+
+profiles = ProfileStore(settings.PROFILE_KEEP)
+slow_queries: deque[dict] = deque(maxlen=settings.SLOW_QUERY_KEEP)
+
+
+def _wants_profile(scope) -> bool:
+    headers = dict(scope["headers"])
+    if headers.get(b"x-profile") != b"1" and parse_qs(scope["query_string"].decode()).get("profile") != ["1"]:
+        return False
+    raw_key = headers.get(b"api-key")
+    key = api_keys.lookup(raw_key.decode()) if raw_key else None
+    return key is not None and key.admin
+
+
+class ProfilingMiddleware:
+    """
+    Выполняет запрос под cProfile, если админ-ключ передал X-Profile: 1 или ?profile=1.
+
+    Профиль сохраняется в памяти, его ID возвращается в заголовке X-Profile-Id,
+    а текст доступен через GET /metrics/profiles/{id}. cProfile видит весь поток,
+    поэтому при параллельной нагрузке в профиль попадут и соседние запросы.
+    Middleware подключается только при PROFILING_ENABLED=true.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.disable()
+            profiles.add(profile_id, scope["method"], scope["path"], profiler, time.perf_counter() - started)
+
+
+def install_slow_query_log(sync_engine, threshold_ms: int, explain: bool):
+    """Подписывается на события движка; без вызова этой функции журнал не стоит ничего."""
+    threshold = threshold_ms / 1000
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["slow_query_start"].pop()
+        if duration < threshold or conn.info.get("slow_query_explaining"):
+            return
+
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 2),
+            "statement": statement[:MAX_LOGGED_STATEMENT],
+            "parameters": repr(parameters)[:MAX_LOGGED_STATEMENT],
+            "plan": None,
+        }
+        if explain and not executemany and statement.lstrip().lower().startswith("select"):
+            # EXPLAIN ANALYZE повторно выполняет запрос, поэтому только для SELECT
+            conn.info["slow_query_explaining"] = True
+            # точка сохранения: ошибка EXPLAIN не должна ломать транзакцию запроса
+            conn.exec_driver_sql("SAVEPOINT slow_query_explain")
+            try:
+                result = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+                entry["plan"] = "\n".join(row[0] for row in result)
+                conn.exec_driver_sql("RELEASE SAVEPOINT slow_query_explain")
+            except Exception as e:
+                conn.exec_driver_sql("ROLLBACK TO SAVEPOINT slow_query_explain")
+                entry["plan"] = f"EXPLAIN failed: {e}"
+            finally:
+                conn.info["slow_query_explaining"] = False
+
+        slow_queries.append(entry)
+        logger.warning("slow query", extra={"fields": entry})
@@ -0,0 +1,228 @@
+import asyncio
+import gzip
+import time
+import zlib
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.formats import accept_weights, accepted
+from app.crud.changes import ChangeCRUD
+
+# Уровни выше, чем разумно для сжатия на каждый запрос (вариант сжимается один раз на версию данных),
+# но без самых медленных: первый запрос новой версии ждёт сжатия
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+# Быстрые уровни для ответов, которые в кэш не помещаются и сжимаются на каждый запрос
+FAST_ENCODERS: dict[str, Callable[[bytes], bytes]] = {
+    "gzip": lambda body: gzip.compress(body, compresslevel=1, mtime=0),
+}
+try:
+    import zstandard
+except ImportError:  # zstd необязателен: без пакета zstandard вариант не создаётся
+    pass
+else:
+    ENCODERS["zstd"] = lambda body: zstandard.ZstdCompressor(level=12).compress(body)
+    FAST_ENCODERS["zstd"] = lambda body: zstandard.ZstdCompressor(level=1).compress(body)
+try:
+    import brotli
+except ImportError:  # как и brotli
+    pass
+else:
+    ENCODERS["br"] = lambda body: brotli.compress(body, quality=9)
+    FAST_ENCODERS["br"] = lambda body: brotli.compress(body, quality=1)
+# при равном q из Accept-Encoding выбирается вариант меньшего размера
+PREFERENCE = ("br", "zstd", "gzip")
+
+IDENTITY = "identity"
+
+# Описание кэширования; дополняет description маршрута
+CACHE_DESCRIPTION = """
+Ответ кэшируется до следующего изменения сущностей этого списка и отдаётся с `ETag` (`If-None-Match` → `304`).
+По `Accept-Encoding` тело отдаётся сжатым заранее (`gzip`, а также `zstd` и `br`, если они доступны);
+ответы меньше `RESPONSE_CACHE_MIN_COMPRESS_BYTES` не сжимаются. Ответ больше четверти
+`RESPONSE_CACHE_MAX_BYTES` не кэшируется и сжимается на каждый запрос быстрым уровнем одного выбранного кодека.
+"""
+
+
+class CachedResponse:
+    __slots__ = ("version", "media_type", "headers", "etag", "variants", "size")
+
+    def __init__(self, version: int, response: Response, variants: dict[str, bytes]):
+        self.version = version
+        self.media_type = response.media_type
+        self.headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type", "vary")}
+        self.etag = f'"{version}-{zlib.crc32(response.body):08x}"'
+        self.variants = {IDENTITY: response.body, **variants}
+        self.size = sum(len(body) for body in self.variants.values())
+
+
+def _encode(encoding: str, body: bytes) -> bytes | None:
+    compressed = ENCODERS[encoding](body)
+    # несжимаемое тело отдаётся как есть
+    return compressed if len(compressed) < len(body) else None
+
+
+class ResponseCache:
+    """
+    Кэш готовых ответов списков, которые меняются только вместе с данными.
+
+    Версия ответа — seq последнего изменения его сущности в журнале /changes: пока он не изменился,
+    ответ отдаётся из памяти. Для тела больше min_size один раз на версию в рабочем потоке
+    создаются сжатые варианты (gzip, а при установленных пакетах — zstd и brotli);
+    вариант выбирается по Accept-Encoding, поэтому сжатие стоит CPU один раз на изменение,
+    а не на каждый запрос. Кэш ограничен max_bytes, первыми вытесняются давно не запрошенные ответы.
+    Тело больше max_bytes // 4 не кэшируется: оно проверяется до сжатия, чтобы не тратить
+    дорогие уровни на варианты, которые не сохранятся.
+    """
+
+    def __init__(self, max_bytes: int, min_size: int):
+        self.max_bytes = max_bytes
+        # ответ, который один занял бы четверть кэша, отдаётся без сохранения
+        self.max_entry = max_bytes // 4
+        self.min_size = min_size
+        self._entries: OrderedDict[tuple, CachedResponse] = OrderedDict()
+        self._building: dict[tuple, asyncio.Task] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.uncached = 0
+        self.served = {IDENTITY: 0, **{encoding: 0 for encoding in ENCODERS}}
+        self.compress_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    async def respond(
+            self,
+            request: Request,
+            session: AsyncSession,
+            entity: str,
+            build: Callable[[], Awaitable[Response]],
+    ) -> Response:
+        """
+        Ответ из кэша для текущей версии сущностей вида entity; при промахе — build() и сжатие вариантов.
+        Записи других сущностей (например, поток изменений организаций) ответ не сбрасывают.
+        """
+        if not self.enabled:
+            return await build()
+        version = await ChangeCRUD.last_entity_seq(session, entity)
+        key = (request.url.path, tuple(sorted(request.query_params.multi_items())), accepted(request))
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        else:
+            self.misses += 1
+            response = await build()
+            if response.status_code != 200:
+                return response
+            if len(response.body) > self.max_entry:
+                self._discard(key, version)
+                return await self._serve_uncached(request, response)
+            entry = await self._store(key, version, response)
+        return self._serve(request, entry)
+
+    async def _store(self, key: tuple, version: int, response: Response) -> CachedResponse:
+        # одновременные промахи одной версии сжимают тело один раз
+        building = self._building.get((key, version))
+        if building is None:
+            building = asyncio.create_task(self._compress(response.body))
+            self._building[key, version] = building
+            building.add_done_callback(lambda _: self._building.pop((key, version), None))
+        variants = await asyncio.shield(building)
+        entry = CachedResponse(version, response, variants)
+        current = self._entries.get(key)
+        if current is not None and current.version >= version:
+            return entry
+        if current is not None:
+            self.size -= current.size
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+        return entry
+
+    def _discard(self, key: tuple, version: int):
+        # прежняя версия ответа устарела, а новая в кэш не помещается
+        current = self._entries.get(key)
+        if current is not None and current.version < version:
+            del self._entries[key]
+            self.size -= current.size
+
+    async def _serve_uncached(self, request: Request, response: Response) -> Response:
+        self.uncached += 1
+        body = response.body
+        encoding = IDENTITY
+        if len(body) >= self.min_size:
+            encoding = self._choose(request.headers.get("accept-encoding"), FAST_ENCODERS)
+        if encoding != IDENTITY:
+            started = time.perf_counter()
+            compressed = await asyncio.to_thread(FAST_ENCODERS[encoding], body)
+            self.compress_seconds += time.perf_counter() - started
+            if len(compressed) < len(body):
+                body = compressed
+            else:
+                encoding = IDENTITY
+        self.served[encoding] += 1
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type", "vary")}
+        headers["Vary"] = "Accept, Accept-Encoding"
+        if encoding != IDENTITY:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=response.media_type, headers=headers)
+
+    async def _compress(self, body: bytes) -> dict[str, bytes]:
+        if len(body) < self.min_size:
+            return {}
+        started = time.perf_counter()
+        # zlib, zstd и brotli отпускают GIL: варианты сжимаются параллельно в рабочих потоках
+        encoded = await asyncio.gather(*(asyncio.to_thread(_encode, encoding, body) for encoding in ENCODERS))
+        self.compress_seconds += time.perf_counter() - started
+        return {encoding: variant for encoding, variant in zip(ENCODERS, encoded) if variant is not None}
+
+    def _serve(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {**entry.headers, "ETag": entry.etag, "Vary": "Accept, Accept-Encoding"}
+        if entry.etag in request.headers.get("if-none-match", ""):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        encoding = self._choose(request.headers.get("accept-encoding"), entry.variants)
+        self.served[encoding] += 1
+        if encoding != IDENTITY:
+            headers["Content-Encoding"] = encoding
+        return Response(entry.variants[encoding], media_type=entry.media_type, headers=headers)
+
+    @staticmethod
+    def _choose(accept_encoding: str | None, available) -> str:
+        if not accept_encoding:
+            return IDENTITY
+        weights = accept_weights(accept_encoding)
+        best, best_q = IDENTITY, 0.0
+        for encoding in PREFERENCE:
+            q = weights.get(encoding, weights.get("*", 0.0))
+            if encoding in available and q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def snapshot(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "uncached": self.uncached,
+            "served": self.served,
+            "compress_ms": round(self.compress_seconds * 1000, 1),
+        }
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_MIN_COMPRESS_BYTES)
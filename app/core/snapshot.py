@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.crud.changes import ChangeCRUD
+from app.db.session import AsyncSessionLocal
+from app.models.activity import Activity
+from app.models.building import Building
+from app.models.organization import Organization, organization_activities
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+BATCH_SIZE = 10_000
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE activities (id INTEGER PRIMARY KEY, name TEXT NOT NULL, parent_id INTEGER, level INTEGER NOT NULL);
+CREATE TABLE activity_ancestors (
+    ancestor_id INTEGER NOT NULL, activity_id INTEGER NOT NULL, PRIMARY KEY (ancestor_id, activity_id)
+) WITHOUT ROWID;
+CREATE TABLE buildings (id INTEGER PRIMARY KEY, address TEXT NOT NULL, latitude REAL NOT NULL, longitude REAL NOT NULL);
+CREATE TABLE organizations (id INTEGER PRIMARY KEY, name TEXT NOT NULL, building_id INTEGER);
+CREATE TABLE organization_phones (organization_id INTEGER NOT NULL, phone TEXT NOT NULL);
+CREATE TABLE organization_activities (
+    activity_id INTEGER NOT NULL, organization_id INTEGER NOT NULL, PRIMARY KEY (activity_id, organization_id)
+) WITHOUT ROWID;
+"""
+
+# Индексы создаются после загрузки данных — так быстрее, чем обновлять их на каждой вставке
+INDEXES = """
+CREATE INDEX ix_activities_parent_id ON activities (parent_id);
+CREATE INDEX ix_buildings_lat_lon ON buildings (latitude, longitude);
+CREATE INDEX ix_buildings_address ON buildings (address COLLATE NOCASE);
+CREATE INDEX ix_organizations_building_id ON organizations (building_id);
+CREATE INDEX ix_organizations_name ON organizations (name COLLATE NOCASE);
+CREATE INDEX ix_organization_phones_phone ON organization_phones (phone);
+CREATE INDEX ix_organization_phones_organization_id ON organization_phones (organization_id);
+CREATE INDEX ix_organization_activities_organization_id ON organization_activities (organization_id);
+ANALYZE;
+"""
+
+
+def _ancestor_pairs(activities: list[tuple]) -> list[tuple[int, int]]:
+    parents = {a[0]: a[2] for a in activities}
+    pairs = []
+    for activity_id in parents:
+        current = activity_id
+        while current is not None:
+            pairs.append((current, activity_id))
+            current = parents.get(current)
+    return pairs
+
+
+class SnapshotManager:
+    """
+    Держит на диске SQLite-снимок справочника, версия которого — seq последнего изменения.
+
+    Снимок пересобирается в фоне, если журнал изменений ушёл вперёд,
+    но не чаще, чем раз в min_interval секунд; пока идёт сборка, отдаётся предыдущая версия.
+    """
+
+    def __init__(self, directory: str, min_interval: int):
+        self.directory = Path(directory)
+        self.min_interval = min_interval
+        self.path: Path | None = None
+        self.version: int | None = None
+        self.built_at = 0.0
+        self._previous: Path | None = None
+        self._task: asyncio.Task | None = None
+
+    async def current(self, last_seq: int) -> tuple[Path, int]:
+        stale = self.version != last_seq and time.monotonic() - self.built_at >= self.min_interval
+        if self.path is None or stale:
+            self._start()
+        if self.path is None:
+            await asyncio.shield(self._task)
+        return self.path, self.version
+
+    async def rebuild(self) -> tuple[Path, int]:
+        """Пересобирает снимок сейчас, без учёта min_interval; уже идущая сборка не дублируется."""
+        self._start()
+        await asyncio.shield(self._task)
+        return self.path, self.version
+
+    def _start(self):
+        if self._task is None or self._task.done():
+            # чистый контекст: сборке не нужны statement_timeout и счётчики запроса, который её запустил
+            self._task = asyncio.create_task(self._rebuild(), context=contextvars.Context())
+            self._task.add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("snapshot build failed", exc_info=task.exception())
+
+    async def _rebuild(self):
+        started = time.monotonic()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f".build-{os.getpid()}.sqlite"
+        tmp_path.unlink(missing_ok=True)
+
+        target = sqlite3.connect(tmp_path, check_same_thread=False)
+        try:
+            await asyncio.to_thread(self._prepare, target)
+            async with AsyncSessionLocal() as session:
+                # версия и данные читаются из одного снимка БД
+                await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                version = await ChangeCRUD.last_seq(session)
+
+                result = await session.execute(
+                    select(Activity.id, Activity.name, Activity.parent_id, Activity.level)
+                )
+                activities = [tuple(row) for row in result]
+                await asyncio.to_thread(target.executemany, "INSERT INTO activities VALUES (?, ?, ?, ?)", activities)
+                await asyncio.to_thread(
+                    target.executemany, "INSERT INTO activity_ancestors VALUES (?, ?)", _ancestor_pairs(activities)
+                )
+
+                await self._copy(session, target, "INSERT INTO buildings VALUES (?, ?, ?, ?)",
+                                 select(Building.id, Building.address, Building.latitude, Building.longitude))
+                await self._copy(session, target, "INSERT INTO organization_activities VALUES (?, ?)",
+                                 select(organization_activities.c.activity_id, organization_activities.c.organization_id))
+
+                stream = await session.stream(
+                    select(Organization.id, Organization.name, Organization.building_id, Organization.phones)
+                )
+                async for batch in stream.partitions(BATCH_SIZE):
+                    await asyncio.to_thread(self._insert_organizations, target, batch)
+
+            await asyncio.to_thread(self._finish, target, version)
+        finally:
+            target.close()
+
+        path = self.directory / f"handbook-{version}.sqlite"
+        os.replace(tmp_path, path)
+        # предыдущую версию оставляем: её может ещё отдавать незавершённый ответ
+        if self._previous is not None and self._previous != self.path:
+            self._previous.unlink(missing_ok=True)
+        if self.path != path:
+            self._previous = self.path
+        self.path, self.version, self.built_at = path, version, time.monotonic()
+        logger.info("snapshot %s built in %.2fs", path.name, time.monotonic() - started)
+
+    @staticmethod
+    async def _copy(session, target: sqlite3.Connection, sql: str, query):
+        stream = await session.stream(query)
+        async for batch in stream.partitions(BATCH_SIZE):
+            await asyncio.to_thread(target.executemany, sql, [tuple(row) for row in batch])
+
+    @staticmethod
+    def _prepare(target: sqlite3.Connection):
+        target.execute("PRAGMA journal_mode = OFF")
+        target.execute("PRAGMA synchronous = OFF")
+        target.executescript(SCHEMA)
+
+    @staticmethod
+    def _insert_organizations(target: sqlite3.Connection, batch):
+        target.executemany(
+            "INSERT INTO organizations VALUES (?, ?, ?)",
+            [(row.id, row.name, row.building_id) for row in batch],
+        )
+        target.executemany(
+            "INSERT INTO organization_phones VALUES (?, ?)",
+            [(row.id, phone) for row in batch for phone in row.phones],
+        )
+
+    @staticmethod
+    def _finish(target: sqlite3.Connection, version: int):
+        target.executescript(INDEXES)
+        target.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format", str(SNAPSHOT_FORMAT)),
+            ("version", str(version)),
+            ("built_at", datetime.now(timezone.utc).isoformat()),
+        ])
+        target.commit()
+        target.execute("VACUUM")
+
+
+snapshots = SnapshotManager(settings.SNAPSHOT_DIR, settings.SNAPSHOT_MIN_INTERVAL)
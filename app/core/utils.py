@@ -1,8 +1,20 @@
 from math import radians, cos, sin, asin, sqrt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Float, Integer, and_, any_, bindparam, func, literal, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.core.exceptions import invalid_fields, invalid_include
 from app.models.activity import Activity
 
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = 111.195
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# 9 символов — ячейка около 5 x 5 м
+GEOHASH_PRECISION = 9
+# Прямоугольник покрывается не более чем четырьмя ячейками; в запросе всегда четыре диапазона,
+# чтобы текст SQL не зависел от точки и оставался в кэшах скомпилированных и подготовленных запросов
+GEOHASH_COVER_SIZE = 4
+
 
 def haversine(lon1, lat1, lon2, lat2):
     lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
@@ -10,10 +22,104 @@ def haversine(lon1, lat1, lon2, lat2):
     dlat = lat2 - lat1
     a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
     c = 2 * asin(sqrt(a))
-    r = 6371
+    r = EARTH_RADIUS_KM
     return c * r
 
 
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, is_lon = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, value = (lon_range, lon) if is_lon else (lat_range, lat)
+        mid = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            bounds[0] = mid
+        else:
+            bounds[1] = mid
+        is_lon = not is_lon
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def geohash_cover(lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> list[str]:
+    """
+    Префиксы geohash, ячейки которых вместе покрывают прямоугольник.
+
+    Берётся самая мелкая точность, при которой ячейка не меньше прямоугольника, —
+    тогда его углы попадают не более чем в четыре ячейки. Пустой список — прямоугольник
+    пересекает антимеридиан или больше ячейки первого уровня, сузить поиск нельзя.
+    """
+    lat_min, lat_max = max(lat_min, -90.0), min(lat_max, 90.0)
+    if lon_min < -180 or lon_max > 180:
+        return []
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        lon_bits = (5 * precision + 1) // 2
+        lat_bits = 5 * precision // 2
+        if 180 / 2 ** lat_bits >= lat_max - lat_min and 360 / 2 ** lon_bits >= lon_max - lon_min:
+            return sorted({geohash_encode(la, lo, precision) for la in (lat_min, lat_max) for lo in (lon_min, lon_max)})
+    return []
+
+
+def radius_params(lat: float, lon: float, radius_km: float) -> dict:
+    """Значения параметров geo_* для условия within_radius."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(cos(radians(lat)), 0.01))
+    # без покрытия — один диапазон '' .. '~', в который попадает любой geohash
+    cells = geohash_cover(lat - dlat, lat + dlat, lon - dlon, lon + dlon) or [""]
+    cells += cells[-1:] * (GEOHASH_COVER_SIZE - len(cells))
+    params = {
+        "geo_lat": lat,
+        "geo_lon": lon,
+        "geo_radius_km": radius_km,
+        "geo_lat_min": lat - dlat,
+        "geo_lat_max": lat + dlat,
+        "geo_lon_min": lon - dlon,
+        "geo_lon_max": lon + dlon,
+    }
+    for i, cell in enumerate(cells):
+        # '~' больше любого символа алфавита geohash
+        params[f"geo_cell_{i}"], params[f"geo_cell_end_{i}"] = cell, cell + "~"
+    return params
+
+
+def within_radius(lat_column, lon_column, geohash_column=None):
+    """
+    Условие «точка в радиусе» для SQL: грубый прямоугольник по индексу (lat, lon),
+    затем точное расстояние по формуле гаверсинусов — как haversine().
+
+    Точка и радиус передаются параметрами geo_*, их значения возвращает radius_params(),
+    так что условие собирается один раз для любых координат.
+
+    С geohash_column добавляются диапазоны geohash покрывающих ячеек: по ним Postgres
+    отсекает секции таблицы, секционированной по geohash. Диапазон, а не LIKE 'prefix%', —
+    отсечение секций понимает только сравнения; колонка должна быть с COLLATE "C".
+    """
+    lat = bindparam("geo_lat", type_=Float)
+    lon = bindparam("geo_lon", type_=Float)
+    conditions = []
+    if geohash_column is not None:
+        conditions.append(or_(*(
+            and_(geohash_column >= bindparam(f"geo_cell_{i}"), geohash_column < bindparam(f"geo_cell_end_{i}"))
+            for i in range(GEOHASH_COVER_SIZE)
+        )))
+    distance = 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(
+        func.power(func.sin(func.radians(lat_column - lat) / 2), 2)
+        + func.cos(func.radians(lat)) * func.cos(func.radians(lat_column))
+        * func.power(func.sin(func.radians(lon_column - lon) / 2), 2)
+    ))
+    return and_(
+        *conditions,
+        lat_column.between(bindparam("geo_lat_min"), bindparam("geo_lat_max")),
+        lon_column.between(bindparam("geo_lon_min"), bindparam("geo_lon_max")),
+        distance <= bindparam("geo_radius_km", type_=Float),
+    )
+
+
 async def get_nested_activity_ids(root_id: int, db: AsyncSession) -> list[int]:
     result = await db.execute(select(Activity))
     all_activities = result.scalars().all()
@@ -30,3 +136,85 @@ async def get_nested_activity_ids(root_id: int, db: AsyncSession) -> list[int]:
     ids.add(root_id)
     recurse(root_id)
     return list(ids)
+
+
+# Короче — слишком много совпадений, индекс суффиксов раздувается без пользы
+PHONE_MIN_SUFFIX = 5
+
+
+def normalize_phone(phone: str) -> str:
+    """Оставляет только цифры и приводит российские номера к виду 7XXXXXXXXXX."""
+    digits = "".join(ch for ch in phone if ch.isdigit())
+    if len(digits) == 11 and digits[0] == "8":
+        return "7" + digits[1:]
+    if len(digits) == 10:
+        return "7" + digits
+    return digits
+
+
+def phone_suffixes(normalized: list[str]) -> list[str]:
+    """Все суффиксы номеров длиной от PHONE_MIN_SUFFIX — для поиска по окончанию номера через GIN-индекс."""
+    return sorted({n[-k:] for n in normalized for k in range(PHONE_MIN_SUFFIX, len(n) + 1)})
+
+
+def parse_fields(fields: str | None, allowed: tuple[str, ...]) -> list[str] | None:
+    """Разбирает параметр fields=a,b,c; id возвращается всегда и идёт первым."""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in allowed]
+    if unknown:
+        raise invalid_fields(unknown, allowed)
+    return ["id", *(f for f in dict.fromkeys(requested) if f != "id")]
+
+
+def parse_include(include: str | None, allowed: tuple[str, ...]) -> list[str]:
+    """Разбирает параметр include=a,b — список связей, которые нужно догрузить в ответ."""
+    if not include:
+        return []
+    requested = list(dict.fromkeys(i.strip() for i in include.split(",") if i.strip()))
+    unknown = [i for i in requested if i not in allowed]
+    if unknown:
+        raise invalid_include(unknown, allowed)
+    return requested
+
+
+def any_id(column, ids):
+    """column = ANY(:ids): один параметр-массив вместо IN с параметром на каждое значение."""
+    return column == any_(literal(list(ids), ARRAY(Integer)))
+
+
+def any_param(column, name: str):
+    """column = ANY(:name) для заранее собранных запросов: массив ID передаётся при выполнении."""
+    return column == any_(bindparam(name, type_=ARRAY(Integer)))
+
+
+def _fields_query(model, fields: list[str], where: tuple, limit: int | None, offset: int):
+    query = select(*(getattr(model, f) for f in fields))
+    if where:
+        query = query.where(*where)
+    if limit is not None or offset:
+        query = query.order_by(model.id).limit(limit).offset(offset)
+    return query
+
+
+async def select_fields(db: AsyncSession, model, fields: list[str], *where,
+                        limit: int | None = None, offset: int = 0) -> list[dict]:
+    """Читает только нужные колонки без загрузки ORM-объектов; с limit/offset — страницу по порядку id."""
+    result = await db.execute(_fields_query(model, fields, where, limit, offset))
+    return [row._asdict() for row in result]
+
+
+def columns_of(names: list[str] | tuple[str, ...], rows) -> dict[str, list]:
+    """Строки результата запроса, переложенные по колонкам."""
+    rows = list(rows)
+    if not rows:
+        return {name: [] for name in names}
+    return dict(zip(names, map(list, zip(*rows))))
+
+
+async def select_columns(db: AsyncSession, model, fields: list[str], *where,
+                         limit: int | None = None, offset: int = 0) -> dict[str, list]:
+    """Как select_fields, но сразу по колонкам — для ответов Arrow, без словаря на каждую строку."""
+    result = await db.execute(_fields_query(model, fields, where, limit, offset))
+    return columns_of(fields, result)
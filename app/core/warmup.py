@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.config import settings
+from app.core.nearby import nearby
+from app.core.snapshot import snapshots
+from app.crud.activities import ActivityCRUD
+from app.crud.buildings import BuildingCRUD, FIELDS as BUILDING_FIELDS
+from app.crud.changes import ChangeCRUD
+from app.crud.organizations import OrganizationCRUD, FIELDS as ORGANIZATION_FIELDS
+from app.db.replicas import Replica
+from app.db.session import AsyncSessionLocal, engine, replicas
+
+logger = logging.getLogger(__name__)
+
+# ID, которых нет в БД: запросы прогрева выполняются, но ничего не читают
+MISSING_ID = -1
+
+
+async def _warm_statements(session: AsyncSession):
+    """Горячие запросы маршрутов с типичными наборами фильтров — по одному разу."""
+    for filters in (
+            {"building_id": MISSING_ID},
+            {"activity_id": MISSING_ID},
+            {"lat": 0.0, "lon": 0.0, "radius_km": 1},
+            {"phone": "00000"},
+    ):
+        params = {"name": None, "building_id": None, "activity_id": None, "lat": None, "lon": None,
+                  "radius_km": None, **filters}
+        await OrganizationCRUD.get_list(session, **params)
+    await OrganizationCRUD.get_fields(session, MISSING_ID, list(ORGANIZATION_FIELDS))
+    await OrganizationCRUD.get(session, MISSING_ID)
+    await BuildingCRUD.get_fields(session, MISSING_ID, list(BUILDING_FIELDS))
+    await ActivityCRUD.get_hierarchical(session)
+    await ChangeCRUD.get_since(session, await ChangeCRUD.last_seq(session), 1)
+    await ChangeCRUD.last_entity_seq(session, "building")
+
+
+async def _warm_engine(db_engine: AsyncEngine, connections: int):
+    """
+    Открывает connections соединений пула и на каждом готовит горячие запросы:
+    кэш подготовленных выражений asyncpg у каждого соединения свой.
+    """
+    opened = await asyncio.gather(*(db_engine.connect() for _ in range(connections)), return_exceptions=True)
+    try:
+        errors = [c for c in opened if isinstance(c, BaseException)]
+        if errors:
+            raise errors[0]
+
+        async def warm(conn):
+            async with AsyncSession(bind=conn) as session:
+                await _warm_statements(session)
+            await conn.rollback()
+
+        await asyncio.gather(*(warm(conn) for conn in opened))
+    finally:
+        for conn in opened:
+            if not isinstance(conn, BaseException):
+                await conn.close()
+
+
+async def _warm_replica(replica: Replica, connections: int):
+    # недоступная реплика не задерживает готовность: запросы пойдут на остальные или на primary
+    try:
+        await _warm_engine(replica.engine, connections)
+    except Exception as e:
+        replicas.mark_down(replica, e)
+
+
+async def _warm_snapshot():
+    async with AsyncSessionLocal() as session:
+        last_seq = await ChangeCRUD.last_seq(session)
+    await snapshots.current(last_seq)
+
+
+async def _warm_nearby():
+    async with AsyncSessionLocal() as session:
+        await nearby.sync(session)
+
+
+async def _best_effort(name: str, warm):
+    # снимок и индекс nearby иначе строятся на первом запросе — их ошибка не держит экземпляр неготовым
+    try:
+        await warm()
+    except Exception:
+        logger.exception("%s warmup failed, it will be built on first request", name)
+
+
+class Readiness:
+    """
+    Состояние прогрева экземпляра: пока он не закончен, /health/ready отвечает 503
+    и балансировщик не направляет сюда запросы.
+    """
+
+    def __init__(self, connections: int, retry_seconds: float, db_timeout: float):
+        self.connections = connections
+        self.retry_seconds = retry_seconds
+        self.db_timeout = db_timeout
+        self.ready = False
+        self.attempts = 0
+        self.duration_ms: float | None = None
+        self.error: str | None = None
+
+    async def warm_up(self):
+        """
+        Прогревает пулы и запросы; при ошибке повторяет через retry_seconds. Готовность зависит
+        только от них: снимок и индекс nearby собираются параллельно, один раз и без повторов.
+        """
+        background = asyncio.gather(_best_effort("snapshot", _warm_snapshot), _best_effort("nearby", _warm_nearby))
+        try:
+            while True:
+                self.attempts += 1
+                started = time.perf_counter()
+                try:
+                    # независимые части — параллельно: каждая реплика и primary
+                    await asyncio.gather(
+                        _warm_engine(engine, self.connections),
+                        *(_warm_replica(r, self.connections) for r in replicas.replicas),
+                    )
+                except Exception as e:
+                    self.error = repr(e)
+                    logger.exception("warmup failed, retrying in %ss", self.retry_seconds)
+                    await asyncio.sleep(self.retry_seconds)
+                    continue
+                self.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+                self.error = None
+                self.ready = True
+                logger.info("warmup finished in %.0f ms", self.duration_ms)
+                break
+            await background
+        finally:
+            background.cancel()
+
+    async def check_database(self) -> str | None:
+        """Ошибка, если primary не отвечает за db_timeout секунд."""
+        try:
+            async with asyncio.timeout(self.db_timeout):
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+        except Exception as e:
+            return repr(e)
+        return None
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "attempts": self.attempts,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+        }
+
+
+readiness = Readiness(settings.WARMUP_CONNECTIONS, settings.WARMUP_RETRY_SECONDS, settings.HEALTH_DB_TIMEOUT)
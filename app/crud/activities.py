@@ -1,18 +1,41 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
 from app.core.exceptions import ParentActivityNotFound, MaxLevelReached
+from app.core.utils import get_nested_activity_ids, select_columns, select_fields
+from app.crud.changes import ChangeCRUD, DELETE, UPSERT
+from app.crud.organizations import OrganizationCRUD
+from app.crud.search import OrganizationSearchCRUD
 from app.models.activity import Activity
-from app.schemas.activities import ActivityCreate, ActivityUpdate
+from app.schemas.activities import ActivityCreate, ActivityRead, ActivityUpdate
+
+FIELDS = ("id", "name", "parent_id", "level")
+
+TREE = (
+    select(Activity.id, Activity.name, Activity.parent_id, Activity.level)
+    .where(Activity.level <= 3)
+    .order_by(Activity.id)
+)
+
+
+def _change_data(activity: Activity) -> dict:
+    return ActivityRead.model_validate(activity).model_dump(mode="json")
 
 
 class ActivityCRUD:
 
     @staticmethod
-    async def get_all(session: AsyncSession):
-        result = await session.execute(select(Activity))
-        return result.scalars().all()
+    async def get_all(session: AsyncSession, fields: list[str] | tuple[str, ...] = FIELDS) -> list[dict]:
+        return await select_fields(session, Activity, fields)
+
+    @staticmethod
+    async def get_all_columns(session: AsyncSession, fields: list[str] | tuple[str, ...] = FIELDS) -> dict[str, list]:
+        return await select_columns(session, Activity, fields)
+
+    @staticmethod
+    async def get_fields(session: AsyncSession, activity_id: int, fields: list[str]) -> dict | None:
+        rows = await select_fields(session, Activity, fields, Activity.id == activity_id)
+        return rows[0] if rows else None
 
     @staticmethod
     async def get(session: AsyncSession, activity_id: int):
@@ -36,6 +59,8 @@ class ActivityCRUD:
             level=level
         )
         session.add(activity)
+        await session.flush()
+        await ChangeCRUD.record(session, "activity", activity.id, UPSERT, _change_data(activity))
         await session.commit()
         await session.refresh(activity)
         return activity
@@ -45,8 +70,19 @@ class ActivityCRUD:
         activity = await session.get(Activity, activity_id)
         if not activity:
             return None
-        for field, value in activity_in.dict(exclude_unset=True).items():
+        changes = activity_in.dict(exclude_unset=True)
+        for field, value in changes.items():
             setattr(activity, field, value)
+        await ChangeCRUD.record(session, "activity", activity.id, UPSERT, _change_data(activity))
+        if "name" in changes:
+            # название деятельности входит в ответ её организаций
+            org_ids = await OrganizationSearchCRUD.organization_ids_for_activities(session, [activity_id])
+            await OrganizationCRUD.record_upserts(session, org_ids)
+        if "parent_id" in changes:
+            # сменились предки у всего поддерева — у его организаций меняется activity_ids
+            subtree_ids = await get_nested_activity_ids(activity_id, session)
+            org_ids = await OrganizationSearchCRUD.organization_ids_for_activities(session, subtree_ids)
+            await OrganizationSearchCRUD.refresh(session, org_ids)
         await session.commit()
         await session.refresh(activity)
         return activity
@@ -56,27 +92,29 @@ class ActivityCRUD:
         activity = await session.get(Activity, activity_id)
         if not activity:
             return None
+        # дочерние деятельности удаляются каскадом — для них тоже нужны записи в журнале
+        deleted_ids = await get_nested_activity_ids(activity_id, session)
+        org_ids = await OrganizationSearchCRUD.organization_ids_for_activities(session, deleted_ids)
         await session.delete(activity)
+        await session.flush()
+        await ChangeCRUD.record_many(session, "activity", [(deleted_id, DELETE, None) for deleted_id in deleted_ids])
+        # у организаций удалённых деятельностей меняется список activities
+        await OrganizationCRUD.record_upserts(session, org_ids)
+        await OrganizationSearchCRUD.refresh(session, org_ids)
         await session.commit()
         return activity
 
     @staticmethod
-    async def get_hierarchical(session: AsyncSession):
-        result = await session.execute(
-            select(Activity).where(Activity.level <= 3).options(selectinload(Activity.children))
-        )
-        activities = result.scalars().unique().all()
-
-        activity_dict = {a.id: a for a in activities}
-        for a in activity_dict.values():
-            a.children = []
+    async def get_hierarchical(session: AsyncSession) -> list[dict]:
+        result = await session.execute(TREE)
+        activity_dict = {row.id: {**row._asdict(), "children": []} for row in result}
 
         tree = []
         for a in activity_dict.values():
-            if a.parent_id:
-                parent = activity_dict.get(a.parent_id)
+            if a["parent_id"]:
+                parent = activity_dict.get(a["parent_id"])
                 if parent:
-                    parent.children.append(a)
+                    parent["children"].append(a)
             else:
                 tree.append(a)
 
@@ -1,24 +1,68 @@
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from app.core.counts import ESTIMATED, estimate_rows, exact_counts, table_rows
+from app.core.utils import geohash_encode, select_columns, select_fields
+from app.crud.changes import ChangeCRUD, DELETE, UPSERT
+from app.crud.search import OrganizationSearchCRUD
 from app.models.building import Building
-from app.schemas.buildings import BuildingCreate, BuildingUpdate
-from sqlalchemy import and_
+from app.schemas.buildings import BuildingCreate, BuildingOut, BuildingUpdate
+
+FIELDS = ("id", "address", "latitude", "longitude")
+
+
+def _change_data(building: Building) -> dict:
+    return BuildingOut.model_validate(building).model_dump(mode="json")
+
+
+def _set_geohash(building: Building):
+    building.geohash = geohash_encode(building.latitude, building.longitude)
 
 
 class BuildingCRUD:
     @staticmethod
-    async def get_list(db: AsyncSession, address: str | None = None):
-        query = select(Building)
+    def _filters(address: str | None) -> list:
         filters = []
-
         if address:
             filters.append(Building.address.ilike(f"%{address}%"))
+        return filters
 
-        if filters:
-            query = query.where(and_(*filters))
+    @staticmethod
+    async def get_list(
+            db: AsyncSession,
+            address: str | None = None,
+            fields: list[str] | tuple[str, ...] = FIELDS,
+            limit: int | None = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        return await select_fields(db, Building, fields, *BuildingCRUD._filters(address), limit=limit, offset=offset)
+
+    @staticmethod
+    async def get_columns(
+            db: AsyncSession,
+            address: str | None = None,
+            fields: list[str] | tuple[str, ...] = FIELDS,
+            limit: int | None = None,
+            offset: int = 0,
+    ) -> dict[str, list]:
+        return await select_columns(db, Building, fields, *BuildingCRUD._filters(address), limit=limit, offset=offset)
 
-        result = await db.execute(query)
-        return result.scalars().all()
+    @staticmethod
+    async def count(db: AsyncSession, mode: str, address: str | None = None) -> int | None:
+        """Число зданий под фильтром: оценка (ESTIMATED) или точное число из кэша (EXACT)."""
+        filters = BuildingCRUD._filters(address)
+        if mode == ESTIMATED:
+            if not filters:
+                rows = await table_rows(db, Building.__tablename__)
+                if rows is not None:
+                    return rows
+            return await estimate_rows(db, select(Building.id).where(*filters), {})
+        query = select(func.count()).select_from(Building).where(*filters)
+        return await exact_counts.get(db, (Building.__tablename__, address), lambda: db.scalar(query))
+
+    @staticmethod
+    async def get_fields(session: AsyncSession, building_id: int, fields: list[str]) -> dict | None:
+        rows = await select_fields(session, Building, fields, Building.id == building_id)
+        return rows[0] if rows else None
 
     @staticmethod
     async def get(session: AsyncSession, building_id: int):
@@ -27,7 +71,10 @@ class BuildingCRUD:
     @staticmethod
     async def create(session: AsyncSession, building_in: BuildingCreate):
         building = Building(**building_in.dict())
+        _set_geohash(building)
         session.add(building)
+        await session.flush()
+        await ChangeCRUD.record(session, "building", building.id, UPSERT, _change_data(building))
         await session.commit()
         await session.refresh(building)
         return building
@@ -39,6 +86,9 @@ class BuildingCRUD:
             return None
         for field, value in building_in.dict(exclude_unset=True).items():
             setattr(building, field, value)
+        _set_geohash(building)
+        await ChangeCRUD.record(session, "building", building.id, UPSERT, _change_data(building))
+        await OrganizationSearchCRUD.refresh_building(session, building.id)
         await session.commit()
         await session.refresh(building)
         return building
@@ -49,5 +99,6 @@ class BuildingCRUD:
         if not building:
             return None
         await session.delete(building)
+        await ChangeCRUD.record(session, "building", building_id, DELETE)
         await session.commit()
         return building
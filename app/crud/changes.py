@@ -0,0 +1,58 @@
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.change import Change
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Произвольный ключ advisory-блокировки журнала изменений
+CHANGE_FEED_LOCK = 7_310_031
+
+LOCK_FEED = text("SELECT pg_advisory_xact_lock(:key)")
+SINCE = (
+    select(Change.seq, Change.entity, Change.entity_id, Change.op, Change.data, Change.created_at)
+    .where(Change.seq > bindparam("since"))
+    .order_by(Change.seq)
+    .limit(bindparam("limit"))
+)
+LAST_SEQ = select(func.max(Change.seq))
+LAST_ENTITY_SEQ = select(func.max(Change.seq)).where(Change.entity == bindparam("entity"))
+
+
+class ChangeCRUD:
+    @staticmethod
+    async def record(session: AsyncSession, entity: str, entity_id: int, op: str, data: dict | None = None):
+        """
+        Добавляет запись в журнал в текущей транзакции — она фиксируется вместе с самим изменением.
+
+        Блокировка до конца транзакции выстраивает пишущие транзакции в очередь,
+        поэтому seq выдаются в порядке коммитов и клиент, читающий since=<seq>,
+        не пропустит запись с меньшим номером, закоммиченную позже.
+        """
+        await session.execute(LOCK_FEED, {"key": CHANGE_FEED_LOCK})
+        session.add(Change(entity=entity, entity_id=entity_id, op=op, data=data))
+
+    @staticmethod
+    async def record_many(session: AsyncSession, entity: str, changes: list[tuple[int, str, dict | None]]):
+        """Как record для нескольких изменений (entity_id, op, data): блокировка журнала берётся один раз."""
+        if not changes:
+            return
+        await session.execute(LOCK_FEED, {"key": CHANGE_FEED_LOCK})
+        session.add_all([Change(entity=entity, entity_id=entity_id, op=op, data=data) for entity_id, op, data in changes])
+
+    @staticmethod
+    async def get_since(session: AsyncSession, since: int, limit: int) -> list[dict]:
+        result = await session.execute(SINCE, {"since": since, "limit": limit})
+        return [row._asdict() for row in result]
+
+    @staticmethod
+    async def last_seq(session: AsyncSession) -> int:
+        result = await session.execute(LAST_SEQ)
+        return result.scalar() or 0
+
+    @staticmethod
+    async def last_entity_seq(session: AsyncSession, entity: str) -> int:
+        """seq последнего изменения сущностей вида entity — по индексу (entity, seq)."""
+        result = await session.execute(LAST_ENTITY_SEQ, {"entity": entity})
+        return result.scalar() or 0
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.job import Job
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCRUD:
+    @staticmethod
+    async def create(session: AsyncSession, kind: str, params: dict) -> Job:
+        job = Job(kind=kind, params=params)
+        session.add(job)
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+    @staticmethod
+    async def get(session: AsyncSession, job_id: int) -> Job | None:
+        return await session.get(Job, job_id, populate_existing=True)
+
+    @staticmethod
+    async def get_list(session: AsyncSession, limit: int) -> list[Job]:
+        result = await session.execute(select(Job).order_by(Job.id.desc()).limit(limit))
+        return list(result.scalars())
+
+    @staticmethod
+    async def request_cancel(session: AsyncSession, job_id: int) -> Job | None:
+        """Ожидающая задача отменяется сразу, выполняющуюся останавливает её исполнитель."""
+        job = await session.get(Job, job_id, with_for_update=True)
+        if job is None:
+            return None
+        if job.status == PENDING:
+            job.status, job.finished_at = CANCELLED, func.now()
+        elif job.status == RUNNING:
+            job.cancel_requested = True
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+    @staticmethod
+    async def claim(session: AsyncSession, kind: str) -> Job | None:
+        """Забирает старейшую ожидающую задачу вида kind; SKIP LOCKED — несколько процессов не возьмут одну задачу."""
+        pending = (
+            select(Job.id)
+            .where(Job.status == PENDING, Job.kind == kind)
+            .order_by(Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        result = await session.execute(
+            update(Job)
+            .where(Job.id == pending)
+            .values(status=RUNNING, started_at=func.coalesce(Job.started_at, func.now()), heartbeat_at=func.now())
+            .returning(Job)
+        )
+        job = result.scalar_one_or_none()
+        await session.commit()
+        return job
+
+    @staticmethod
+    async def reclaim_stale(session: AsyncSession, stale_seconds: float) -> int:
+        """Возвращает в очередь задачи, исполнитель которых перестал отмечаться (процесс упал или перезапущен)."""
+        result = await session.execute(
+            update(Job)
+            .where(Job.status == RUNNING, Job.heartbeat_at < func.now() - timedelta(seconds=stale_seconds))
+            .values(status=PENDING)
+        )
+        await session.commit()
+        return result.rowcount
+
+    @staticmethod
+    async def heartbeat(session: AsyncSession, job_id: int) -> bool:
+        """Отмечает, что задача жива; возвращает, запрошена ли отмена."""
+        result = await session.execute(
+            update(Job).where(Job.id == job_id).values(heartbeat_at=func.now()).returning(Job.cancel_requested)
+        )
+        cancel_requested = bool(result.scalar())
+        await session.commit()
+        return cancel_requested
+
+    @staticmethod
+    async def progress(session: AsyncSession, job_id: int, done: int, total: int | None, result: dict | None):
+        """Записывает прогресс в текущей транзакции: вместе с обработанной порцией данных."""
+        await session.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(done=done, total=total, result=result, heartbeat_at=func.now())
+        )
+
+    @staticmethod
+    async def finish(session: AsyncSession, job_id: int, status: str, done: int, total: int | None,
+                     result: dict | None, error: str | None = None):
+        await session.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status=status, done=done, total=total, result=result, error=error, finished_at=func.now())
+        )
+        await session.commit()
+
+    @staticmethod
+    async def requeue(session: AsyncSession, job_id: int):
+        """Задача, прерванная остановкой процесса, продолжится после запуска."""
+        await session.execute(
+            update(Job).where(Job.id == job_id, Job.status == RUNNING).values(status=PENDING)
+        )
+        await session.commit()
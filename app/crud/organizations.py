@@ -1,15 +1,197 @@
+from functools import lru_cache
+import orjson
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import bindparam, func, select, text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.exc import DBAPIError
 from typing import Optional
-from app.models.organization import Organization
+from app.models.organization import Organization, organization_activities
 from app.models.activity import Activity
 from app.models.building import Building
-from app.schemas.organizations import OrganizationCreate, OrganizationUpdate
-from app.core.utils import get_nested_activity_ids, haversine
+from app.models.organization_search import OrganizationSearch
+from app.schemas.organizations import OrganizationCreate, OrganizationOut, OrganizationUpdate
+from app.core.counts import ESTIMATED, estimate_rows, exact_counts, table_rows
+from app.core.exceptions import PhoneTooShort
+from app.core.nearby import Cursor, nearby
+from app.core.utils import (
+    PHONE_MIN_SUFFIX, any_id, any_param, columns_of, normalize_phone, phone_suffixes, radius_params,
+    select_fields, within_radius,
+)
+from app.crud.buildings import FIELDS as BUILDING_FIELDS
+from app.crud.changes import ChangeCRUD, DELETE, UPSERT
+from app.crud.search import OrganizationSearchCRUD
+
+FIELDS = ("id", "name", "phones", "building_id", "activities")
+INCLUDES = ("building", "activities.path")
+# Поля, без которых нельзя собрать связь из include
+INCLUDE_REQUIRES = {"building": "building_id", "activities.path": "activities"}
+# Собранные запросы списка: по одному на сочетание колонок и фильтров
+LIST_STATEMENTS_CACHE_SIZE = 512
+
+# Запросы без переменной части собираются один раз при импорте: SQLAlchemy не строит их заново
+# и не считает ключ кэша на каждом вызове, а текст SQL совпадает и для кэша подготовленных выражений asyncpg
+GET_BY_ID = select(Organization).where(Organization.id == bindparam("org_id"))
+GET_BY_IDS = select(Organization).where(any_param(Organization.id, "org_ids"))
+ACTIVITIES_BY_IDS = select(Activity).where(any_param(Activity.id, "activity_ids"))
+ACTIVITIES_OF_ORGANIZATIONS = (
+    select(organization_activities.c.organization_id, Activity.id, Activity.name)
+    .join(Activity, Activity.id == organization_activities.c.activity_id)
+    .where(any_param(organization_activities.c.organization_id, "org_ids"))
+    .order_by(organization_activities.c.organization_id, Activity.id)
+)
+_ancestors = (
+    select(Activity.id, Activity.name, Activity.parent_id, Activity.level)
+    .where(any_param(Activity.id, "activity_ids"))
+    .cte("ancestors", recursive=True)
+)
+_ancestors = _ancestors.union(
+    select(Activity.id, Activity.name, Activity.parent_id, Activity.level)
+    .join(_ancestors, Activity.id == _ancestors.c.parent_id)
+)
+ACTIVITY_ANCESTORS = select(_ancestors).order_by(_ancestors.c.id)
+# ID деятельностей организации массивом — колонкой того же запроса списка, без отдельной догрузки
+ACTIVITY_IDS = (
+    select(func.coalesce(
+        func.array_agg(aggregate_order_by(organization_activities.c.activity_id, organization_activities.c.activity_id)),
+        text("'{}'"),
+    ))
+    .where(organization_activities.c.organization_id == Organization.id)
+    .scalar_subquery()
+    .label("activity_ids")
+)
+
+
+def _change_data(org: Organization) -> dict:
+    return OrganizationOut.model_validate(org).model_dump(mode="json")
+
+
+def _set_phones(org: Organization, phones: list[str]):
+    org.phones = phones
+    org.phones_normalized = [normalize_phone(p) for p in phones]
+    org.phone_suffixes = phone_suffixes(org.phones_normalized)
+
+
+def _apply_write(org: Organization, org_in: OrganizationCreate | OrganizationUpdate, activities: dict[int, Activity]):
+    """Переносит заданные поля в организацию, как create/update; деятельности берутся из activities."""
+    if org_in.name is not None:
+        org.name = org_in.name
+    if org_in.phones is not None:
+        _set_phones(org, org_in.phones)
+    if org_in.building_id is not None:
+        org.building_id = org_in.building_id
+    if org_in.activity_ids is not None:
+        wanted = set(org_in.activity_ids)
+        org.activities = [activity for activity_id, activity in activities.items() if activity_id in wanted]
+
+
+@lru_cache(maxsize=LIST_STATEMENTS_CACHE_SIZE)
+def _list_statement(columns: tuple[str, ...], filters: tuple[str, ...], paged: bool = False):
+    """Запрос списка для набора колонок и фильтров; значения фильтров и страницы передаются параметрами."""
+    query = select(*(ACTIVITY_IDS if c == "activity_ids" else getattr(Organization, c) for c in columns))
+    if filters:
+        query = query.where(Organization.id.in_(_matching_ids(filters)))
+    if paged:
+        query = query.order_by(Organization.id).limit(bindparam("limit")).offset(bindparam("offset"))
+    return query
+
+
+def _page(params: dict, limit: int | None, offset: int) -> tuple[bool, dict]:
+    """Параметры страницы; без limit и offset список собирается без ORDER BY и LIMIT, как раньше."""
+    if limit is None and not offset:
+        return False, params
+    return True, {**params, "limit": limit, "offset": offset}
+
+
+@lru_cache(maxsize=LIST_STATEMENTS_CACHE_SIZE)
+def _matching_ids(filters: tuple[str, ...]):
+    """ID организаций, подходящих под фильтры, — по одной таблице organization_search."""
+    return select(OrganizationSearch.organization_id).where(*OrganizationCRUD._search_conditions(filters))
+
+
+@lru_cache(maxsize=LIST_STATEMENTS_CACHE_SIZE)
+def _count_statement(filters: tuple[str, ...]):
+    if not filters:
+        return select(func.count()).select_from(Organization)
+    return select(func.count()).select_from(_matching_ids(filters).subquery())
 
 
 class OrganizationCRUD:
+    @staticmethod
+    def _search_params(
+            name: str | None,
+            building_id: int | None,
+            activity_id: int | None,
+            lat: float | None,
+            lon: float | None,
+            radius_km: int | None,
+            phone: str | None = None,
+    ) -> tuple[tuple[str, ...], dict]:
+        """Заданные фильтры списка и значения их параметров."""
+        filters, params = [], {}
+        if name:
+            filters.append("name")
+            params["name"] = f"%{name}%"
+
+        if building_id:
+            filters.append("building_id")
+            params["building_id"] = building_id
+
+        if phone:
+            normalized = normalize_phone(phone)
+            if len(normalized) < PHONE_MIN_SUFFIX:
+                raise PhoneTooShort
+            # полный номер ищем точно, неполный — по окончанию
+            key = "phone" if len(normalized) == 11 else "phone_suffix"
+            filters.append(key)
+            params[key] = [normalized]
+
+        if activity_id:
+            filters.append("activity_id")
+            params["activity_id"] = [activity_id]
+
+        if lat is not None and lon is not None and radius_km is not None:
+            filters.append("radius")
+            params.update(radius_params(lat, lon, radius_km))
+        return tuple(filters), params
+
+    @staticmethod
+    def _search_conditions(filters: tuple[str, ...]) -> list:
+        """
+        Условия фильтрации списка — все по одной таблице organization_search.
+
+        Идут от самых избирательных к самым широким: при равной стоимости условий Postgres
+        проверяет их в порядке записи, и строка отсеивается раньше, чем дойдёт до ilike по названию.
+        """
+        conditions = []
+        if "building_id" in filters:
+            conditions.append(OrganizationSearch.building_id == bindparam("building_id"))
+
+        # оба условия по телефону идут через GIN-индексы
+        if "phone" in filters:
+            conditions.append(OrganizationSearch.phones_normalized.contains(
+                bindparam("phone", type_=OrganizationSearch.phones_normalized.type)
+            ))
+        if "phone_suffix" in filters:
+            conditions.append(OrganizationSearch.phone_suffixes.contains(
+                bindparam("phone_suffix", type_=OrganizationSearch.phone_suffixes.type)
+            ))
+
+        if "radius" in filters:
+            conditions.append(
+                within_radius(OrganizationSearch.latitude, OrganizationSearch.longitude,
+                              geohash_column=OrganizationSearch.geohash)
+            )
+
+        if "activity_id" in filters:
+            # activity_ids хранит и предков, поэтому совпадут и организации вложенных деятельностей
+            conditions.append(OrganizationSearch.activity_ids.contains(
+                bindparam("activity_id", type_=OrganizationSearch.activity_ids.type)
+            ))
+
+        if "name" in filters:
+            conditions.append(OrganizationSearch.name.ilike(bindparam("name")))
+        return conditions
+
     @staticmethod
     async def get_list(
             db: AsyncSession,
@@ -19,50 +201,182 @@ class OrganizationCRUD:
             lat: float | None,
             lon: float | None,
             radius_km: int,
-    ) -> list[Organization]:
-        query = select(Organization).options(joinedload(Organization.activities))
+            fields: list[str] | tuple[str, ...] = FIELDS,
+            phone: str | None = None,
+            limit: int | None = None,
+            offset: int = 0,
+    ) -> list[dict]:
+        """
+        Список организаций строками-словарями, без сборки ORM-объектов.
 
-        if name:
-            query = query.where(Organization.name.ilike(f"%{name}%"))
+        Запрос собирается один раз на сочетание колонок и фильтров, значения фильтров —
+        параметры, поэтому текст SQL повторяется и попадает в кэши SQLAlchemy и asyncpg.
+        """
+        filters, params = OrganizationCRUD._search_params(name, building_id, activity_id, lat, lon, radius_km, phone)
+        columns = tuple(f for f in fields if f != "activities")
+        paged, params = _page(params, limit, offset)
+        result = await db.execute(_list_statement(columns, filters, paged), params)
+        rows = [row._asdict() for row in result]
+        if "activities" in fields:
+            await OrganizationCRUD._attach_activities(db, rows)
+        return rows
 
-        if building_id:
-            query = query.where(Organization.building_id == building_id)
+    @staticmethod
+    async def get_columns(
+            db: AsyncSession,
+            name: str | None,
+            building_id: int | None,
+            activity_id: int | None,
+            lat: float | None,
+            lon: float | None,
+            radius_km: int,
+            fields: list[str] | tuple[str, ...] = FIELDS,
+            phone: str | None = None,
+            limit: int | None = None,
+            offset: int = 0,
+    ) -> dict[str, list]:
+        """
+        Список организаций по колонкам — для ответов Arrow.
 
-        if activity_id:
-            all_ids = await get_nested_activity_ids(activity_id, db)
-            query = query.join(Organization.activities).where(Activity.id.in_(all_ids))
+        Деятельности приходят массивом ID в том же запросе (колонка activity_ids),
+        строки не превращаются в словари.
+        """
+        filters, params = OrganizationCRUD._search_params(name, building_id, activity_id, lat, lon, radius_km, phone)
+        columns = tuple("activity_ids" if f == "activities" else f for f in fields)
+        paged, params = _page(params, limit, offset)
+        result = await db.execute(_list_statement(columns, filters, paged), params)
+        return columns_of(columns, result)
+
+    @staticmethod
+    async def count(
+            db: AsyncSession,
+            mode: str,
+            name: str | None,
+            building_id: int | None,
+            activity_id: int | None,
+            lat: float | None,
+            lon: float | None,
+            radius_km: int,
+            phone: str | None = None,
+    ) -> int | None:
+        """
+        Число организаций под фильтрами списка: оценка (ESTIMATED) или точное число из кэша (EXACT).
 
-        if lat is not None and lon is not None:
-            buildings = await db.execute(select(Building))
-            building_map = buildings.scalars().all()
-            nearby_ids = [
-                b.id for b in building_map
-                if haversine(b.longitude, b.latitude, lon, lat) <= radius_km
-            ]
-            query = query.where(Organization.building_id.in_(nearby_ids))
-        result = await db.execute(query)
-        return result.scalars().unique().all()
+        Оценка без фильтров — статистика таблицы, с фильтрами — оценка планировщика
+        для запроса ID по organization_search; сам запрос при этом не выполняется.
+        """
+        filters, params = OrganizationCRUD._search_params(name, building_id, activity_id, lat, lon, radius_km, phone)
+        if mode == ESTIMATED:
+            if not filters:
+                rows = await table_rows(db, Organization.__tablename__)
+                if rows is not None:
+                    return rows
+            return await estimate_rows(db, _matching_ids(filters) if filters else select(Organization.id), params)
+        key = (Organization.__tablename__, filters, orjson.dumps(params, option=orjson.OPT_SORT_KEYS))
+        return await exact_counts.get(db, key, lambda: db.scalar(_count_statement(filters), params))
+
+    @staticmethod
+    async def get_nearby(
+            db: AsyncSession,
+            lat: float,
+            lon: float,
+            radius_km: float,
+            limit: int,
+            after: Cursor | None = None,
+    ) -> tuple[list[dict], Cursor | None]:
+        """
+        Страница организаций в радиусе по возрастанию расстояния после курсора after
+        и курсор следующей страницы (None — страница последняя).
+
+        Порядок и расстояния берутся из индекса nearby в памяти, из БД читаются только
+        организации страницы — по ID, одним запросом и одним запросом деятельностей.
+        """
+        await nearby.sync(db)
+        page = nearby.nearest(lat, lon, radius_km, limit, after)
+        rows = []
+        if page:
+            columns = [f for f in FIELDS if f != "activities"]
+            rows = await select_fields(db, Organization, columns, any_id(Organization.id, [i for _, i in page]))
+            await OrganizationCRUD._attach_activities(db, rows)
+        by_id = {row["id"]: row for row in rows}
+        # организация, удалённая после синхронизации индекса, просто пропускается
+        result = [{**by_id[org_id], "distance_km": distance} for distance, org_id in page if org_id in by_id]
+        return result, page[-1] if len(page) == limit else None
+
+    @staticmethod
+    async def get_fields(db: AsyncSession, org_id: int, fields: list[str]) -> Optional[dict]:
+        rows = await select_fields(db, Organization, [f for f in fields if f != "activities"], Organization.id == org_id)
+        if rows and "activities" in fields:
+            await OrganizationCRUD._attach_activities(db, rows)
+        return rows[0] if rows else None
+
+    @staticmethod
+    async def _attach_activities(db: AsyncSession, rows: list[dict]):
+        """Догружает деятельности одним запросом на все строки."""
+        by_org = {row["id"]: [] for row in rows}
+        for row in rows:
+            row["activities"] = by_org[row["id"]]
+        result = await db.execute(ACTIVITIES_OF_ORGANIZATIONS, {"org_ids": list(by_org)})
+        for org_id, a_id, a_name in result:
+            by_org[org_id].append({"id": a_id, "name": a_name})
+
+    @staticmethod
+    async def get_included(db: AsyncSession, rows: list[dict], include: list[str]) -> dict:
+        """
+        Догружает связанные объекты для include — по одному запросу на связь, сколько бы ни было строк.
+
+        Каждый объект попадает в ответ один раз, даже если на него ссылаются многие организации.
+        Для activities.path каждой деятельности в rows добавляется path — ID предков от корня до неё самой.
+        """
+        included = {}
+        if "building" in include:
+            # организация может быть без здания
+            building_ids = sorted({row["building_id"] for row in rows if row["building_id"] is not None})
+            included["buildings"] = []
+            if building_ids:
+                included["buildings"] = await select_fields(db, Building, BUILDING_FIELDS, any_id(Building.id, building_ids))
+
+        if "activities.path" in include:
+            activity_ids = sorted({a["id"] for row in rows for a in row["activities"]})
+            by_id = {}
+            if activity_ids:
+                result = await db.execute(ACTIVITY_ANCESTORS, {"activity_ids": activity_ids})
+                by_id = {row.id: row._asdict() for row in result}
+
+            paths = {}
+            for activity_id in activity_ids:
+                path, current = [], activity_id
+                while current is not None:
+                    path.append(current)
+                    current = by_id[current]["parent_id"]
+                paths[activity_id] = path[::-1]
+            for row in rows:
+                for a in row["activities"]:
+                    a["path"] = paths[a["id"]]
+            included["activities"] = list(by_id.values())
+        return included
 
     @staticmethod
     async def get(db: AsyncSession, org_id: int) -> Optional[Organization]:
-        result = await db.execute(select(Organization).where(Organization.id == org_id))
+        result = await db.execute(GET_BY_ID, {"org_id": org_id})
         return result.scalar_one_or_none()
 
     @staticmethod
     async def create(db: AsyncSession, org_in: OrganizationCreate) -> Organization:
-        activities_result = await db.execute(
-            select(Activity).where(Activity.id.in_(org_in.activity_ids))
-        )
+        activities_result = await db.execute(ACTIVITIES_BY_IDS, {"activity_ids": org_in.activity_ids})
         activities = activities_result.scalars().all()
 
         org = Organization(
             name=org_in.name,
-            phones=org_in.phones,
             building_id=org_in.building_id,
             activities=activities
         )
+        _set_phones(org, org_in.phones)
 
         db.add(org)
+        await db.flush()
+        await ChangeCRUD.record(db, "organization", org.id, UPSERT, _change_data(org))
+        await OrganizationSearchCRUD.refresh(db, [org.id])
         await db.commit()
         await db.refresh(org)
         return org
@@ -76,24 +390,115 @@ class OrganizationCRUD:
         if org_in.name is not None:
             org.name = org_in.name
         if org_in.phones is not None:
-            org.phones = org_in.phones
+            _set_phones(org, org_in.phones)
         if org_in.building_id is not None:
             org.building_id = org_in.building_id
         if org_in.activity_ids is not None:
-            activities_result = await db.execute(
-                select(Activity).where(Activity.id.in_(org_in.activity_ids))
-            )
+            activities_result = await db.execute(ACTIVITIES_BY_IDS, {"activity_ids": org_in.activity_ids})
             org.activities = activities_result.scalars().all()
 
+        await ChangeCRUD.record(db, "organization", org.id, UPSERT, _change_data(org))
+        await OrganizationSearchCRUD.refresh(db, [org.id])
         await db.commit()
         await db.refresh(org)
         return org
 
+    @staticmethod
+    async def write_batch(
+            db: AsyncSession,
+            writes: list[tuple[int | None, OrganizationCreate | OrganizationUpdate]],
+    ) -> list[OrganizationOut | None | Exception]:
+        """
+        Группа одиночных записей одной транзакцией: (None, OrganizationCreate) — создание,
+        (org_id, OrganizationUpdate) — изменение. Результат на каждую запись: организация,
+        None (не найдена) или ошибка этой записи.
+
+        Организации и деятельности группы читаются по одному запросу, изменения уходят одним flush —
+        вставки одним INSERT, связи и журнал пачками, поиск пересобирается одним запросом на все ID.
+        Несколько записей в одну организацию применяются по очереди и возвращают её итоговое состояние.
+        Если группа не записалась из-за ошибки данных, записи применяются по одной в точках сохранения:
+        ошибку получает только та запись, что её вызвала, остальные фиксируются общим коммитом.
+        """
+        try:
+            orgs = await OrganizationCRUD._apply_writes(db, writes, savepoints=False)
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                raise
+            await db.rollback()
+            orgs = await OrganizationCRUD._apply_writes(db, writes, savepoints=True)
+
+        written = list({org.id: org for org in orgs if isinstance(org, Organization)}.values())
+        out = {org.id: OrganizationOut.model_validate(org) for org in written}
+        await ChangeCRUD.record_many(
+            db, "organization", [(org.id, UPSERT, out[org.id].model_dump(mode="json")) for org in written]
+        )
+        await OrganizationSearchCRUD.refresh(db, list(out))
+        await db.commit()
+        return [out[org.id] if isinstance(org, Organization) else org for org in orgs]
+
+    @staticmethod
+    async def _apply_writes(
+            db: AsyncSession,
+            writes: list[tuple[int | None, OrganizationCreate | OrganizationUpdate]],
+            savepoints: bool,
+    ) -> list[Organization | None | Exception]:
+        org_ids = [org_id for org_id, _ in writes if org_id is not None]
+        activity_ids = {a for _, org_in in writes if org_in.activity_ids is not None for a in org_in.activity_ids}
+        result = await db.execute(GET_BY_IDS.execution_options(populate_existing=True), {"org_ids": org_ids})
+        existing = {org.id: org for org in result.scalars()}
+        result = await db.execute(ACTIVITIES_BY_IDS, {"activity_ids": list(activity_ids)})
+        activities = {activity.id: activity for activity in result.scalars()}
+
+        orgs = []
+        for org_id, org_in in writes:
+            org = Organization(activities=[]) if org_id is None else existing.get(org_id)
+            if org is None:
+                orgs.append(None)
+                continue
+            if not savepoints:
+                if org_id is None:
+                    db.add(org)
+                _apply_write(org, org_in, activities)
+                orgs.append(org)
+                continue
+            try:
+                async with db.begin_nested():
+                    if org_id is None:
+                        db.add(org)
+                    _apply_write(org, org_in, activities)
+                    await db.flush()
+            except DBAPIError as e:
+                if e.connection_invalidated:
+                    raise
+                orgs.append(e)
+                if org_id is not None:
+                    # откат точки сохранения сбросил загруженное состояние организации
+                    await db.refresh(org)
+                continue
+            orgs.append(org)
+        await db.flush()
+        return orgs
+
+    @staticmethod
+    async def record_upserts(db: AsyncSession, org_ids: list[int]):
+        """
+        Пишет в журнал текущее состояние организаций org_ids — когда их ответ изменился
+        не через запись в саму организацию (например, переименована или удалена деятельность).
+        """
+        if not org_ids:
+            return
+        # в сессии могут быть организации с устаревшим списком деятельностей — перечитываются из БД
+        result = await db.execute(GET_BY_IDS.execution_options(populate_existing=True), {"org_ids": org_ids})
+        await ChangeCRUD.record_many(
+            db, "organization", [(org.id, UPSERT, _change_data(org)) for org in result.scalars()]
+        )
+
     @staticmethod
     async def delete(db: AsyncSession, org_id: int) -> bool:
         org = await OrganizationCRUD.get(db, org_id)
         if not org:
             return False
         await db.delete(org)
+        await ChangeCRUD.record(db, "organization", org_id, DELETE)
         await db.commit()
         return True
@@ -0,0 +1,86 @@
+from sqlalchemy import Integer, bindparam, select, text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.utils import any_id
+from app.models.organization import organization_activities
+
+# Документы организаций, попавших под условие {where} (алиас o — organizations), сначала удаляются:
+# при смене здания документ переезжает в другую секцию, а ON CONFLICT по секционированной
+# таблице работает только в пределах ключа секционирования
+DELETE_SQL = """
+DELETE FROM organization_search WHERE organization_id IN (SELECT o.id FROM organizations o WHERE {where})
+"""
+
+INSERT_SQL = """
+WITH RECURSIVE targets AS (
+    SELECT o.id FROM organizations o WHERE {where}
+), ancestors AS (
+    SELECT oa.organization_id, a.id, a.parent_id
+    FROM organization_activities oa JOIN activities a ON a.id = oa.activity_id
+    WHERE oa.organization_id IN (SELECT id FROM targets)
+    UNION
+    SELECT an.organization_id, a.id, a.parent_id
+    FROM ancestors an JOIN activities a ON a.id = an.parent_id
+), activity_sets AS (
+    SELECT organization_id, array_agg(DISTINCT id ORDER BY id) AS ids FROM ancestors GROUP BY organization_id
+)
+INSERT INTO organization_search (
+    organization_id, geohash, name, phones_normalized, phone_suffixes, building_id, address, latitude, longitude,
+    activity_ids
+)
+SELECT o.id, COALESCE(b.geohash, ''), o.name, o.phones_normalized, o.phone_suffixes, o.building_id,
+       b.address, b.latitude, b.longitude, COALESCE(s.ids, '{{}}')
+FROM organizations o
+LEFT JOIN buildings b ON b.id = o.building_id
+LEFT JOIN activity_sets s ON s.organization_id = o.id
+WHERE o.id IN (SELECT id FROM targets)
+"""
+
+
+def _statements(where: str, *bindparams) -> tuple:
+    # text() разбирается один раз при импорте, а не на каждой записи
+    return tuple(text(sql.format(where=where)).bindparams(*bindparams) for sql in (DELETE_SQL, INSERT_SQL))
+
+
+REFRESH_BY_IDS = _statements("o.id = ANY(:ids)", bindparam("ids", type_=ARRAY(Integer)))
+REFRESH_BY_BUILDING = _statements("o.building_id = :building_id")
+REFRESH_ALL = _statements("true")
+
+
+class OrganizationSearchCRUD:
+    """
+    Поддержка таблицы organization_search из пишущих транзакций: документ фиксируется
+    вместе с изменением. Перед пересборкой изменения сессии сбрасываются в БД —
+    text()-запросы автоматический flush не вызывают.
+    Удаление организации убирает документ каскадом по внешнему ключу.
+    """
+
+    @staticmethod
+    async def _refresh(session: AsyncSession, statements: tuple, params: dict | None = None):
+        await session.flush()
+        for statement in statements:
+            await session.execute(statement, params)
+
+    @staticmethod
+    async def refresh(session: AsyncSession, org_ids: list[int]):
+        if not org_ids:
+            return
+        await OrganizationSearchCRUD._refresh(session, REFRESH_BY_IDS, {"ids": list(org_ids)})
+
+    @staticmethod
+    async def refresh_building(session: AsyncSession, building_id: int):
+        await OrganizationSearchCRUD._refresh(session, REFRESH_BY_BUILDING, {"building_id": building_id})
+
+    @staticmethod
+    async def rebuild(session: AsyncSession):
+        await OrganizationSearchCRUD._refresh(session, REFRESH_ALL)
+
+    @staticmethod
+    async def organization_ids_for_activities(session: AsyncSession, activity_ids: list[int]) -> list[int]:
+        result = await session.execute(
+            select(organization_activities.c.organization_id)
+            .where(any_id(organization_activities.c.activity_id, activity_ids))
+            .distinct()
+        )
+        return list(result.scalars())
@@ -0,0 +1,267 @@
+"""
+Проверка планов горячих запросов на большом наборе данных.
+
+Запуск: python -m app.db.plan_check [--organizations 100000] [--max-misestimate 100]
+
+Скрипт в одной транзакции заполняет БД синтетическими данными, собирает статистику (ANALYZE),
+выполняет запросы CRUD-слоя, снимает для каждого SQL-запроса EXPLAIN (ANALYZE, FORMAT JSON)
+и откатывает транзакцию — рабочие данные не меняются. Код возврата 1, если в плане
+появился Seq Scan по таблице, которую запрос должен читать по индексу, или оценка числа строк
+разошлась с фактической больше чем в --max-misestimate раз. Подходит для CI перед выкаткой миграций.
+"""
+import argparse
+import asyncio
+import sys
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from sqlalchemy import event, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.crud.activities import ActivityCRUD
+from app.crud.buildings import BuildingCRUD, FIELDS as BUILDING_FIELDS
+from app.crud.changes import ChangeCRUD
+from app.crud.organizations import OrganizationCRUD, FIELDS as ORGANIZATION_FIELDS, INCLUDES
+from app.crud.search import OrganizationSearchCRUD
+from app.core.utils import geohash_encode
+from app.db.session import engine
+from app.models.building import Building
+
+ACTIVITY_ROOTS = 20
+ACTIVITY_FANOUT = 10
+# Расхождения оценки на маленьких узлах плана не влияют на выбор плана
+MIN_MISESTIMATED_ROWS = 1000
+# Полный просмотр таблицы меньше этого размера (например, пустой секции) не считается проблемой
+SMALL_TABLE_ROWS = 1000
+
+SEED = [
+    """
+    INSERT INTO activities (id, name, parent_id, level)
+    SELECT :activity_base + g, 'Деятельность ' || g, NULL, 0 FROM generate_series(0, :roots - 1) g
+    """,
+    """
+    INSERT INTO activities (id, name, parent_id, level)
+    SELECT :middle_base + g, 'Деятельность 1-' || g, :activity_base + g / :fanout, 1
+    FROM generate_series(0, :middles - 1) g
+    """,
+    """
+    INSERT INTO activities (id, name, parent_id, level)
+    SELECT :leaf_base + g, 'Деятельность 2-' || g, :middle_base + g / :fanout, 2
+    FROM generate_series(0, :leaves - 1) g
+    """,
+    """
+    INSERT INTO buildings (id, address, latitude, longitude)
+    SELECT :building_base + g, 'ул. Тестовая, д. ' || g,
+           -- два региона в разных секциях organization_search: Москва (u...) и Новосибирск (v...)
+           CASE WHEN g % 2 = 0 THEN 55 + random() ELSE 54.5 + random() END,
+           CASE WHEN g % 2 = 0 THEN 37 + random() ELSE 82.5 + random() END
+    FROM generate_series(0, :buildings - 1) g
+    """,
+    """
+    INSERT INTO organizations (id, name, phones, building_id, phones_normalized, phone_suffixes)
+    SELECT :organization_base + g, 'Организация ' || g, ARRAY['+7 900 ' || lpad(g::text, 7, '0')],
+           :building_base + g % :buildings, ARRAY['7900' || lpad(g::text, 7, '0')],
+           ARRAY(SELECT right('7900' || lpad(g::text, 7, '0'), k) FROM generate_series(5, 11) k)
+    FROM generate_series(0, :organizations - 1) g
+    """,
+    """
+    INSERT INTO organization_activities (organization_id, activity_id)
+    SELECT :organization_base + g, :leaf_base + (g * 7 + k * 13) % :leaves
+    FROM generate_series(0, :organizations - 1) g, generate_series(0, 1) k
+    """,
+    """
+    INSERT INTO changes (entity, entity_id, op)
+    SELECT 'organization', :organization_base + g, 'upsert' FROM generate_series(0, :organizations - 1) g
+    """,
+]
+
+
+@dataclass
+class Dataset:
+    activity_base: int
+    leaf_base: int
+    building_base: int
+    organization_base: int
+    organizations: int
+
+
+@dataclass
+class Check:
+    name: str
+    run: Callable[[AsyncSession, Dataset], Awaitable]
+    # таблицы, полный просмотр которых ожидаем: запрос по смыслу читает их целиком
+    allow_seq_scan: tuple[str, ...] = ()
+    # секционированная таблица, из которой запрос должен читать не больше одной секции
+    pruned: str | None = None
+    problems: list[str] = field(default_factory=list)
+
+
+async def _children(session: AsyncSession, data: Dataset):
+    activity = await ActivityCRUD.get(session, data.activity_base)
+    await session.refresh(activity, ["children"])
+
+
+async def _organizations_with_includes(session: AsyncSession, data: Dataset):
+    rows = await OrganizationCRUD.get_list(session, None, data.building_base, None, None, None, 0)
+    await OrganizationCRUD.get_included(session, rows, list(INCLUDES))
+
+
+CHECKS = [
+    Check(
+        "организации по зданию",
+        lambda s, d: OrganizationCRUD.get_list(s, None, d.building_base, None, None, None, 0),
+    ),
+    Check(
+        "организации по деятельности",
+        lambda s, d: OrganizationCRUD.get_list(s, None, None, d.leaf_base, None, None, 0),
+        # деятельности сотен найденных организаций догружаются hash join по маленькому справочнику
+        allow_seq_scan=("activities",),
+    ),
+    Check(
+        "организации в радиусе",
+        lambda s, d: OrganizationCRUD.get_list(s, None, None, None, 55.5, 37.5, 2),
+        # деятельности сотен найденных организаций догружаются hash join по маленькому справочнику
+        allow_seq_scan=("activities",),
+        pruned="organization_search",
+    ),
+    Check(
+        "организации по телефону",
+        lambda s, d: OrganizationCRUD.get_list(s, None, None, None, None, None, 0, phone="+7 900 000-00-42"),
+    ),
+    Check(
+        "организации по окончанию телефона",
+        lambda s, d: OrganizationCRUD.get_list(s, None, None, None, None, None, 0, phone="0-00-42"),
+    ),
+    Check(
+        "организация по ID",
+        lambda s, d: OrganizationCRUD.get_fields(s, d.organization_base, list(ORGANIZATION_FIELDS)),
+    ),
+    Check(
+        "организации с include",
+        _organizations_with_includes,
+        # рекурсивная часть CTE предков: справочник деятельностей мал, hash join по нему дешевле индекса
+        allow_seq_scan=("activities",),
+    ),
+    Check("дочерние деятельности", _children),
+    Check("здание по ID", lambda s, d: BuildingCRUD.get_fields(s, d.building_base, list(BUILDING_FIELDS))),
+    Check("журнал изменений", lambda s, d: ChangeCRUD.get_since(s, 0, 100)),
+]
+
+
+def _walk(node: dict, limited: bool = False):
+    yield node, limited
+    for child in node.get("Plans", []):
+        yield from _walk(child, limited or node["Node Type"] == "Limit")
+
+
+def inspect_plan(plan: dict, allow_seq_scan: tuple[str, ...], max_misestimate: float,
+                 pruned: str | None = None) -> list[str]:
+    problems = []
+    partitions = {node.get("Relation Name") for node, _ in _walk(plan)
+                  if pruned and (node.get("Relation Name") or "").startswith(f"{pruned}_")}
+    if len(partitions) > 1:
+        problems.append(f"{len(partitions)} partitions of {pruned} scanned: {', '.join(sorted(partitions))}")
+    for node, limited in _walk(plan):
+        relation = node.get("Relation Name")
+        if node["Node Type"] == "Seq Scan" and relation not in allow_seq_scan:
+            problems.append(f"Seq Scan on {relation}")
+        estimated, actual = node["Plan Rows"], node.get("Actual Rows", 0)
+        # под Limit узлы оцениваются без учёта LIMIT и останавливаются раньше — это не ошибка оценки
+        if not limited and max(estimated, actual) >= MIN_MISESTIMATED_ROWS:
+            ratio = max(estimated, actual) / max(min(estimated, actual), 1)
+            if ratio > max_misestimate:
+                problems.append(f"{node['Node Type']}{f' on {relation}' if relation else ''}: "
+                                f"estimated {estimated} rows, actual {actual}")
+    return problems
+
+
+async def seed(session: AsyncSession, organizations: int) -> Dataset:
+    maxima = (await session.execute(text(
+        "SELECT (SELECT coalesce(max(id), 0) FROM activities), (SELECT coalesce(max(id), 0) FROM buildings), "
+        "(SELECT coalesce(max(id), 0) FROM organizations)"
+    ))).one()
+    middles = ACTIVITY_ROOTS * ACTIVITY_FANOUT
+    params = {
+        "activity_base": maxima[0] + 1,
+        "middle_base": maxima[0] + 1 + ACTIVITY_ROOTS,
+        "leaf_base": maxima[0] + 1 + ACTIVITY_ROOTS + middles,
+        "building_base": maxima[1] + 1,
+        "organization_base": maxima[2] + 1,
+        "roots": ACTIVITY_ROOTS,
+        "fanout": ACTIVITY_FANOUT,
+        "middles": middles,
+        "leaves": middles * ACTIVITY_FANOUT,
+        "buildings": max(organizations // 5, 1),
+        "organizations": organizations,
+    }
+    for statement in SEED:
+        await session.execute(text(statement), params)
+    buildings = await session.execute(
+        select(Building.id, Building.latitude, Building.longitude).where(Building.id >= params["building_base"])
+    )
+    await session.execute(
+        update(Building),
+        [{"id": b.id, "geohash": geohash_encode(b.latitude, b.longitude)} for b in buildings],
+    )
+    await OrganizationSearchCRUD.rebuild(session)
+    await session.execute(text(
+        "ANALYZE activities, buildings, organizations, organization_activities, organization_search, changes"
+    ))
+    return Dataset(params["activity_base"], params["leaf_base"], params["building_base"],
+                   params["organization_base"], organizations)
+
+
+async def main(organizations: int, max_misestimate: float) -> int:
+    engine.echo = False
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not conn.info.get("plan_check_explaining"):
+            captured.append((statement, parameters))
+
+    async with engine.connect() as conn:
+        await conn.begin()
+        session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        data = await seed(session, organizations)
+        result = await session.execute(
+            text("SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples < :rows"), {"rows": SMALL_TABLE_ROWS}
+        )
+        small_tables = tuple(result.scalars())
+
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        failed = False
+        try:
+            for check in CHECKS:
+                captured.clear()
+                await check.run(session, data)
+                statements = list(captured)
+                conn.sync_connection.info["plan_check_explaining"] = True
+                try:
+                    for statement, parameters in statements:
+                        result = await conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {statement}", parameters)
+                        plan = result.scalar()[0]["Plan"]
+                        check.problems += inspect_plan(
+                            plan, check.allow_seq_scan + small_tables, max_misestimate, check.pruned
+                        )
+                finally:
+                    conn.sync_connection.info["plan_check_explaining"] = False
+
+                failed = failed or bool(check.problems)
+                print(f"{'FAIL' if check.problems else 'ok  '} {check.name} ({len(statements)} SQL)")
+                for problem in check.problems:
+                    print(f"     {problem}")
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+            await session.close()
+            await conn.rollback()
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка планов горячих запросов (EXPLAIN) на синтетических данных")
+    parser.add_argument("--organizations", type=int, default=100_000, help="Число синтетических организаций")
+    parser.add_argument("--max-misestimate", type=float, default=100,
+                        help="Допустимое расхождение оценки и фактического числа строк, раз")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.organizations, args.max_misestimate)))
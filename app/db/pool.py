@@ -0,0 +1,105 @@
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Сколько последних выдач соединений хранится для перцентилей
+CHECKOUT_SAMPLES = 1000
+
+
+class PoolStats:
+    """Счётчики пула: время выдачи соединений и оборот соединений (открытия, закрытия, инвалидации)."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.checkouts = 0
+        self.checkout_seconds = 0.0
+        self.checkout_max = 0.0
+        self.recent: deque[float] = deque(maxlen=CHECKOUT_SAMPLES)
+        self.timeouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+
+    def checkout(self, seconds: float):
+        self.checkouts += 1
+        self.checkout_seconds += seconds
+        self.checkout_max = max(self.checkout_max, seconds)
+        self.recent.append(seconds)
+
+    def listen(self, pool):
+        def connected(dbapi_connection, connection_record):
+            self.connects += 1
+
+        def closed(dbapi_connection, connection_record):
+            self.closes += 1
+
+        def invalidated(dbapi_connection, connection_record, exception):
+            self.invalidations += 1
+
+        event.listen(pool, "connect", connected)
+        event.listen(pool, "close", closed)
+        event.listen(pool, "invalidate", invalidated)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self.recent)
+
+        def percentile(p: float) -> float | None:
+            return round(recent[round(p * (len(recent) - 1))] * 1000, 2) if recent else None
+
+        return {
+            "uptime_s": round(time.monotonic() - self.started, 1),
+            "checkouts": self.checkouts,
+            "checkout_ms": {
+                "avg": round(self.checkout_seconds / self.checkouts * 1000, 2) if self.checkouts else None,
+                "p50": percentile(0.5),
+                "p99": percentile(0.99),
+                "max": round(self.checkout_max * 1000, 2),
+            },
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "closes": self.closes,
+            "invalidations": self.invalidations,
+        }
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Очередь соединений asyncio, которая измеряет время выдачи соединения.
+
+    Время включает ожидание свободного соединения, открытие нового и pre-ping.
+    Счётчики переживают engine.dispose(): пул при этом пересоздаётся, а статистика передаётся новому.
+    """
+
+    def __init__(self, creator, **kw):
+        # при пересоздании пула подписчики событий переходят к новому пулу вместе с _dispatch
+        inherited = "_dispatch" in kw
+        super().__init__(creator, **kw)
+        self.stats = PoolStats()
+        if not inherited:
+            self.stats.listen(self)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.checkout(time.perf_counter() - started)
+
+    def occupancy(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+        }
@@ -0,0 +1,108 @@
+import itertools
+import logging
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+ROUND_ROBIN = "round_robin"
+LEAST_CONNECTIONS = "least_connections"
+STRATEGIES = (ROUND_ROBIN, LEAST_CONNECTIONS)
+
+
+class Replica:
+    __slots__ = ("name", "engine", "down_until", "failures", "last_error")
+
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.down_until = 0.0
+        self.failures = 0
+        self.last_error: str | None = None
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+
+class ReplicaSet:
+    """
+    Реплики для чтения: у каждой свой пул соединений.
+
+    Реплика, к которой не удалось подключиться или которая разорвала соединение,
+    исключается на retry_seconds, затем снова получает запросы; первый удачный запрос
+    возвращает её в строй. Клиент, недавно выполнивший запись, читает с primary
+    read_after_write_seconds — так он видит свои изменения, даже если реплика отстаёт.
+    """
+
+    def __init__(self, urls: list[str], strategy: str, retry_seconds: float, read_after_write_seconds: float,
+                 **engine_options):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown replica strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+        self.strategy = strategy
+        self.retry_seconds = retry_seconds
+        self.read_after_write_seconds = read_after_write_seconds
+        self.replicas = [
+            # в имени реплики не должно быть пароля: оно попадает в логи и метрики
+            Replica(make_url(url).render_as_string(hide_password=True), create_async_engine(url, **engine_options))
+            for url in urls
+        ]
+        self._turn = itertools.count()
+        self._last_write: dict[str, float] = {}
+        for replica in self.replicas:
+            event.listen(replica.engine.sync_engine, "handle_error", self._disconnect_listener(replica))
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def candidates(self) -> list[Replica]:
+        """Живые реплики в порядке, в котором их стоит пробовать."""
+        now = time.monotonic()
+        alive = [r for r in self.replicas if r.healthy(now)]
+        if self.strategy == LEAST_CONNECTIONS:
+            return sorted(alive, key=lambda r: r.engine.pool.checkedout())
+        if not alive:
+            return alive
+        start = next(self._turn) % len(alive)
+        return alive[start:] + alive[:start]
+
+    def mark_down(self, replica: Replica, error: BaseException):
+        replica.down_until = time.monotonic() + self.retry_seconds
+        replica.failures += 1
+        replica.last_error = repr(error)
+        logger.warning("replica %s is down for %ss: %r", replica.name, self.retry_seconds, error)
+
+    def _disconnect_listener(self, replica: Replica):
+        def handle_error(context):
+            if context.is_disconnect:
+                self.mark_down(replica, context.original_exception)
+
+        return handle_error
+
+    def note_write(self, client: str):
+        self._last_write[client] = time.monotonic()
+
+    def wrote_recently(self, client: str) -> bool:
+        written = self._last_write.get(client)
+        return written is not None and time.monotonic() - written < self.read_after_write_seconds
+
+    def snapshot(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": r.name,
+                "healthy": r.healthy(now),
+                "retry_in": round(max(r.down_until - now, 0), 1),
+                "failures": r.failures,
+                "last_error": r.last_error,
+                "checked_out": r.engine.pool.checkedout(),
+            }
+            for r in self.replicas
+        ]
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
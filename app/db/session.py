@@ -1,17 +1,201 @@
-from asyncio import current_task
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session
+import asyncio
+import time
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.db.pool import TimedQueuePool
+from app.db.replicas import ReplicaSet
 
-engine = create_async_engine(settings.DB_URL_ASYNC, echo=True)
+ENGINE_OPTIONS = {
+    "echo": settings.DB_ECHO,
+    "poolclass": TimedQueuePool,
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    "query_cache_size": settings.DB_QUERY_CACHE_SIZE,
+}
+CONNECT_ARGS = {"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE}
+
+engine = create_async_engine(settings.DB_URL_ASYNC, **ENGINE_OPTIONS, connect_args=CONNECT_ARGS)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
+replicas = ReplicaSet(
+    [url.strip() for url in settings.DB_REPLICA_URLS.split(",") if url.strip()],
+    settings.DB_REPLICA_STRATEGY,
+    settings.DB_REPLICA_RETRY_SECONDS,
+    settings.DB_READ_AFTER_WRITE_SECONDS,
+    **ENGINE_OPTIONS,
+    connect_args={**CONNECT_ARGS, "timeout": settings.DB_REPLICA_CONNECT_TIMEOUT},
+)
+ReplicaSessionLocal = async_sessionmaker(expire_on_commit=False)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_statement_timeout_ms: ContextVar[int | None] = ContextVar("statement_timeout_ms", default=None)
+
+
+class QueryStats:
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+class StatementCacheStats:
+    """
+    Попадания в кэш скомпилированных запросов SQLAlchemy (compiled) и в кэш подготовленных
+    выражений asyncpg на соединении (prepared). Промах compiled — запрос заново компилируется в SQL,
+    промах prepared — лишний раунд PREPARE, в котором Postgres разбирает и анализирует запрос.
+    """
+
+    __slots__ = ("compiled_hits", "compiled_misses", "prepared_hits", "prepared_misses")
+
+    def __init__(self):
+        self.compiled_hits = self.compiled_misses = 0
+        self.prepared_hits = self.prepared_misses = 0
+
+    def snapshot(self) -> dict:
+        def rate(hits, misses):
+            return round(hits / (hits + misses), 4) if hits + misses else None
+
+        return {
+            "compiled": {"hits": self.compiled_hits, "misses": self.compiled_misses,
+                         "hit_rate": rate(self.compiled_hits, self.compiled_misses)},
+            "prepared": {"hits": self.prepared_hits, "misses": self.prepared_misses,
+                         "hit_rate": rate(self.prepared_hits, self.prepared_misses)},
+        }
+
+
+statement_cache = StatementCacheStats()
+
+
+def track_queries() -> QueryStats:
+    """Начинает подсчёт SQL-запросов и их суммарного времени в текущем контексте."""
+    stats = QueryStats()
+    _query_stats.set(stats)
+    return stats
+
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+    # executemany в asyncpg идёт мимо кэша подготовленных выражений
+    cache = getattr(getattr(cursor, "_adapt_connection", None), "_prepared_statement_cache", None)
+    if cache is not None and not executemany:
+        if statement in cache:
+            statement_cache.prepared_hits += 1
+        else:
+            statement_cache.prepared_misses += 1
+
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    if context.cache_hit is CACHE_HIT:
+        statement_cache.compiled_hits += 1
+    elif context.cache_hit is CACHE_MISS:
+        statement_cache.compiled_misses += 1
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+
+
+def pool_snapshot() -> dict:
+    """Занятость пулов, время выдачи соединений и оборот соединений — для primary и каждой реплики."""
+    return {
+        "primary": {**engine.pool.occupancy(), **engine.pool.stats.snapshot()},
+        "replicas": {
+            replica.name: {**replica.engine.pool.occupancy(), **replica.engine.pool.stats.snapshot()}
+            for replica in replicas.replicas
+        },
+    }
+
+
+def all_engines():
+    """Primary и все реплики — для подписки на события движков."""
+    return [engine, *(replica.engine for replica in replicas.replicas)]
+
+
+for _engine in all_engines():
+    event.listen(_engine.sync_engine, "before_cursor_execute", _query_started)
+    event.listen(_engine.sync_engine, "after_cursor_execute", _query_finished)
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = _statement_timeout_ms.get()
+    if timeout_ms:
+        # SET LOCAL действует до конца текущей транзакции
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def statement_timeout(timeout_ms: int):
+    """Зависимость маршрута: ограничивает время выполнения каждого SQL-запроса в рамках запроса."""
+    async def dependency():
+        # каждый HTTP-запрос обрабатывается в своей задаче со своим контекстом
+        _statement_timeout_ms.set(timeout_ms)
+
+    return dependency
+
+
+def _client(request: Request) -> str:
+    api_key = getattr(request.state, "api_key", None)
+    return api_key.name if api_key else ""
+
+
+async def get_db_session(request: Request):
+    """
+    Сессия primary — для маршрутов, которые пишут.
+
+    Соединение берётся из пула только при первом запросе к БД: запросы,
+    которые до БД не дошли, пул не занимают.
+    """
+    session = AsyncSessionLocal()
+    try:
+        yield session
+    finally:
+        await session.close()
+        if replicas.enabled and request.method not in SAFE_METHODS:
+            replicas.note_write(_client(request))
+
+
+async def _replica_session() -> AsyncSession | None:
+    for replica in replicas.candidates():
+        session = ReplicaSessionLocal(bind=replica.engine)
+        try:
+            # соединение берётся сразу: недоступная реплика обнаружится до выполнения обработчика
+            await session.connection()
+        except (DBAPIError, OSError, asyncio.TimeoutError) as e:
+            await session.close()
+            replicas.mark_down(replica, e)
+            continue
+        return session
+    return None
+
+
+async def get_read_session(request: Request):
+    """
+    Сессия для маршрутов только на чтение: живая реплика, если они настроены.
 
-async def get_db_session():
-    session = async_scoped_session(
-        session_factory=AsyncSessionLocal,
-        scopefunc=current_task,
-    )
+    Запрос уходит на primary, если реплик нет, все недоступны или этот клиент
+    недавно писал (DB_READ_AFTER_WRITE_SECONDS).
+    """
+    session = None
+    if replicas.enabled and not replicas.wrote_recently(_client(request)):
+        session = await _replica_session()
+    if session is None:
+        session = AsyncSessionLocal()
     try:
         yield session
     finally:
-        await session.remove()
+        await session.close()
@@ -8,8 +8,8 @@ class Activity(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    parent_id = Column(Integer, ForeignKey("activities.id"))
-    level = Column(Integer, nullable=False)
+    parent_id = Column(Integer, ForeignKey("activities.id"), index=True)
+    level = Column(Integer, nullable=False, index=True)
 
     parent = relationship("Activity", remote_side=[id], back_populates="children")
     children = relationship("Activity", back_populates="parent", cascade="all, delete-orphan")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Integer
+from sqlalchemy import Column, String, Float, Index, Integer
 from app.db.base import Base
 
 
@@ -9,3 +9,9 @@ class Building(Base):
     address = Column(String, nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+    # Вычисляется BuildingCRUD из координат; COLLATE "C" — диапазоны по префиксу сравниваются побайтно
+    geohash = Column(String(collation="C"), index=True)
+
+    __table_args__ = (
+        Index("ix_buildings_latitude_longitude", "latitude", "longitude"),
+    )
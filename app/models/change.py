@@ -0,0 +1,19 @@
+from sqlalchemy import BigInteger, Column, DateTime, Identity, Index, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.base import Base
+
+
+class Change(Base):
+    __tablename__ = "changes"
+
+    seq = Column(BigInteger, Identity(always=True), primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    data = Column(JSONB)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # последнее изменение сущности одного вида — версия кэшей её списков
+        Index("ix_changes_entity_seq", "entity", "seq"),
+    )
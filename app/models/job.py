@@ -0,0 +1,32 @@
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Index, Integer, String, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from app.db.base import Base
+
+
+class Job(Base):
+    """
+    Фоновая задача. Состояние хранится в БД, поэтому задачи переживают перезапуск:
+    pending ждёт свободного слота, running выполняется и раз в JOBS_HEARTBEAT_SECONDS
+    обновляет heartbeat_at; running без heartbeat дольше JOBS_STALE_SECONDS снова становится pending.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, server_default="pending")
+    params = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    # Обработано единиц работы (строк, организаций) из total; для возобновления после перезапуска
+    done = Column(BigInteger, nullable=False, server_default="0")
+    total = Column(BigInteger)
+    result = Column(JSONB)
+    error = Column(String)
+    cancel_requested = Column(Boolean, nullable=False, server_default="false")
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # менеджер задач ищет только незавершённые задачи
+        Index("ix_jobs_status_kind", "status", "kind", postgresql_where=text("status IN ('pending', 'running')")),
+    )
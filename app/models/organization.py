@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, ForeignKey, Integer, Table
+from sqlalchemy import Column, String, ForeignKey, Index, Integer, Table
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import ARRAY
 from app.db.base import Base
@@ -8,6 +8,8 @@ organization_activities = Table(
     Base.metadata,
     Column("organization_id", Integer, ForeignKey("organizations.id"), primary_key=True),
     Column("activity_id", Integer, ForeignKey("activities.id"), primary_key=True),
+    # PK (organization_id, activity_id) не помогает искать организации по деятельности
+    Index("ix_organization_activities_activity_id", "activity_id", "organization_id"),
 )
 
 
@@ -17,7 +19,10 @@ class Organization(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
     phones = Column(ARRAY(String), nullable=False)
-    building_id = Column(Integer, ForeignKey("buildings.id"))
+    building_id = Column(Integer, ForeignKey("buildings.id"), index=True)
+    # Поддерживаются OrganizationCRUD.create/update: номера только из цифр и их суффиксы для поиска
+    phones_normalized = Column(ARRAY(String), nullable=False, server_default="{}")
+    phone_suffixes = Column(ARRAY(String), nullable=False, server_default="{}")
 
     building = relationship("Building")
     activities = relationship(
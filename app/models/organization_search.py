@@ -0,0 +1,41 @@
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.db.base import Base
+
+
+class OrganizationSearch(Base):
+    """
+    Денормализованный документ организации для фильтрации списка: все условия
+    GET /organizations/ проверяются по одной таблице, без join и рекурсии.
+
+    Строки пересобираются OrganizationSearchCRUD в тех же транзакциях, что меняют
+    организации, здания и деятельности. activity_ids содержит деятельности организации
+    вместе со всеми предками, поэтому фильтр по деятельности с вложенными — это activity_ids @> [id].
+
+    Таблица секционирована по geohash здания (RANGE, секция на первый символ geohash — см. миграцию),
+    поэтому geohash входит в первичный ключ, а запрос в радиусе читает только секции своего региона.
+    Организации без здания хранятся с пустым geohash.
+    """
+    __tablename__ = "organization_search"
+
+    organization_id = Column(Integer, ForeignKey("organizations.id", ondelete="CASCADE"), primary_key=True)
+    geohash = Column(String(collation="C"), primary_key=True, server_default="")
+    name = Column(String, nullable=False)
+    phones_normalized = Column(ARRAY(String), nullable=False)
+    phone_suffixes = Column(ARRAY(String), nullable=False)
+    building_id = Column(Integer, index=True)
+    address = Column(String)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    activity_ids = Column(ARRAY(Integer), nullable=False)
+
+    __table_args__ = (
+        Index("ix_organization_search_latitude_longitude", "latitude", "longitude"),
+        Index("ix_organization_search_activity_ids", "activity_ids", postgresql_using="gin"),
+        Index("ix_organization_search_phones_normalized", "phones_normalized", postgresql_using="gin"),
+        Index("ix_organization_search_phone_suffixes", "phone_suffixes", postgresql_using="gin"),
+        # Создаётся миграцией, только если в БД доступно расширение pg_trgm
+        Index("ix_organization_search_name_trgm", "name", postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}),
+        {"postgresql_partition_by": "RANGE (geohash)"},
+    )
@@ -0,0 +1,15 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Any, Literal, Optional
+
+
+class ChangeOut(BaseModel):
+    seq: int
+    entity: Literal["activity", "building", "organization"]
+    entity_id: int
+    op: Literal["upsert", "delete"]
+    data: Optional[dict[str, Any]] = Field(None, description="Состояние объекта после изменения; для delete — null")
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, computed_field
+from typing import Any, Literal, Optional
+
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    status: Literal["pending", "running", "done", "failed", "cancelled"]
+    params: dict[str, Any]
+    done: int = Field(..., description="Обработано единиц работы (строк, организаций)")
+    total: Optional[int] = Field(None, description="Всего единиц работы; null, пока неизвестно")
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+    @computed_field(description="Доля выполненной работы от 0 до 1")
+    @property
+    def progress(self) -> Optional[float]:
+        if self.status == "done":
+            return 1.0
+        if not self.total:
+            return None
+        return round(min(self.done / self.total, 1.0), 4)
+
+    @computed_field(description="Средняя скорость, единиц работы в секунду")
+    @property
+    def rate_per_s(self) -> Optional[float]:
+        if not self.started_at or not self.done:
+            return None
+        end = self.finished_at or datetime.now(timezone.utc)
+        seconds = (end - self.started_at).total_seconds()
+        return round(self.done / seconds, 2) if seconds > 0 else None
+
+    @computed_field(description="Оценка оставшегося времени в секундах при текущей скорости")
+    @property
+    def eta_s(self) -> Optional[float]:
+        if self.status != "running" or not self.total or not self.rate_per_s:
+            return None
+        return round(max(self.total - self.done, 0) / self.rate_per_s, 1)
@@ -1,6 +1,9 @@
 from pydantic import BaseModel, Field
 from typing import List, Optional
 
+from app.schemas.activities import ActivityRead
+from app.schemas.buildings import BuildingOut
+
 
 class ActivityOut(BaseModel):
     id: int
@@ -33,3 +36,22 @@ class OrganizationOut(OrganizationBase):
 
     class Config:
         from_attributes = True
+
+
+class OrganizationNearbyOut(OrganizationOut):
+    distance_km: float
+
+
+class Included(BaseModel):
+    buildings: Optional[List[BuildingOut]] = None
+    activities: Optional[List[ActivityRead]] = None
+
+
+class OrganizationListIncluded(BaseModel):
+    data: List[OrganizationOut]
+    included: Included
+
+
+class OrganizationIncluded(BaseModel):
+    data: OrganizationOut
+    included: Included
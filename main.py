@@ -1,14 +1,66 @@
-from fastapi import FastAPI, Depends
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from app.api import organizations, activities, buildings
+from fastapi import APIRouter, FastAPI, Depends
+from fastapi.responses import ORJSONResponse
+
+from app.api import organizations, activities, buildings, changes, health, jobs, metrics, snapshot
 from app.core.dependencies import verify_api_key
-from app.core.middlewares import CatchExceptionsMiddleware
+from app.core.exception_handlers import exception_handlers
+from app.core.group_commit import organization_writes
+from app.core.job_kinds import KINDS
+from app.core.jobs import jobs as job_manager
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.core.middlewares import AccessLogMiddleware, CancelOnDisconnectMiddleware, StateHeadersMiddleware
+from app.core.profiling import ProfilingMiddleware, install_slow_query_log
+from app.core.warmup import readiness
+from app.db.session import all_engines, engine, replicas
+
+setup_logging()
+if settings.SLOW_QUERY_MS > 0:
+    for db_engine in all_engines():
+        install_slow_query_log(db_engine.sync_engine, settings.SLOW_QUERY_MS, settings.SLOW_QUERY_EXPLAIN)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # прогрев идёт в фоне: /health/live отвечает сразу, /health/ready — после прогрева
+    warmup = asyncio.create_task(readiness.warm_up())
+    job_manager.start(KINDS)
+    organization_writes.start()
+    yield
+    # записи, уже принятые конвейером, фиксируются до остановки
+    await organization_writes.stop()
+    # прерванные задачи вернутся в очередь и продолжатся после запуска
+    await job_manager.stop()
+    warmup.cancel()
+    with suppress(asyncio.CancelledError):
+        await warmup
+    await engine.dispose()
+    await replicas.dispose()
+
 
 app = FastAPI(
     title="Handbook API",
-    dependencies=[Depends(verify_api_key)]
+    lifespan=lifespan,
+    exception_handlers=exception_handlers,
+    default_response_class=ORJSONResponse,
 )
-app.include_router(organizations.router)
-app.include_router(activities.router)
-app.include_router(buildings.router)
-app.add_middleware(CatchExceptionsMiddleware)
+
+api = APIRouter(dependencies=[Depends(verify_api_key)])
+api.include_router(organizations.router)
+api.include_router(activities.router)
+api.include_router(buildings.router)
+api.include_router(changes.router)
+api.include_router(snapshot.router)
+api.include_router(jobs.router)
+api.include_router(metrics.router)
+app.include_router(api)
+# проверки балансировщика — без API-ключа
+app.include_router(health.router)
+app.add_middleware(StateHeadersMiddleware)
+app.add_middleware(CancelOnDisconnectMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(AccessLogMiddleware)